@@ -0,0 +1,420 @@
+# Checks that alternative spin engines, e.g. optimized spinners, select
+#   upgrades exactly as the reference spinner.spinUpgrades does, including
+#   renormalizing weights once choices are exhausted and descending into
+#   subwheels by weight. Each engine is run against the reference on generated
+#   wheels, and passes only if:
+#
+#   - Its single spins, its selections over whole runs, and the number of
+#     times each upgrade is selected per run are distributed as the
+#     reference's, by chi-square and Kolmogorov-Smirnov tests at the given
+#     significance.
+#   - Seeded runs repeat exactly, and match the reference's seed for seed if
+#     the engine promises to.
+#   - It refuses to spin past a wheel's limit, and spinning exactly to the
+#     limit selects every upgrade as many times as it allows.
+#
+#   python bench/equivalence.py --engine mySpinner:spinUpgrades
+#   python bench/equivalence.py --exact-engine mySpinner:spinUpgrades --trials 5000
+#
+# Engines are functions taking a wheel, a number of spins and a random.Random,
+#   returning a dict mapping Upgrades to the number of times selected, like
+#   spinUpgrades. With no engine given, the reference is checked against
+#   itself, which should pass at about the rate the significance implies.
+
+import argparse
+from bisect import bisect_right
+import importlib
+import math
+from pathlib import Path
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from file import azathothReader
+from spin import spinner
+import synthetic
+
+# Default chance of failing an engine that matches the reference, per case.
+DEFAULT_SIGNIFICANCE = 0.01
+
+# Default number of runs sampled from each engine per case.
+DEFAULT_TRIALS = 2000
+
+# Default number of seeds whose runs are compared exactly.
+DEFAULT_SEEDED_RUNS = 50
+
+# Categories expected fewer times than this by a chi-square test are pooled, as
+#   the test is unreliable for rarer ones.
+MIN_EXPECTED_COUNT = 5
+
+
+class Engine():
+  '''A spinner to check against the reference.
+
+  Attributes:
+    name:             Name to report the engine by.
+    spin:             Function taking (wheel, number of spins, random.Random)
+                      and returning a dict mapping Upgrades to the number of
+                      times selected, like spinner.spinUpgrades.
+    matchesSeeds:     Whether the engine promises to select exactly what the
+                      reference does given the same seed, rather than only
+                      selecting with the same distribution.
+  '''
+  def __init__(self, name, spin, matchesSeeds=False):
+    self.name = name
+    self.spin = spin
+    self.matchesSeeds = matchesSeeds
+
+
+REFERENCE = Engine("reference", spinner.spinUpgrades, matchesSeeds=True)
+
+
+class Case():
+  '''A generated wheel to compare engines on, and the number of spins in each
+  run, or None to spin three quarters of the way to the wheel's limit.
+  '''
+  def __init__(self, name, spec: synthetic.WheelSpec, numSpins=None):
+    self.name = name
+    self.spec = spec
+    self.numSpins = numSpins
+
+
+_Kind = synthetic.ProgressionKind
+
+CASES = {case.name: case for case in [
+  # Unlimited upgrades on flat, skewed wheels, testing weighted selection.
+  Case("weighted", synthetic.WheelSpec(
+    numGames=3, fanOut=12, weightSkew=1.0,
+    progressionMix={_Kind.INCREMENT: 1, _Kind.ONE_PER: 1}, seed=11),
+    numSpins=30),
+  # Subwheels nested several levels deep, testing weighted descent.
+  Case("nested", synthetic.WheelSpec(
+    numGames=3, fanOut=4, depth=3, subwheelRate=0.5, weightSkew=0.7, seed=12),
+    numSpins=30),
+  # Only limited upgrades, spun most of the way to the limit, testing
+  #   renormalization once choices and whole subwheels are exhausted.
+  Case("exhausting", synthetic.WheelSpec(
+    numGames=2, fanOut=5, depth=2, subwheelRate=0.4, weightSkew=1.5,
+    progressionMix={_Kind.UNIQUE: 2, _Kind.VALUES: 1, _Kind.STOP_AT: 1,
+                    _Kind.SPIN_LIMIT: 1}, seed=13)),
+]}
+
+
+class CheckResult():
+  '''Outcome of one check of an engine on a case.'''
+  def __init__(self, name, passed, detail):
+    self.name = name
+    self.passed = passed
+    self.detail = detail
+
+
+def _upperGammaRegularized(a, x):
+  '''Returns the regularized upper incomplete gamma function Q(a, x).'''
+  if x <= 0:
+    return 1.0
+  logPrefix = -x + a * math.log(x) - math.lgamma(a)
+  if x < a + 1:
+    # Series for the lower function, converging quickly below a + 1.
+    term = total = 1 / a
+    n = a
+    while abs(term) > abs(total) * 1e-15:
+      n += 1
+      term *= x / n
+      total += term
+    return max(0.0, 1 - total * math.exp(logPrefix))
+
+  # Continued fraction for the upper function, by Lentz's method.
+  tiny = 1e-300
+  b = x + 1 - a
+  c = 1 / tiny
+  d = 1 / b
+  fraction = d
+  for i in range(1, 1000):
+    an = -i * (i - a)
+    b += 2
+    d = an * d + b
+    d = d if abs(d) > tiny else tiny
+    c = b + an / c
+    c = c if abs(c) > tiny else tiny
+    d = 1 / d
+    delta = d * c
+    fraction *= delta
+    if abs(delta - 1) < 1e-15:
+      break
+  return math.exp(logPrefix) * fraction
+
+
+def _kolmogorovSurvival(z):
+  '''Returns the chance that the Kolmogorov distribution exceeds z.'''
+  if z <= 0:
+    return 1.0
+  if z < 1.18:
+    # This series converges faster for small z.
+    total = sum(math.exp(-(2 * k - 1) ** 2 * math.pi ** 2 / (8 * z * z))
+                for k in range(1, 6))
+    return max(0.0, 1 - math.sqrt(2 * math.pi) / z * total)
+  return min(1.0, 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * z * z)
+                          for k in range(1, 6)))
+
+
+def chiSquareHomogeneity(countsA: dict, countsB: dict):
+  '''Tests whether two samples of categories, given as dicts mapping category
+  to count, come from the same distribution. Returns a tuple: (chi-square
+  statistic, degrees of freedom, p-value).
+
+  Categories expected too rarely to test are pooled into one.
+  '''
+  totalA = sum(countsA.values())
+  totalB = sum(countsB.values())
+  total = totalA + totalB
+  if not totalA or not totalB:
+    raise ValueError("Chi-square test needs observations from both samples.")
+
+  columns = []
+  pooled = [0, 0]
+  for category in countsA.keys() | countsB.keys():
+    column = (countsA.get(category, 0), countsB.get(category, 0))
+    expected = min(totalA, totalB) * sum(column) / total
+    if expected < MIN_EXPECTED_COUNT:
+      pooled[0] += column[0]
+      pooled[1] += column[1]
+    else:
+      columns.append(column)
+  if sum(pooled):
+    columns.append(tuple(pooled))
+  if len(columns) < 2:
+    return 0.0, 0, 1.0
+
+  statistic = 0.0
+  for column in columns:
+    columnTotal = sum(column)
+    for observed, rowTotal in zip(column, (totalA, totalB)):
+      expected = rowTotal * columnTotal / total
+      statistic += (observed - expected) ** 2 / expected
+  dof = len(columns) - 1
+  return statistic, dof, _upperGammaRegularized(dof / 2, statistic / 2)
+
+
+def ksTwoSample(samplesA, samplesB):
+  '''Tests whether two lists of numbers come from the same distribution.
+  Returns a tuple: (greatest distance between their empirical distributions,
+  approximate p-value). The p-value is conservative for discrete values.
+  '''
+  if not samplesA or not samplesB:
+    raise ValueError("Kolmogorov-Smirnov test needs samples from both sides.")
+  sortedA = sorted(samplesA)
+  sortedB = sorted(samplesB)
+  n, m = len(sortedA), len(sortedB)
+  distance = max(abs(bisect_right(sortedA, value) / n
+                     - bisect_right(sortedB, value) / m)
+                 for value in set(sortedA) | set(sortedB))
+  effectiveSize = math.sqrt(n * m / (n + m))
+  return distance, _kolmogorovSurvival(
+    (effectiveSize + 0.12 + 0.11 / effectiveSize) * distance)
+
+
+def _runTrials(engine: Engine, wheel, numSpins, seeds):
+  '''Returns the results of a run of the given engine from each seed.'''
+  return [engine.spin(wheel, numSpins, random.Random(seed)) for seed in seeds]
+
+
+def _sumCounts(runs):
+  totals = {}
+  for run in runs:
+    for upgrade, count in run.items():
+      totals[upgrade] = totals.get(upgrade, 0) + count
+  return totals
+
+
+class _CaseRunner():
+  '''Runs every check of a case, sampling the reference once for every engine
+  compared against it.
+  '''
+  def __init__(self, case: Case, trials, significance, seededRuns, seed):
+    self.case = case
+    self.trials = trials
+    self.significance = significance
+    self.seededRuns = seededRuns
+    self.wheel = azathothReader.azathothYamlToWheel(
+      synthetic.generate(case.spec).wheelYaml)
+    self.limit = spinner.getLimitForWheel(self.wheel)
+    self.numSpins = case.numSpins
+    if self.numSpins is None:
+      self.numSpins = max(1, self.limit * 3 // 4) if self.limit != -1 else 30
+
+    # Engines sample from seeds disjoint from the reference's, so samples are
+    #   independent even when the engine is the reference itself.
+    self.referenceSeeds = range(seed, seed + trials)
+    self.engineSeeds = range(seed + trials, seed + 2 * trials)
+    self.referenceSingles = _sumCounts(
+      _runTrials(REFERENCE, self.wheel, 1, self.referenceSeeds))
+    self.referenceRuns = _runTrials(REFERENCE, self.wheel, self.numSpins,
+                                    self.referenceSeeds)
+
+  def checkDistributions(self, engine: Engine) -> CheckResult:
+    '''Compares single spins and every selection made over whole runs by
+    chi-square tests, and the number of times each upgrade is selected per run
+    by Kolmogorov-Smirnov tests. The significance is split across every test,
+    so that an engine matching the reference fails no more often than it
+    implies.
+    '''
+    singles = _sumCounts(_runTrials(engine, self.wheel, 1, self.engineSeeds))
+    runs = _runTrials(engine, self.wheel, self.numSpins, self.engineSeeds)
+    _, _, singlesP = chiSquareHomogeneity(self.referenceSingles, singles)
+    # Selections within a run aren't independent once upgrades are exhausted,
+    #   which only makes this test more conservative, as exhaustion spreads
+    #   selections more evenly than independent draws would.
+    _, _, selectionsP = chiSquareHomogeneity(_sumCounts(self.referenceRuns),
+                                             _sumCounts(runs))
+
+    upgrades = set(_sumCounts(self.referenceRuns)) | set(_sumCounts(runs))
+    worstUpgrade, worstP = None, 1.0
+    for upgrade in upgrades:
+      _, p = ksTwoSample([run.get(upgrade, 0) for run in self.referenceRuns],
+                         [run.get(upgrade, 0) for run in runs])
+      if p < worstP:
+        worstUpgrade, worstP = upgrade, p
+
+    threshold = self.significance / (2 + len(upgrades))
+    detail = (f"single spins p={singlesP:.3g}; selections over"
+              f" {self.numSpins}-spin runs p={selectionsP:.3g}; per-run counts"
+              f" of {len(upgrades)} upgrades min p={worstP:.3g}")
+    if worstUpgrade is not None and worstP < threshold:
+      detail += f" ({worstUpgrade})"
+    detail += f"; threshold {threshold:.3g}"
+    return CheckResult("distributions",
+                       min(singlesP, selectionsP, worstP) >= threshold,
+                       detail)
+
+  def checkSeeds(self, engine: Engine) -> CheckResult:
+    '''Compares seeded runs exactly: with themselves, and with the reference if
+    the engine promises to match it.
+    '''
+    seeds = self.referenceSeeds[:self.seededRuns]
+    runs = _runTrials(engine, self.wheel, self.numSpins, seeds)
+    if runs != _runTrials(engine, self.wheel, self.numSpins, seeds):
+      return CheckResult("seeds", False, "runs from the same seed differ")
+    if not engine.matchesSeeds:
+      return CheckResult("seeds", True, f"{len(seeds)} seeded runs repeat")
+    for seed, run, referenceRun in zip(seeds, runs,
+                                       self.referenceRuns[:len(seeds)]):
+      if run != referenceRun:
+        return CheckResult("seeds", False,
+                           f"run from seed {seed} differs from the reference")
+    return CheckResult("seeds", True,
+                       f"{len(seeds)} seeded runs repeat and match the"
+                       " reference")
+
+  def checkLimits(self, engine: Engine) -> CheckResult:
+    '''Checks that the engine spins exactly to the wheel's limit, using up
+    every upgrade, and refuses to spin past it.
+    '''
+    if self.limit == -1:
+      return CheckResult("limits", True, "wheel is unlimited")
+    exhausted = engine.spin(self.wheel, self.limit, random.Random(0))
+    if exhausted != spinner.spinUpgrades(self.wheel, self.limit,
+                                         random.Random(0)):
+      return CheckResult("limits", False,
+                         f"spinning the limit of {self.limit} didn't use up"
+                         " every upgrade")
+    try:
+      engine.spin(self.wheel, self.limit + 1, random.Random(0))
+    except ValueError:
+      return CheckResult("limits", True,
+                         f"spins to its limit of {self.limit} and no further")
+    return CheckResult("limits", False,
+                       f"spun past the wheel's limit of {self.limit}")
+
+  def check(self, engine: Engine):
+    '''Returns a CheckResult for each check of the given engine.'''
+    return [self.checkDistributions(engine), self.checkSeeds(engine),
+            self.checkLimits(engine)]
+
+
+def runHarness(engines, caseNames, trials=DEFAULT_TRIALS,
+               significance=DEFAULT_SIGNIFICANCE,
+               seededRuns=DEFAULT_SEEDED_RUNS, seed=0, report=print):
+  '''Checks each given Engine against the reference on each given case,
+  reporting as it goes. Returns whether every engine passed every check.
+  '''
+  allPassed = True
+  for caseName in caseNames:
+    runner = _CaseRunner(CASES[caseName], trials, significance, seededRuns,
+                         seed)
+    for engine in engines:
+      results = runner.check(engine)
+      passed = all(result.passed for result in results)
+      allPassed = allPassed and passed
+      report(f"{caseName} / {engine.name}: {'PASS' if passed else 'FAIL'}")
+      for result in results:
+        report(f"  {result.name:14} {'ok  ' if result.passed else 'FAIL'}"
+               f" {result.detail}")
+  return allPassed
+
+
+def loadEngine(path, matchesSeeds=False) -> Engine:
+  '''Returns an Engine for the function at the given path, written as
+  module:function and importable with Azathoth's src folder on the path.
+  '''
+  moduleName, _, functionName = path.partition(":")
+  if not moduleName or not functionName:
+    raise ValueError(f"Engine '{path}' is not module:function.")
+  try:
+    module = importlib.import_module(moduleName)
+  except ImportError as e:
+    raise ValueError(f"Couldn't import engine module {moduleName}: {e}")
+  if not callable(spin := getattr(module, functionName, None)):
+    raise ValueError(f"Module {moduleName} has no function {functionName}.")
+  return Engine(path, spin, matchesSeeds)
+
+
+def buildParser():
+  parser = argparse.ArgumentParser(
+    prog="equivalence",
+    description="Checks that alternative spin engines select upgrades exactly"
+                " as the reference spinner does, statistically and, where"
+                " promised, seed for seed.")
+  parser.add_argument("--engine", action="append", default=[],
+                      metavar="MODULE:FUNCTION",
+                      help="Engine to check, selecting with the same"
+                           " distribution as the reference.")
+  parser.add_argument("--exact-engine", action="append", default=[],
+                      metavar="MODULE:FUNCTION",
+                      help="Engine to check, making exactly the reference's"
+                           " selections for the same seed.")
+  parser.add_argument("--case", nargs="+", dest="cases",
+                      default=list(CASES), choices=list(CASES),
+                      help="Cases to check engines on. Defaults to all.")
+  parser.add_argument("--trials", type=int, default=DEFAULT_TRIALS,
+                      help="Runs sampled from each engine per case.")
+  parser.add_argument("--significance", type=float,
+                      default=DEFAULT_SIGNIFICANCE,
+                      help="Chance of failing an engine that matches the"
+                           " reference, per case.")
+  parser.add_argument("--seeded-runs", type=int, default=DEFAULT_SEEDED_RUNS,
+                      help="Seeded runs compared exactly.")
+  parser.add_argument("--seed", type=int, default=0,
+                      help="First seed sampled from.")
+  return parser
+
+
+def main(argv=None):
+  parser = buildParser()
+  args = parser.parse_args(argv)
+  if args.trials < 1 or not 0 < args.significance < 1:
+    parser.error("Trials must be positive and significance between 0 and 1.")
+  try:
+    engines = ([loadEngine(path) for path in args.engine]
+               + [loadEngine(path, matchesSeeds=True)
+                  for path in args.exact_engine])
+  except ValueError as e:
+    parser.error(str(e))
+
+  passed = runHarness(engines or [REFERENCE], args.cases, args.trials,
+                      args.significance, args.seeded_runs, args.seed)
+  return 0 if passed else 1
+
+
+if __name__ == "__main__":
+  sys.exit(main())
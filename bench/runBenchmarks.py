@@ -0,0 +1,152 @@
+# Runs Azathoth's benchmarks, saving results as JSON and optionally comparing
+#   them against a stored baseline. Exits non-zero if any benchmark regressed
+#   past the threshold, so it can gate releases.
+#
+#   python bench/runBenchmarks.py --output results.json
+#   python bench/runBenchmarks.py --baseline results.json --threshold 0.1
+
+import argparse
+import json
+from pathlib import Path
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core.version import VERSION
+import scenarios
+
+# Format version of saved results, bumped on incompatible changes, including
+#   changes to the inputs benchmarks are run on.
+RESULTS_FORMAT = 3
+
+# Default fraction by which a benchmark may slow down before it has regressed.
+DEFAULT_THRESHOLD = 0.10
+
+
+def timeBenchmark(fn, repeats):
+  '''Times the given function, returning a dict of seconds per call. Calls are
+  looped enough times per repeat for timer resolution not to matter.
+  '''
+  timer = timeit.Timer(fn)
+  loops, _ = timer.autorange()
+  times = [total / loops for total in timer.repeat(repeats, loops)]
+  return {
+    "loops": loops,
+    "repeats": repeats,
+    "best": min(times),
+    "median": statistics.median(times),
+    "mean": statistics.fmean(times),
+  }
+
+
+def runBenchmarks(scenarioNames, scaleNames, repeats, report=print):
+  '''Runs the given scenarios at the given scales, returning the results,
+  ready to save as JSON.
+  '''
+  results = {}
+  with tempfile.TemporaryDirectory() as directory:
+    for name, fn in scenarios.prepare(scenarioNames, scaleNames, directory):
+      results[name] = timeBenchmark(fn, repeats)
+      report(f"{name:24} {_formatSeconds(results[name]['best']):>12}")
+  return {
+    "format": RESULTS_FORMAT,
+    "version": VERSION,
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "timestamp": time.time(),
+    "results": results,
+  }
+
+
+def compareResults(results, baseline, threshold, metric="best"):
+  '''Returns a list of tuples comparing each benchmark present in both the
+  given results and baseline: (name, baseline seconds, seconds, ratio,
+  whether regressed).
+  '''
+  comparisons = []
+  for name, result in results["results"].items():
+    if name not in baseline["results"]:
+      continue
+    baselineSeconds = baseline["results"][name][metric]
+    seconds = result[metric]
+    ratio = seconds / baselineSeconds if baselineSeconds else float("inf")
+    comparisons.append(
+      (name, baselineSeconds, seconds, ratio, ratio > 1 + threshold))
+  return comparisons
+
+
+def _formatSeconds(seconds):
+  '''Returns the given duration in the most readable unit.'''
+  for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+    if seconds >= scale:
+      return f"{seconds / scale:.2f} {unit}"
+  return f"{seconds / 1e-9:.0f} ns"
+
+
+def buildParser():
+  parser = argparse.ArgumentParser(
+    prog="runBenchmarks",
+    description="Benchmarks reading, validating, spinning, upgrading and"
+                " writing at several scales.")
+  parser.add_argument("--scenario", nargs="+", dest="scenarios",
+                      default=list(scenarios.SCENARIOS),
+                      choices=list(scenarios.SCENARIOS),
+                      help="Scenarios to run. Defaults to all.")
+  parser.add_argument("--scale", nargs="+", dest="scales",
+                      default=list(scenarios.SCALES),
+                      choices=list(scenarios.SCALES),
+                      help="Scales to run at. Defaults to all.")
+  parser.add_argument("--repeats", type=int, default=5,
+                      help="Timed repeats of each benchmark.")
+  parser.add_argument("-o", "--output",
+                      help="Path to save results to as JSON.")
+  parser.add_argument("--baseline",
+                      help="Path of saved results to compare against.")
+  parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                      help="Fraction by which a benchmark may slow down"
+                           " relative to the baseline before failing.")
+  parser.add_argument("--metric", default="best",
+                      choices=["best", "median", "mean"],
+                      help="Statistic compared against the baseline.")
+  return parser
+
+
+def main(argv=None):
+  args = buildParser().parse_args(argv)
+  results = runBenchmarks(args.scenarios, args.scales, args.repeats)
+
+  if args.output:
+    with (open(args.output, "w")) as output:
+      json.dump(results, output, indent=2)
+
+  if not args.baseline:
+    return 0
+  with (open(args.baseline)) as input:
+    baseline = json.load(input)
+  if baseline.get("format") != RESULTS_FORMAT:
+    print(f"Baseline {args.baseline} has an unsupported format.",
+          file=sys.stderr)
+    return 2
+
+  print(f"\nCompared to {args.baseline} (version"
+        f" {baseline.get('version', '?')}), by {args.metric} time:")
+  comparisons = compareResults(results, baseline, args.threshold, args.metric)
+  for name, baselineSeconds, seconds, ratio, regressed in comparisons:
+    print(f"{name:24} {_formatSeconds(baselineSeconds):>12} ->"
+          f" {_formatSeconds(seconds):>12}  {ratio:6.2f}x"
+          f"{'  REGRESSED' if regressed else ''}")
+  regressions = [comparison for comparison in comparisons if comparison[4]]
+  if regressions:
+    print(f"\n{len(regressions)} of {len(comparisons)} benchmarks regressed by"
+          f" more than {args.threshold:.0%}.", file=sys.stderr)
+    return 1
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
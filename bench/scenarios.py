@@ -0,0 +1,100 @@
+# Benchmark scenarios covering each stage of loading, spinning and saving, at
+#   several scales. Each scenario prepares its inputs up front, untimed, and
+#   returns a function doing only the work being measured.
+
+from file import azathothReader, azathothValidator, upgrader, writer
+from pathlib import Path
+import random
+from spin import spinner
+import synthetic
+
+
+class Scale():
+  '''Shape of the wheel and game YAMLs used by a scenario, and the number of
+  spins made.
+  '''
+  def __init__(self, name, spec: synthetic.WheelSpec, numSpins):
+    self.name = name
+    self.spec = spec
+    self.numSpins = numSpins
+
+
+SCALES = {scale.name: scale for scale in [
+  Scale("small", synthetic.WheelSpec(numGames=2, fanOut=10), numSpins=10),
+  Scale("medium", synthetic.WheelSpec(numGames=10, fanOut=100,
+                                      extraSettings=400), numSpins=100),
+  Scale("huge", synthetic.WheelSpec(numGames=50, fanOut=200,
+                                    extraSettings=800), numSpins=1000),
+  # Few upgrades per wheel, but nested deep and skewed, stressing the spinner's
+  #   descent into subwheels rather than the size of any one wheel.
+  Scale("deep", synthetic.WheelSpec(numGames=10, fanOut=6, depth=4,
+                                    subwheelRate=0.5, weightSkew=1.0),
+        numSpins=1000),
+]}
+
+
+class _Inputs():
+  '''Inputs shared by the scenarios of a scale, built on first use.'''
+  def __init__(self, scale: Scale, directory):
+    self.scale = scale
+    self.directory = Path(directory)
+    generated = synthetic.generate(scale.spec)
+    self.wheelYaml = generated.wheelYaml
+    self.wheelPath = self.directory / f"wheel-{scale.name}.yaml"
+    writer.writeYamlToFile(self.wheelYaml, self.wheelPath)
+    self.wheel = azathothReader.azathothToWheel(self.wheelPath)
+    self.gameYamls = generated.gameYamls
+    self.upgradeResults = spinner.spinUpgrades(self.wheel, scale.numSpins,
+                                               rng=random.Random(0))
+
+
+def _reader(inputs: _Inputs):
+  return lambda: azathothReader.azathothToWheel(inputs.wheelPath)
+
+
+def _validator(inputs: _Inputs):
+  return lambda: azathothValidator.validateAzathothYaml(inputs.wheelYaml)
+
+
+def _spinner(inputs: _Inputs):
+  # Seeded afresh each call, so every call does identical work.
+  return lambda: spinner.spinUpgrades(inputs.wheel, inputs.scale.numSpins,
+                                      rng=random.Random(0))
+
+
+def _upgrader(inputs: _Inputs):
+  # Every game's YAML is upgraded, as spins land on upgrades of every game.
+  return lambda: list(upgrader.toUpgradedYamls(inputs.upgradeResults,
+                                               inputs.gameYamls))
+
+
+def _summary(inputs: _Inputs):
+  return lambda: upgrader.toSummaryYamlStr(inputs.upgradeResults)
+
+
+def _writer(inputs: _Inputs):
+  outputPath = inputs.directory / f"written-{inputs.scale.name}.yaml"
+  return lambda: writer.writeYamlsToFile(inputs.gameYamls, outputPath)
+
+
+# Dict mapping each scenario's name to a function taking a scale's inputs and
+#   returning the function to time.
+SCENARIOS = {
+  "reader": _reader,
+  "validator": _validator,
+  "spinner": _spinner,
+  "upgrader": _upgrader,
+  "summary": _summary,
+  "writer": _writer,
+}
+
+
+def prepare(scenarioNames, scaleNames, directory):
+  '''Yields a tuple for each given scenario at each given scale: (name of the
+  benchmark, function to time). Temporary files are written to the given
+  directory.
+  '''
+  for scaleName in scaleNames:
+    inputs = _Inputs(SCALES[scaleName], directory)
+    for scenarioName in scenarioNames:
+      yield f"{scenarioName}/{scaleName}", SCENARIOS[scenarioName](inputs)
@@ -0,0 +1,286 @@
+# Synthetic wheels and game YAMLs for benchmarks and stress tests, built as
+#   parsed YAML objects so they can be written out or used in memory alike.
+#   Wheels are shaped by a WheelSpec, covering nesting depth, fan-out, weight
+#   skew and the mix of progressions, and are always valid. Every random choice
+#   draws from a generator seeded by the spec, so the same spec always yields
+#   the same wheel and game YAMLs.
+#
+#   python bench/synthetic.py out --games 5 --fan-out 20 --depth 2 --seed 7
+
+import argparse
+from pathlib import Path
+import random
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+# Weight of the heaviest choice on a wheel. Others fall away from it by rank,
+#   as steeply as the spec's weight skew asks.
+MAX_WEIGHT = 100
+
+# Most values listed by a generated progression.
+MAX_VALUES = 5
+
+
+class ProgressionKind:
+  '''Constants for the kinds of progression a generated upgrade can have.'''
+  UNIQUE = "UNIQUE"          # The UNIQUE macro.
+  ONE_PER = "ONE_PER"        # The ONE_PER macro.
+  VALUES = "values"          # A list of values, selected at most once each.
+  INCREMENT = "increment"    # Counts up by an increment, indefinitely.
+  STOP_AT = "stopAt"         # Counts up by an increment, up to a final value.
+  SPIN_LIMIT = "spinLimit"   # Counts up by an increment, a number of times.
+  MANUAL = "manual"          # A manual upgrade, which has no path.
+
+
+# Relative frequency of each kind of progression, unless a spec gives its own.
+DEFAULT_PROGRESSION_MIX = {
+  ProgressionKind.UNIQUE: 1,
+  ProgressionKind.ONE_PER: 1,
+  ProgressionKind.VALUES: 2,
+  ProgressionKind.INCREMENT: 2,
+  ProgressionKind.STOP_AT: 2,
+  ProgressionKind.SPIN_LIMIT: 1,
+  ProgressionKind.MANUAL: 1,
+}
+
+
+class WheelSpec():
+  '''Shape of a synthetic wheel and its game YAMLs.
+
+  The top-level wheel has a subwheel for each game, holding {fanOut} choices.
+  Until {depth} levels of subwheels below it, each of those choices is itself
+  a subwheel of {fanOut} choices at the rate {subwheelRate}, and an upgrade
+  otherwise. Choices are weighted by rank, the nth heaviest weighing
+  MAX_WEIGHT / n^{weightSkew}, so 0 gives even weights. Progressions are drawn
+  from the given mix of ProgressionKinds to relative frequencies. Each game
+  YAML holds a setting for each upgrade of its game, plus {extraSettings}
+  settings untouched by any upgrade.
+  '''
+  def __init__(self, numGames=3, fanOut=10, depth=0, subwheelRate=0.25,
+               weightSkew=0.0, progressionMix=None, extraSettings=40, seed=0):
+    if numGames < 1 or fanOut < 1 or depth < 0:
+      raise ValueError("Spec needs at least one game and choice per wheel,"
+                       " and no negative depth.")
+    if not 0 <= subwheelRate <= 1:
+      raise ValueError(f"Subwheel rate {subwheelRate} is not between 0 and 1.")
+    progressionMix = progressionMix or DEFAULT_PROGRESSION_MIX
+    if unknown := (progressionMix.keys() - DEFAULT_PROGRESSION_MIX.keys()):
+      raise ValueError(f"Progression mix has unknown kinds {sorted(unknown)}.")
+    if sum(progressionMix.values()) <= 0:
+      raise ValueError(f"Progression mix {progressionMix} has no weight.")
+
+    self.numGames = numGames
+    self.fanOut = fanOut
+    self.depth = depth
+    self.subwheelRate = subwheelRate
+    self.weightSkew = weightSkew
+    self.progressionMix = dict(progressionMix)
+    self.extraSettings = extraSettings
+    self.seed = seed
+
+
+class SyntheticWheel():
+  '''A generated wheel and the game YAMLs it upgrades, one per game.'''
+  def __init__(self, wheelYaml, gameYamls):
+    self.wheelYaml = wheelYaml
+    self.gameYamls = gameYamls
+
+
+def _gameName(gameIndex):
+  return f"Game {gameIndex}"
+
+
+def _makeValues(rng: random.Random, count):
+  '''Returns the given number of ascending values.'''
+  start, step = rng.randint(0, 10), rng.randint(1, 5)
+  return [start + step * i for i in range(count)]
+
+
+def _makeProgression(rng: random.Random, kind):
+  '''Returns a progression YAML of the given ProgressionKind.'''
+  if kind in (ProgressionKind.UNIQUE, ProgressionKind.ONE_PER):
+    return kind
+  if kind == ProgressionKind.VALUES:
+    return {"values": _makeValues(rng, rng.randint(2, MAX_VALUES))}
+
+  increment = rng.randint(1, 5)
+  progression = {"values": _makeValues(rng, rng.randint(1, MAX_VALUES)),
+                 "increment": increment}
+  if kind == ProgressionKind.STOP_AT:
+    progression["stopAt"] = (progression["values"][-1]
+                             + increment * rng.randint(1, 10))
+  elif kind == ProgressionKind.SPIN_LIMIT:
+    progression["spinLimit"] = (len(progression["values"])
+                                + rng.randint(1, 10))
+  return progression
+
+
+class _Generator():
+  '''Builds the wheel and game YAMLs of a spec, drawing from a single seeded
+  generator in a fixed order.
+  '''
+  def __init__(self, spec: WheelSpec):
+    self.spec = spec
+    self.rng = random.Random(spec.seed)
+    self.kinds = list(spec.progressionMix)
+    self.kindWeights = list(spec.progressionMix.values())
+
+  def _makeWeights(self, count):
+    '''Returns weights for the given number of choices, skewed by rank and
+    shuffled so the heaviest choice falls anywhere on the wheel.
+    '''
+    weights = [max(1, round(MAX_WEIGHT / rank ** self.spec.weightSkew))
+               for rank in range(1, count + 1)]
+    self.rng.shuffle(weights)
+    return weights
+
+  def _makeUpgrade(self, settings):
+    '''Returns an upgrade choice YAML, adding the setting it upgrades, if any,
+    to the given dict of settings.
+    '''
+    name = f"Upgrade {len(settings)}"
+    kind = self.rng.choices(self.kinds, self.kindWeights)[0]
+    if kind == ProgressionKind.MANUAL:
+      # Manual upgrades have no path, but still need a progression.
+      upgrade = {"type": "manual",
+                 "progression": _makeProgression(self.rng,
+                                                 ProgressionKind.UNIQUE)}
+    else:
+      setting = f"setting_{len(settings)}"
+      upgrade = {"path": ["options", setting],
+                 "progression": _makeProgression(self.rng, kind)}
+    # Count manual upgrades too, so every upgrade of a game has its own name.
+    settings[name] = upgrade.get("path")
+    return {"name": name, "upgrade": upgrade}
+
+  def _makeChoices(self, level, wheelName, settings):
+    '''Returns the weighted choices of a wheel at the given level below its
+    game's wheel.
+    '''
+    choices = []
+    for index, weight in enumerate(self._makeWeights(self.spec.fanOut)):
+      if (level < self.spec.depth
+          and self.rng.random() < self.spec.subwheelRate):
+        name = f"{wheelName}.{index}"
+        choice = {"name": name,
+                  "wheel": self._makeChoices(level + 1, name, settings)}
+      else:
+        choice = self._makeUpgrade(settings)
+      choice["weight"] = weight
+      choices.append(choice)
+    return choices
+
+  def _makeGameYaml(self, game, settings):
+    '''Returns a game YAML with the given upgraded settings, among untouched
+    ones.
+    '''
+    options = {path[-1]: 0 for path in settings.values() if path}
+    for index in range(self.spec.extraSettings):
+      options[f"untouched_{index}"] = self.rng.choice(
+        [self.rng.randint(0, 100), f"value_{index}", self.rng.random() < 0.5])
+    return {"name": "Player", "game": game, game: {"options": options}}
+
+  def generate(self) -> SyntheticWheel:
+    gameWheels = []
+    gameYamls = []
+    for gameIndex in range(self.spec.numGames):
+      game = _gameName(gameIndex)
+      settings = {}
+      gameWheels.append({
+        "game": game,
+        "wheel": self._makeChoices(0, f"Wheel {gameIndex}", settings),
+      })
+      gameYamls.append(self._makeGameYaml(game, settings))
+    wheelYaml = {"name": f"Synthetic Wheel {self.spec.seed}",
+                 "wheel": gameWheels}
+    return SyntheticWheel(wheelYaml, gameYamls)
+
+
+def generate(spec: WheelSpec) -> SyntheticWheel:
+  '''Returns the wheel and game YAMLs described by the given spec. The same
+  spec always yields the same YAMLs.
+  '''
+  return _Generator(spec).generate()
+
+
+def writeSyntheticWheel(synthetic: SyntheticWheel, directory):
+  '''Writes the given wheel and game YAMLs to the given folder, as wheel.yaml
+  and a game-N.yaml per game. Returns the path of the wheel.
+  '''
+  from file import writer
+
+  directory = Path(directory)
+  directory.mkdir(parents=True, exist_ok=True)
+  wheelPath = directory / "wheel.yaml"
+  writer.writeYamlToFile(synthetic.wheelYaml, wheelPath)
+  for gameIndex, gameYaml in enumerate(synthetic.gameYamls):
+    writer.writeYamlToFile(gameYaml, directory / f"game-{gameIndex}.yaml")
+  return wheelPath
+
+
+def _parseMix(entries):
+  '''Returns a progression mix from the given KIND=WEIGHT strings.'''
+  mix = {}
+  for entry in entries:
+    kind, _, weight = entry.partition("=")
+    try:
+      mix[kind] = float(weight)
+    except ValueError:
+      raise argparse.ArgumentTypeError(
+        f"Mix entry '{entry}' is not KIND=WEIGHT.")
+  return mix
+
+
+def buildParser():
+  parser = argparse.ArgumentParser(
+    prog="synthetic",
+    description="Generates a valid Azathoth wheel and matching game YAMLs of"
+                " any shape and size. The same options always generate the"
+                " same files.")
+  parser.add_argument("output", help="Folder to write the YAMLs to.")
+  parser.add_argument("--games", type=int, default=3,
+                      help="Number of games, each with its own subwheel.")
+  parser.add_argument("--fan-out", type=int, default=10,
+                      help="Number of choices on each wheel.")
+  parser.add_argument("--depth", type=int, default=0,
+                      help="Most levels of subwheels below each game's wheel.")
+  parser.add_argument("--subwheel-rate", type=float, default=0.25,
+                      help="Fraction of choices above the deepest level that"
+                           " are subwheels.")
+  parser.add_argument("--weight-skew", type=float, default=0.0,
+                      help="How steeply weights fall by rank. 0 weighs every"
+                           " choice evenly.")
+  parser.add_argument("--mix", nargs="+", metavar="KIND=WEIGHT",
+                      help="Relative frequency of each kind of progression,"
+                           f" among: {', '.join(DEFAULT_PROGRESSION_MIX)}."
+                           " Defaults to a mix of all of them.")
+  parser.add_argument("--extra-settings", type=int, default=40,
+                      help="Settings in each game YAML no upgrade touches.")
+  parser.add_argument("--seed", type=int, default=0,
+                      help="Seed of every random choice made.")
+  return parser
+
+
+def main(argv=None):
+  parser = buildParser()
+  args = parser.parse_args(argv)
+  try:
+    spec = WheelSpec(numGames=args.games, fanOut=args.fan_out,
+                     depth=args.depth, subwheelRate=args.subwheel_rate,
+                     weightSkew=args.weight_skew,
+                     progressionMix=_parseMix(args.mix) if args.mix else None,
+                     extraSettings=args.extra_settings, seed=args.seed)
+  except (ValueError, argparse.ArgumentTypeError) as e:
+    parser.error(str(e))
+
+  from file import azathothValidator
+  synthetic = generate(spec)
+  azathothValidator.validateAzathothYaml(synthetic.wheelYaml)
+  wheelPath = writeSyntheticWheel(synthetic, args.output)
+  print(f"Wrote {wheelPath} and {len(synthetic.gameYamls)} game YAMLs.")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
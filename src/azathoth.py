@@ -1,8 +1,12 @@
+from gui import startupTimer
+from core.version import VERSION
+from diagnostics import memoryProfiler, tracing
 from gui import ui
 
-VERSION = "0.2.3"
-
 def run():
+   startupTimer.mark("imports")
+   tracing.enableFromEnvironment()
+   memoryProfiler.enableFromEnvironment()
    ui.start(VERSION)
 
 run()
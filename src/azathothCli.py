@@ -0,0 +1,271 @@
+# Command-line entry point for Azathoth. Runs entirely on the headless core, so
+#   it never imports tkinter and works on machines without Tk.
+
+import argparse
+import asyncio
+import contextlib
+from core import azathothCore, batch, service, sessions
+from core.version import VERSION
+from data.spinHistory import RunKind, SpinHistory
+from diagnostics import memoryProfiler, metrics, tracing
+from file.bundler import BUNDLE_COMPRESSIONS
+from file.summaryRenderer import SUMMARY_FORMAT_EXTENSIONS, SummaryFormat
+import multiprocessing
+import os
+import signal
+import sys
+
+
+def _toSaveOptions(args):
+  '''Returns the SaveOptions described by the given parsed arguments.'''
+  return azathothCore.SaveOptions(
+    asPatches=args.patches,
+    asBundle=args.bundle,
+    stream=args.stream,
+    summaryFormat=args.summary_format,
+    compression=args.compression)
+
+
+def _openHistory(args):
+  '''Returns the spin history to record to, if the arguments ask for one.'''
+  if args.history is None:
+    return None
+  return SpinHistory(args.history or None)
+
+
+def _recordRun(history: SpinHistory, player, upgradeResults, wheelName,
+               wheelHash, seed=None, spins=None):
+  '''Records the spin, if any, and save of the given upgrade results.'''
+  if spins is not None:
+    history.record(RunKind.SPIN, player, upgradeResults, wheelHash=wheelHash,
+                   wheelName=wheelName, seed=seed, spins=spins)
+  history.record(RunKind.SAVE, player, upgradeResults, wheelHash=wheelHash,
+                 wheelName=wheelName)
+
+
+def _upgrade(args):
+  '''Spins a wheel and saves the upgraded game YAMLs and summary.'''
+  wheel = azathothCore.loadWheel(args.wheel)
+  gameYamls = azathothCore.loadGameYamls(
+    azathothCore.findGameYamls(args.games))
+  if not gameYamls:
+    raise ValueError("No game YAMLs found to upgrade.")
+
+  upgradeResults = azathothCore.spin(wheel, args.spins, seed=args.seed)
+  if missingGames := azathothCore.getMissingGames(upgradeResults, gameYamls):
+    print(f"Warning: upgrades for games missing from the given YAMLs will have"
+          f" no effect: {', '.join(sorted(missingGames))}", file=sys.stderr)
+
+  os.makedirs(args.output, exist_ok=True)
+  outputPaths = azathothCore.upgradeAndSave(
+    upgradeResults, gameYamls, args.output, options=_toSaveOptions(args),
+    version=VERSION)
+  for outputPath in outputPaths:
+    print(outputPath)
+
+  if history := _openHistory(args):
+    with history:
+      _recordRun(history, args.player, upgradeResults, wheel.displayName,
+                 sessions.hashFile(args.wheel), seed=args.seed,
+                 spins=args.spins)
+
+
+def _batch(args):
+  '''Spins and saves upgrades for every player in a batch manifest.'''
+  jobs = batch.readManifest(args.manifest)
+  history = _openHistory(args)
+
+  def report(result: batch.PlayerResult):
+    if result.error:
+      print(f"{result.job.player}: FAILED: {result.error}", file=sys.stderr)
+      return
+    print(f"{result.job.player}: wrote {len(result.outputPaths)} files to"
+          f" {result.job.outputDirectory}")
+    if history:
+      job = result.job
+      _recordRun(history, job.player, result.upgradeResults, result.wheelName,
+                 result.wheelHash, seed=job.seed, spins=job.spins)
+
+  with (history or contextlib.nullcontext(),
+        metrics.PeriodicLogger(args.metrics_interval)):
+    results = batch.runBatch(jobs, options=_toSaveOptions(args),
+                             version=VERSION, maxWorkers=args.jobs,
+                             onResult=report)
+  if failures := [result for result in results if result.error]:
+    raise ValueError(f"{len(failures)} of {len(results)} players failed.")
+
+
+def _serve(args):
+  '''Runs the local HTTP/JSON service until interrupted.'''
+  sessionManager = sessions.SessionManager(
+    maxSessions=args.max_sessions, maxCacheBytes=args.cache_mb << 20)
+  azathothService = service.AzathothService(
+    host=args.host, port=args.port, version=VERSION, workers=args.jobs,
+    sessions=sessionManager, history=_openHistory(args), root=args.root,
+    allowedOrigins=args.allow_origin)
+
+  async def serve():
+    await azathothService.start()
+    print(f"Serving on http://{azathothService.host}:{azathothService.port}",
+          flush=True)
+
+    # Stop cleanly on SIGTERM too, shutting down worker processes.
+    with contextlib.suppress(NotImplementedError):
+      asyncio.get_running_loop().add_signal_handler(
+        signal.SIGTERM, asyncio.current_task().cancel)
+    await azathothService.serveForever()
+
+  with (contextlib.suppress(KeyboardInterrupt, asyncio.CancelledError),
+        metrics.PeriodicLogger(args.metrics_interval)):
+    asyncio.run(serve())
+
+
+def _addSaveArguments(parser):
+  '''Adds arguments mirroring the app's save preferences to the given parser.
+  '''
+  parser.add_argument("--patches", action="store_true",
+                      help="Save compact patches instead of upgraded YAMLs.")
+  parser.add_argument("--bundle", action="store_true",
+                      help="Save every output into a single zip archive.")
+  parser.add_argument("--compression", default="deflated",
+                      choices=list(BUNDLE_COMPRESSIONS.keys()),
+                      help="Compression used for bundles.")
+  parser.add_argument("--stream", action="store_true",
+                      help="Stream upgrades through each YAML in a single pass,"
+                           " preserving its layout.")
+  parser.add_argument("--summary-format", default=SummaryFormat.YAML,
+                      choices=list(SUMMARY_FORMAT_EXTENSIONS.keys()),
+                      help="Format of the summary file.")
+  _addHistoryArgument(parser)
+
+
+def _addHistoryArgument(parser):
+  '''Adds an argument enabling spin history recording to the given parser.'''
+  parser.add_argument("--history", nargs="?", const="", metavar="DATABASE",
+                      help="Record spins and saves to a history database,"
+                           " by default the app's own.")
+
+
+def _exportReport(reporter, path, description):
+  '''Saves the given tracer's or profiler's report to the given path.'''
+  try:
+    reporter.export(path)
+  except OSError as e:
+    print(f"Error: Failed to save {description}: {e}", file=sys.stderr)
+
+
+def _addMetricsArgument(parser):
+  '''Adds an argument setting how often metrics are logged to the given parser.
+  '''
+  parser.add_argument("--metrics-interval", type=float,
+                      default=metrics.DEFAULT_LOG_INTERVAL, metavar="SECONDS",
+                      help="Seconds between lines logging metrics to stderr."
+                           " 0 disables them.")
+
+
+def buildParser():
+  '''Returns the parser for Azathoth's command-line arguments.'''
+  parser = argparse.ArgumentParser(
+    prog="azathothCli",
+    description="Spins Azathoth wheels and upgrades game YAMLs without a GUI.")
+  parser.add_argument("--version", action="version",
+                      version=f"Azathoth {VERSION}")
+  parser.add_argument("--trace", metavar="PATH",
+                      help="Time each step of loading, spinning and saving,"
+                           " saving the timings to the given path as a Chrome"
+                           " trace, viewable in Perfetto (ui.perfetto.dev).")
+  parser.add_argument("--memory-profile", metavar="PATH",
+                      help="Profile the memory used by loading, upgrading and"
+                           " saving, saving a report to the given path. Slows"
+                           " everything down severalfold.")
+  subparsers = parser.add_subparsers(dest="command", required=True)
+
+  upgradeParser = subparsers.add_parser(
+    "upgrade", help="Spin a wheel and save upgraded game YAMLs.")
+  upgradeParser.add_argument("wheel", help="Path to an Azathoth wheel.")
+  upgradeParser.add_argument("games", nargs="+",
+                             help="Game YAMLs, or directories of them.")
+  upgradeParser.add_argument("-n", "--spins", type=int, required=True,
+                             help="Number of times to spin the wheel.")
+  upgradeParser.add_argument("-o", "--output", required=True,
+                             help="Directory to save outputs to.")
+  upgradeParser.add_argument("--seed", type=int,
+                             help="Seed making spins reproducible.")
+  upgradeParser.add_argument("--player", default=sessions.DEFAULT_PLAYER,
+                             help="Player to record spins under in history.")
+  _addSaveArguments(upgradeParser)
+  upgradeParser.set_defaults(run=_upgrade)
+
+  batchParser = subparsers.add_parser(
+    "batch", help="Spin and save upgrades for every player in a manifest.")
+  batchParser.add_argument("manifest", help="Path to a batch manifest YAML.")
+  batchParser.add_argument("-j", "--jobs", type=int,
+                           help="Number of worker processes. Defaults to the"
+                                " number of CPUs; 1 runs without a pool.")
+  _addSaveArguments(batchParser)
+  _addMetricsArgument(batchParser)
+  batchParser.set_defaults(run=_batch)
+
+  serveParser = subparsers.add_parser(
+    "serve", help="Serve spins and saves over a local HTTP/JSON API.")
+  serveParser.add_argument("--host", default=service.DEFAULT_HOST,
+                           help="Address to listen on.")
+  serveParser.add_argument("--port", type=int, default=service.DEFAULT_PORT,
+                           help="Port to listen on.")
+  serveParser.add_argument("--root", default=".",
+                           help="Folder that every wheel, game YAML and output"
+                                " path given to the service must lie within."
+                                " Defaults to the working folder.")
+  serveParser.add_argument("--allow-origin", action="append", default=[],
+                           metavar="ORIGIN",
+                           help="Web page origin allowed to call the service,"
+                                " e.g. http://localhost:3000. May be repeated."
+                                " Requests from other pages are refused.")
+  serveParser.add_argument("-j", "--jobs", type=int,
+                           help="Number of worker processes for spins and"
+                                " simulations. Defaults to the number of CPUs.")
+  serveParser.add_argument("--max-sessions", type=int,
+                           default=sessions.DEFAULT_MAX_SESSIONS,
+                           help="Most player sessions kept at once. The least"
+                                " recently used is dropped beyond this.")
+  serveParser.add_argument("--cache-mb", type=int,
+                           default=sessions.DEFAULT_CACHE_BYTES >> 20,
+                           help="Memory budget, in MiB, for every wheel and"
+                                " game YAML loaded. The least recently used"
+                                " sessions are dropped to stay within it.")
+  _addHistoryArgument(serveParser)
+  _addMetricsArgument(serveParser)
+  serveParser.set_defaults(run=_serve)
+
+  return parser
+
+
+def main(argv=None):
+  '''Runs the command described by the given arguments, returning the exit
+  code.
+  '''
+  multiprocessing.freeze_support()
+  args = buildParser().parse_args(argv)
+  tracing.enableFromEnvironment()
+  memoryProfiler.enableFromEnvironment()
+  if args.trace:
+    tracing.enable()
+  if args.memory_profile:
+    memoryProfiler.enable()
+  try:
+    args.run(args)
+  except (OSError, ValueError) as e:
+    print(f"Error: {e}", file=sys.stderr)
+    return 1
+  finally:
+    # Reports of failed runs are kept too, as they're often the most telling.
+    if args.trace:
+      _exportReport(tracing.getTracer(), args.trace, "trace")
+    if args.memory_profile:
+      _exportReport(memoryProfiler.getProfiler(), args.memory_profile,
+                    "memory report")
+  return 0
+
+
+if __name__ == "__main__":
+  sys.exit(main())
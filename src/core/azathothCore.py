@@ -0,0 +1,419 @@
+# Headless Azathoth API. Loads wheels and game YAMLs, spins, upgrades and
+#   writes outputs exactly as the app does, but never imports tkinter, so it can
+#   run on machines without Tk and be embedded in other tooling.
+#
+# Long-running functions accept an optional progress callback, called as
+#   progress(fraction, message) before each unit of work. It may raise to abort.
+
+from data.upgrades import Upgrade, Wheel
+from diagnostics import memoryProfiler, metrics, tracing
+from file import (azathothReader, bundler, eventUpgrader, patcher,
+                  summaryRenderer, upgrader, writer, yamlReader)
+from file.summaryRenderer import SummaryFormat
+import functools
+import os
+from pathlib import Path
+import random
+import shutil
+from spin import spinner
+import tempfile
+import time
+
+# Prefix prepended to output upgraded YAML files. Prevents overwrite of inputs.
+UPGRADE_PREFIX = "upgraded-"
+
+# Name of the summary file written alongside upgraded YAMLs, sans extension.
+SUMMARY_FILENAME = "azathothSummary"
+
+# Name of the single archive written when saving as a bundle.
+BUNDLE_FILENAME = "azathothBundle.zip"
+
+# How long each operation takes, and how often it fails.
+_LOAD_WHEEL = metrics.Operation("load_wheel")
+_LOAD_GAMES = metrics.Operation("load_games")
+_SPIN = metrics.Operation("spin")
+_UPGRADE = metrics.Operation("upgrade")
+_SAVE = metrics.Operation("save")
+
+
+class GameYaml():
+  '''A loaded game YAML file, and the games it configures.
+
+  Documents are read from the file again, one at a time, whenever they are
+  needed, so holding a GameYaml costs the same however large its file is.
+  Documents may instead be given to be held, e.g. when cached and shared.
+  '''
+  def __init__(self, path, games=None, documents=None):
+    self.path = path
+    self.documents = documents
+    if games is None:
+      games = _getGames(documents or [])
+    self.games = games
+
+  def readDocuments(self):
+    '''Returns an iterator over the file's YAML documents, reading them one at
+    a time unless they are held.
+    '''
+    if self.documents is not None:
+      return iter(self.documents)
+    return yamlReader.readToYamls(self.path)
+
+
+def _getGames(documents):
+  '''Returns the set of games configured by the given YAML documents.'''
+  return {key for document in documents if isinstance(document, dict)
+          for key in document.keys()}
+
+
+class SaveOptions():
+  '''Options controlling how upgrades are saved, mirroring the app's save
+  preferences.
+  '''
+  def __init__(self, asPatches=False, asBundle=False, stream=False,
+               summaryFormat=SummaryFormat.YAML, compression="deflated"):
+    self.asPatches = asPatches
+    self.asBundle = asBundle
+    self.stream = stream
+    self.summaryFormat = summaryFormat
+    self.compression = compression
+
+
+def _noProgress(fraction, message):
+  '''Default progress callback, ignoring all progress.'''
+
+
+def loadWheel(path) -> Wheel:
+  '''Loads, validates and returns the Azathoth wheel at the given path.'''
+  with (tracing.span("load wheel", path=str(path)), _LOAD_WHEEL.time(),
+        memoryProfiler.phase("load wheel") as memoryPhase):
+    wheel = azathothReader.azathothToWheel(path)
+    memoryPhase.measure("wheel", wheel)
+  return wheel
+
+
+def getAllUpgrades(wheel: Wheel):
+  '''Returns a list of all upgrades contained in the given wheel and its
+  subwheels.
+  '''
+  allUpgrades = []
+  for choice in wheel.choices:
+    if choice.wheelResult:
+      allUpgrades.extend(getAllUpgrades(choice.wheelResult))
+    elif choice.upgradeResult:
+      allUpgrades.append(choice.upgradeResult)
+  return allUpgrades
+
+
+def spin(wheel: Wheel, numSpins: int, seed=None):
+  '''Spins the given wheel the given number of times, returning a dict mapping
+  upgrades to the number of times they were rolled. Spins with the same seed
+  always produce the same results.
+  '''
+  rng = random.Random(seed) if seed is not None else None
+  with _SPIN.time():
+    return spinner.spinUpgrades(wheel, numSpins, rng=rng)
+
+
+def simulateSpins(wheel: Wheel, numSpins: int, trials: int, seed=None):
+  '''Spins the given wheel the given number of times in each of the given
+  number of independent trials. Returns two lists aligned with
+  getAllUpgrades(wheel): the total times each upgrade was rolled, and the
+  number of trials in which it was rolled at all.
+  '''
+  upgrades = getAllUpgrades(wheel)
+  positionsByUpgrade = {upgrade: i for i, upgrade in enumerate(upgrades)}
+  totalCounts = [0] * len(upgrades)
+  trialsSelected = [0] * len(upgrades)
+
+  rng = random.Random(seed)
+  for _ in range(trials):
+    for upgrade, count in spinner.spinUpgrades(wheel, numSpins, rng=rng).items():
+      position = positionsByUpgrade[upgrade]
+      totalCounts[position] += count
+      trialsSelected[position] += 1
+  return totalCounts, trialsSelected
+
+
+def toSelections(upgradeResults: dict[Upgrade, int]):
+  '''Returns the given upgrade results as a list of JSON-friendly dicts, each
+  describing a selected upgrade, its count and the value it produces.
+  '''
+  return [{
+      "game": upgrade.yamlPath[0],
+      "upgrade": upgrade.name,
+      "type": upgrade.type.name.lower(),
+      "path": list(upgrade.yamlPath[1:]),
+      "count": count,
+      "value": upgrader.getValue(upgrade, count),
+    } for upgrade, count in upgradeResults.items() if count > 0]
+
+
+def toUpgradeResults(wheel: Wheel, selectionsByGame: dict):
+  '''Returns an upgrade results dict for the given fixed selections, given as
+  a dict mapping each game to a dict of upgrade names and how many times each
+  was selected.
+
+  Raises ValueError if any selection isn't on the given wheel or exceeds the
+  number of times its upgrade can be selected.
+  '''
+  upgradesByGameAndName = {(upgrade.yamlPath[0], upgrade.name): upgrade
+                           for upgrade in getAllUpgrades(wheel)}
+  upgradeResults = {}
+  for game, countsByName in selectionsByGame.items():
+    for name, count in countsByName.items():
+      upgrade = upgradesByGameAndName.get((game, name))
+      if upgrade is None:
+        raise ValueError(f"Selected upgrade {name} for {game} is not on wheel"
+                         f" {wheel.displayName}.")
+      if not isinstance(count, int) or count < 0:
+        raise ValueError(f"Selected upgrade {name} for {game} has invalid"
+                         f" count {count}.")
+      limit = spinner.getLimitForUpgrade(upgrade, {})
+      if limit != -1 and count > limit:
+        raise ValueError(f"Selected upgrade {name} for {game} was selected"
+                         f" {count} times, but has a limit of {limit}.")
+      if count:
+        upgradeResults[upgrade] = count
+  return upgradeResults
+
+
+def loadGameYamls(paths, progress=_noProgress):
+  '''Loads the game YAMLs at the given paths, returning a GameYaml for each.
+
+  Each file is parsed a document at a time, to check it and find the games it
+  configures, but no documents are kept.
+  '''
+  paths = list(paths)
+  gameYamls = []
+  with (_LOAD_GAMES.time(),
+        memoryProfiler.phase("load game yamls") as memoryPhase):
+    for i, path in enumerate(paths):
+      progress(i / len(paths), f"Loading {Path(path).name}")
+      with tracing.span("load game yamls", path=str(path)):
+        gameYamls.append(
+          GameYaml(path, games=_getGames(yamlReader.readToYamls(path))))
+    memoryPhase.measure("game yamls", gameYamls)
+  return gameYamls
+
+
+def findGameYamls(paths):
+  '''Returns the paths of game YAMLs among the given paths, expanding each
+  directory to the YAMLs directly inside it. Files previously written by
+  Azathoth are skipped.
+  '''
+  gameYamlPaths = []
+  for path in map(Path, paths):
+    if path.is_dir():
+      gameYamlPaths.extend(
+        childPath for childPath in sorted(path.glob("*.yaml"))
+        if not childPath.name.startswith((UPGRADE_PREFIX, SUMMARY_FILENAME)))
+    else:
+      gameYamlPaths.append(path)
+  return gameYamlPaths
+
+
+def getMissingGames(upgradeResults: dict, gameYamls):
+  '''Returns the set of games with upgrades in the given results that appear
+  in none of the given game YAMLs. Upgrades to these games have no effect.
+  '''
+  gameTitlesToUpgrade = {upgrade.yamlPath[0] for upgrade in upgradeResults}
+  return gameTitlesToUpgrade.difference(
+    *(gameYaml.games for gameYaml in gameYamls))
+
+
+def withAzathothHeader(yaml, version=None):
+  '''Returns a copy of the given YAML with an Azathoth header prepended.'''
+
+  # Only this complicated so we can force to appear early/first in the dict.
+  headedDict = {}
+  if version:
+    headedDict[summaryRenderer.HEADER_BLOCK] = {
+      summaryRenderer.HEADER_VERSION: version,
+    }
+  headedDict.update(yaml)
+  return headedDict
+
+
+def prepareWrites(upgradeResults: dict[Upgrade, int], gameYamls,
+                  options: SaveOptions, version=None, progress=_noProgress):
+  '''Prepares upgrades of every given GameYaml, returning a dict mapping each
+  output filename to a write action that writes its contents to a given text
+  stream. Patches are found straight away, while upgraded YAMLs are upgraded a
+  document at a time as they are written.
+  '''
+  with memoryProfiler.phase("upgrade") as memoryPhase:
+    filenameToWrite = _prepareWrites(upgradeResults, gameYamls, options,
+                                     version=version, progress=progress)
+    memoryPhase.measure("upgraded outputs", filenameToWrite)
+  return filenameToWrite
+
+
+def _prepareWrites(upgradeResults: dict[Upgrade, int], gameYamls,
+                   options: SaveOptions, version=None, progress=_noProgress):
+  filenameToWrite = dict()
+  for i, gameYaml in enumerate(gameYamls):
+    gameFilePath = gameYaml.path
+    filename = Path(gameFilePath).name
+    progress(i / len(gameYamls), f"Upgrading {filename}")
+
+    if options.asPatches:
+      # Write a compact patch describing only what the upgrades change.
+      upgradedFilename = (
+        UPGRADE_PREFIX + Path(gameFilePath).stem + patcher.PATCH_EXTENSION)
+      with (tracing.span("upgrade", path=str(gameFilePath)),
+            _UPGRADE.time()):
+        patches = list(patcher.toPatches(upgradeResults,
+                                         gameYaml.readDocuments()))
+      write = functools.partial(patcher.dumpPatches, patches,
+        source=filename, version=version)
+
+    elif options.stream:
+      # Streamed upgrades are read, applied, and written in a single pass
+      # over the original file, so nothing is prepared ahead of writing.
+      upgradedFilename = UPGRADE_PREFIX + filename
+      write = functools.partial(_emitUpgradedEvents, upgradeResults, gameYaml,
+                                version=version)
+
+    else:
+      # Write a new yaml with the upgrades included.
+      upgradedFilename = UPGRADE_PREFIX + filename
+      write = functools.partial(_dumpUpgradedYamls, upgradeResults, gameYaml,
+                                version=version)
+
+    filenameToWrite[upgradedFilename] = write
+
+  # Prepare the Azathoth summary.
+  summaryFilename = (SUMMARY_FILENAME + "."
+    + summaryRenderer.SUMMARY_FORMAT_EXTENSIONS[options.summaryFormat])
+  summaryTree = summaryRenderer.SummaryTree(upgradeResults)
+  filenameToWrite[summaryFilename] = functools.partial(
+    summaryTree.render, format=options.summaryFormat, version=version)
+  return filenameToWrite
+
+
+def _toUpgradedYamls(upgradeResults: dict[Upgrade, int], gameYaml: GameYaml,
+                     version=None):
+  '''Lazily yields each of the given GameYaml's documents upgraded, with an
+  Azathoth header, reading and upgrading one document at a time. Time spent
+  upgrading is observed once the whole file is upgraded, excluding time spent
+  by the caller between documents.
+  '''
+  seconds = 0
+  with tracing.span("upgrade", path=str(gameYaml.path)):
+    for document in gameYaml.readDocuments():
+      start = time.perf_counter()
+      try:
+        upgradedYaml = upgrader.toUpgradedYaml(upgradeResults, document)
+      except Exception:
+        _UPGRADE.errors.inc()
+        raise
+      seconds += time.perf_counter() - start
+      yield withAzathothHeader(upgradedYaml, version)
+  _UPGRADE.seconds.observe(seconds)
+
+
+def _dumpUpgradedYamls(upgradeResults: dict[Upgrade, int], gameYaml: GameYaml,
+                       output, version=None):
+  '''Writes the given GameYaml's documents, upgraded, to the given text stream.
+  '''
+  writer.dumpYamls(_toUpgradedYamls(upgradeResults, gameYaml, version), output)
+
+
+def _emitUpgradedEvents(upgradeResults: dict[Upgrade, int],
+                        gameYaml: GameYaml, output, version=None):
+  '''Writes the given GameYaml's file, upgraded in a single pass over its
+  events, to the given text stream. If the stream turns out not to be
+  upgradable, what was written is discarded and its documents are upgraded
+  instead. Seekable outputs are simply rewound to do so, while others are
+  written through a temporary file.
+  '''
+  def emit(output):
+    writer.emitEvents(eventUpgrader.toUpgradedEvents(
+      upgradeResults, yamlReader.readToEvents(gameYaml.path),
+      header=withAzathothHeader({}, version)), output)
+
+  if output.seekable():
+    start = output.tell()
+    try:
+      emit(output)
+    except eventUpgrader.CannotStream:
+      output.seek(start)
+      output.truncate()
+      _dumpUpgradedYamls(upgradeResults, gameYaml, output, version=version)
+    return
+
+  with (tempfile.TemporaryFile("w+", encoding="utf-8",
+                               newline="")) as streamed:
+    try:
+      emit(streamed)
+    except eventUpgrader.CannotStream:
+      _dumpUpgradedYamls(upgradeResults, gameYaml, output, version=version)
+      return
+    streamed.seek(0)
+    shutil.copyfileobj(streamed, output)
+
+
+def getOutputPaths(filenameToWrite: dict, directory, options: SaveOptions):
+  '''Returns the paths of the files that writing the given outputs to the given
+  directory would create.
+  '''
+  # Bundles hold every output file, so only the bundle itself is written.
+  if options.asBundle:
+    return [os.path.join(directory, BUNDLE_FILENAME)]
+  return [os.path.join(directory, filename)
+          for filename in filenameToWrite.keys()]
+
+
+def writeOutputs(filenameToWrite: dict, directory, options: SaveOptions,
+                 version=None, progress=_noProgress):
+  '''Runs every given write action, saving its output file to the given
+  directory. Returns the paths of the files written.
+
+  Files are written beside their outputs and only moved into place once every
+  write succeeds, so a failed or cancelled save leaves existing files as they
+  were.
+  '''
+  outputPaths = getOutputPaths(filenameToWrite, directory, options)
+  with _SAVE.time(), memoryProfiler.phase("save"):
+    if options.asBundle:
+      with (bundler.BundleWriter(outputPaths[0],
+                                 compression=options.compression,
+                                 version=version)) as bundle:
+        for i, (filename, write) in enumerate(filenameToWrite.items()):
+          progress(i / len(filenameToWrite), f"Bundling {filename}")
+          with (bundle.open(filename)) as output, tracing.span("save",
+                                                               path=filename):
+            write(output)
+    else:
+      temporaryPaths = []
+      try:
+        for i, (outputPath, write) in enumerate(
+            zip(outputPaths, filenameToWrite.values())):
+          progress(i / len(filenameToWrite), f"Saving {Path(outputPath).name}")
+          temporaryPath = f"{outputPath}.tmp"
+          temporaryPaths.append(temporaryPath)
+          with (open(temporaryPath, "w", newline="")) as output, tracing.span(
+              "save", path=outputPath):
+            write(output)
+      except BaseException:
+        for temporaryPath in temporaryPaths:
+          if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise
+      for temporaryPath, outputPath in zip(temporaryPaths, outputPaths):
+        os.replace(temporaryPath, outputPath)
+  metrics.BYTES_WRITTEN.inc(sum(os.path.getsize(path) for path in outputPaths))
+  return outputPaths
+
+
+def upgradeAndSave(upgradeResults: dict[Upgrade, int], gameYamls, directory,
+                   options: SaveOptions|None = None, version=None,
+                   progress=_noProgress):
+  '''Upgrades every given game YAML and saves the results, along with a
+  summary, to the given directory. Returns the paths of the files written.
+  '''
+  options = options or SaveOptions()
+  filenameToWrite = prepareWrites(upgradeResults, gameYamls, options,
+                                  version=version, progress=progress)
+  return writeOutputs(filenameToWrite, directory, options, version=version,
+                      progress=progress)
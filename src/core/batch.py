@@ -0,0 +1,240 @@
+# Batch mode, spinning and upgrading game YAMLs for many players in one run.
+#   Players are processed in parallel across a pool of processes. Each distinct
+#   wheel is loaded and validated once, up front, and handed to every worker as
+#   it starts, so no wheel is parsed again per player. Metrics recorded by
+#   workers are merged into this process's as each player completes.
+
+from concurrent.futures import as_completed, ProcessPoolExecutor
+from core import azathothCore, sessions
+from diagnostics import metrics
+from file import yamlReader
+import os
+from pathlib import Path
+
+
+class ManifestKeys:
+  '''Constants for keys used in batch manifests.'''
+  OUTPUT = "output"
+  PLAYERS = "players"
+  PLAYER = "player"
+  WHEEL = "wheel"
+  GAMES = "games"
+  SPINS = "spins"
+  SELECTIONS = "selections"
+  SEED = "seed"
+
+
+class PlayerJob():
+  '''A single player's entry in a batch manifest, with its paths resolved.
+
+  Attributes:
+    player:           Name of the player.
+    wheelPath:        Path to the wheel to spin.
+    gamePaths:        Paths to game YAMLs, or directories of them, to upgrade.
+    outputDirectory:  Directory to save the player's outputs to.
+    spins:            Number of times to spin, if spinning.
+    selections:       Fixed selections to apply instead of spinning, as a dict
+                      mapping games to dicts of upgrade names and counts.
+    seed:             Seed for spins, making them reproducible.
+  '''
+  def __init__(self, player, wheelPath, gamePaths, outputDirectory, spins=None,
+               selections=None, seed=None):
+    self.player = player
+    self.wheelPath = wheelPath
+    self.gamePaths = gamePaths
+    self.outputDirectory = outputDirectory
+    self.spins = spins
+    self.selections = selections
+    self.seed = seed
+
+
+class PlayerResult():
+  '''Outcome of a single player's job: either the upgrades selected and the
+  paths written, or the error that stopped it. Also identifies the wheel spun,
+  by display name and content hash, so callers needn't load it again.
+  '''
+  def __init__(self, job: PlayerJob, upgradeResults=None, outputPaths=None,
+               error=None, wheelName=None, wheelHash=None):
+    self.job = job
+    self.upgradeResults = upgradeResults or {}
+    self.outputPaths = outputPaths or []
+    self.error = error
+    self.wheelName = wheelName
+    self.wheelHash = wheelHash
+
+
+def _requireType(entry, key, types, player):
+  '''Returns the value at the given key of the given manifest entry, raising
+  ValueError if it isn't one of the given types. Booleans are only accepted
+  where bool is one of the given types, not as integers.
+  '''
+  value = entry.get(key)
+  allowsBool = types is bool or (isinstance(types, tuple) and bool in types)
+  if (not isinstance(value, types)
+      or (isinstance(value, bool) and not allowsBool)):
+    raise ValueError(f"Manifest entry for player {player} has invalid {key}:"
+                     f" {value}")
+  return value
+
+
+def readManifest(path):
+  '''Reads the batch manifest at the given path, returning a PlayerJob for
+  each player in it. Relative paths are resolved against the manifest's folder.
+
+  Raises ValueError if the manifest is malformed.
+  '''
+  manifest = yamlReader.readToYaml(path)
+  if not isinstance(manifest, dict):
+    raise ValueError(f"Manifest {path} is not a dictionary.")
+  baseDirectory = Path(path).parent
+  outputDirectory = baseDirectory / manifest.get(ManifestKeys.OUTPUT, "output")
+
+  players = manifest.get(ManifestKeys.PLAYERS)
+  if not isinstance(players, list) or not players:
+    raise ValueError(f"Manifest {path} lists no {ManifestKeys.PLAYERS}.")
+
+  jobs = []
+  seenPlayers = set()
+  for entry in players:
+    if not isinstance(entry, dict):
+      raise ValueError(f"Manifest entry {entry} is not a dictionary.")
+    player = entry.get(ManifestKeys.PLAYER)
+    if not isinstance(player, str) or not player:
+      raise ValueError(f"Manifest entry {entry} has no {ManifestKeys.PLAYER}.")
+    if player in seenPlayers:
+      raise ValueError(f"Manifest lists player {player} more than once.")
+    seenPlayers.add(player)
+
+    wheel = _requireType(entry, ManifestKeys.WHEEL, str, player)
+    games = _requireType(entry, ManifestKeys.GAMES, (str, list), player)
+    if isinstance(games, str):
+      games = [games]
+
+    hasSpins = ManifestKeys.SPINS in entry
+    hasSelections = ManifestKeys.SELECTIONS in entry
+    if hasSpins == hasSelections:
+      raise ValueError(f"Manifest entry for player {player} must have exactly"
+                       f" one of {ManifestKeys.SPINS} or"
+                       f" {ManifestKeys.SELECTIONS}.")
+    spins = (_requireType(entry, ManifestKeys.SPINS, int, player)
+             if hasSpins else None)
+    if spins is not None and spins < 1:
+      raise ValueError(f"Manifest entry for player {player} has invalid"
+                       f" {ManifestKeys.SPINS}: {spins}, must be at least 1.")
+    selections = (_requireType(entry, ManifestKeys.SELECTIONS, dict, player)
+                  if hasSelections else None)
+    seed = (_requireType(entry, ManifestKeys.SEED, (int, str), player)
+            if ManifestKeys.SEED in entry else None)
+
+    if ManifestKeys.OUTPUT in entry:
+      playerOutputDirectory = baseDirectory / _requireType(
+        entry, ManifestKeys.OUTPUT, str, player)
+    elif Path(player).name == player:
+      playerOutputDirectory = outputDirectory / player
+    else:
+      raise ValueError(f"Player {player} can't name an output folder, so needs"
+                       f" an explicit {ManifestKeys.OUTPUT}.")
+
+    jobs.append(PlayerJob(
+      player,
+      baseDirectory / wheel,
+      [baseDirectory / game for game in games],
+      playerOutputDirectory,
+      spins=spins, selections=selections, seed=seed))
+  return jobs
+
+
+# Wheels shared with this worker process, by path. Set once as it starts.
+_wheelsByPath = {}
+
+# How long each player's job takes, and how often it fails.
+_PLAYER = metrics.Operation("player")
+
+
+def _initWorker(wheelsByPath):
+  '''Pool initializer, sharing the pre-loaded wheels with a new worker.'''
+  global _wheelsByPath
+  _wheelsByPath = wheelsByPath
+
+
+def _runPlayer(job: PlayerJob, options, version):
+  '''Spins or applies the given player's selections, then upgrades and saves
+  their game YAMLs. Returns a tuple: (upgrade results, paths written).
+  '''
+  with _PLAYER.time():
+    return _runPlayerJob(job, options, version)
+
+
+def _runPlayerJob(job: PlayerJob, options, version):
+  wheel = _wheelsByPath[job.wheelPath]
+  gameYamls = azathothCore.loadGameYamls(
+    azathothCore.findGameYamls(job.gamePaths))
+  if not gameYamls:
+    raise ValueError(f"No game YAMLs found for player {job.player}.")
+
+  if job.selections is not None:
+    upgradeResults = azathothCore.toUpgradeResults(wheel, job.selections)
+  else:
+    upgradeResults = azathothCore.spin(wheel, job.spins, seed=job.seed)
+
+  os.makedirs(job.outputDirectory, exist_ok=True)
+  return upgradeResults, azathothCore.upgradeAndSave(
+    upgradeResults, gameYamls, job.outputDirectory, options=options,
+    version=version)
+
+
+def runBatch(jobs, options: azathothCore.SaveOptions|None = None, version=None,
+             maxWorkers=None, onResult=None):
+  '''Runs every given PlayerJob across a pool of worker processes, returning a
+  PlayerResult for each in the same order. A failing player doesn't stop the
+  others. If given, onResult is called with each result as it completes.
+
+  Raises ValueError before any player runs if any wheel fails to load.
+  '''
+  jobs = list(jobs)
+  options = options or azathothCore.SaveOptions()
+
+  # Load each distinct wheel once, failing fast on bad wheels.
+  wheelsByPath = {}
+  # Dict mapping wheel path to tuples: (wheel name, wheel hash).
+  wheelIdsByPath = {}
+  for job in jobs:
+    if job.wheelPath not in wheelsByPath:
+      try:
+        wheel = azathothCore.loadWheel(job.wheelPath)
+        wheelIdsByPath[job.wheelPath] = (wheel.displayName,
+                                         sessions.hashFile(job.wheelPath))
+      except (OSError, ValueError) as e:
+        raise ValueError(f"Failed to load wheel {job.wheelPath}: {e}")
+      wheelsByPath[job.wheelPath] = wheel
+
+  resultsByJob = {}
+  def record(job, upgradeResults=None, outputPaths=None, error=None):
+    result = PlayerResult(job, upgradeResults, outputPaths, error,
+                          *wheelIdsByPath[job.wheelPath])
+    resultsByJob[job] = result
+    if onResult:
+      onResult(result)
+
+  if maxWorkers == 1:
+    # Run in this process, e.g. for debugging or where processes can't spawn.
+    _initWorker(wheelsByPath)
+    for job in jobs:
+      try:
+        record(job, *_runPlayer(job, options, version))
+      except Exception as e:
+        record(job, error=e)
+  else:
+    with (ProcessPoolExecutor(max_workers=maxWorkers, initializer=_initWorker,
+                              initargs=(wheelsByPath,))) as pool:
+      futures = {pool.submit(metrics.callCollecting, _runPlayer, job, options,
+                             version): job
+                 for job in jobs}
+      for future in as_completed(futures):
+        try:
+          result = metrics.mergeCollected(future.result())
+          record(futures[future], *result)
+        except Exception as e:
+          record(futures[future], error=e)
+
+  return [resultsByJob[job] for job in jobs]
@@ -0,0 +1,87 @@
+# Push feed of service events, broadcast to every subscriber as Server-Sent
+#   Events. Each subscriber reads from its own bounded queue, so a slow client
+#   only ever falls behind itself: once its queue is full, its oldest events are
+#   dropped rather than blocking the publisher or other subscribers.
+
+import asyncio
+import json
+
+# Most events queued for a single subscriber before the oldest are dropped.
+DEFAULT_MAX_QUEUED = 64
+
+
+class FeedEvents:
+  '''Constants for the names of events published to the feed.'''
+  SPIN = "spin"
+  SELECTIONS = "selections"
+  DROPPED = "dropped"
+
+
+def encodeEvent(event, data, eventId=None):
+  '''Returns the given event, with its JSON data, encoded as a Server-Sent
+  Event.
+  '''
+  lines = []
+  if eventId is not None:
+    lines.append(f"id: {eventId}")
+  lines.append(f"event: {event}")
+  lines.append(f"data: {json.dumps(data, default=str)}")
+  return ("\n".join(lines) + "\n\n").encode("utf-8")
+
+
+class Subscription():
+  '''A single subscriber's queue of encoded events.
+
+  Attributes:
+    topic:    Topic of the events received, or None to receive every event.
+    dropped:  Number of events dropped since last reported, because the
+              subscriber fell too far behind.
+  '''
+  def __init__(self, topic=None, maxQueued=DEFAULT_MAX_QUEUED):
+    self.topic = topic
+    self.queue = asyncio.Queue(maxsize=maxQueued)
+    self.dropped = 0
+
+  def push(self, encodedEvent: bytes):
+    '''Queues the given event, dropping the oldest queued event if full.'''
+    if self.queue.full():
+      self.queue.get_nowait()
+      self.dropped += 1
+    self.queue.put_nowait(encodedEvent)
+
+  async def next(self) -> bytes:
+    '''Returns the next queued event, waiting for one if none are queued.'''
+    return await self.queue.get()
+
+
+class EventFeed():
+  '''Broadcasts published events to every current subscription. Must be used
+  from the event loop's thread.
+  '''
+  def __init__(self, maxQueued=DEFAULT_MAX_QUEUED):
+    self.maxQueued = maxQueued
+    self.subscriptions = set()
+    self.lastEventId = 0
+
+  def subscribe(self, topic=None) -> Subscription:
+    '''Returns a new subscription receiving every event published from now on
+    with the given topic, or every event at all if none is given.
+    '''
+    subscription = Subscription(topic, self.maxQueued)
+    self.subscriptions.add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription: Subscription):
+    '''Stops the given subscription receiving events.'''
+    self.subscriptions.discard(subscription)
+
+  def publish(self, event, data, topic=None):
+    '''Broadcasts the given event, with its JSON data, to every subscription
+    to its topic or to every event.
+    '''
+    self.lastEventId += 1
+    # Encoded once, however many subscribers there are.
+    encodedEvent = encodeEvent(event, data, self.lastEventId)
+    for subscription in self.subscriptions:
+      if subscription.topic is None or subscription.topic == topic:
+        subscription.push(encodedEvent)
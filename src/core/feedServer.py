@@ -0,0 +1,84 @@
+# Event feed for the app, so stream overlays see spins and selection changes
+#   made in its window just as they do those made through the service. The
+#   feed is served by a trimmed-down service running its own event loop on a
+#   background thread, leaving the app's main loop free. The app publishes from
+#   its own thread, and events are handed over to the feed's loop to broadcast.
+#
+# Only GET /events and GET /selections are served, with the same checks on
+#   hosts and origins as the full service.
+
+import asyncio
+from concurrent.futures import Future
+from core import azathothCore
+from core.service import AzathothService, DEFAULT_HOST, DEFAULT_PORT
+from core.sessions import DEFAULT_PLAYER
+import contextlib
+import threading
+
+
+class FeedServer(AzathothService):
+  '''Serves the event feed of an app with a main loop of its own, e.g. Tk's,
+  from a background thread. Publishing methods may be called from any thread.
+  '''
+  def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, version=None,
+               allowedOrigins=()):
+    super().__init__(host=host, port=port, version=version, workers=1,
+                     allowedOrigins=allowedOrigins)
+    self.routes = {
+      ("GET", "/selections"): self.getSelections,
+    }
+    self.loop = None
+    self.serveTask = None
+    self.thread = None
+
+
+  def startInBackground(self):
+    '''Starts serving from a background thread, returning once listening.
+
+    Raises OSError if the address can't be listened on.
+    '''
+    started = Future()
+
+    async def serve():
+      self.loop = asyncio.get_running_loop()
+      try:
+        await self.start()
+      except BaseException as e:
+        started.set_exception(e)
+        return
+      self.serveTask = asyncio.current_task()
+      started.set_result(None)
+      await self.serveForever()
+
+    def run():
+      # Cancelling serving cancels every open event stream with it.
+      with contextlib.suppress(asyncio.CancelledError):
+        asyncio.run(serve())
+
+    self.thread = threading.Thread(target=run, name="azathoth-feed",
+                                   daemon=True)
+    self.thread.start()
+    started.result()
+
+
+  def stop(self):
+    '''Stops serving, closing every open event stream.'''
+    if self.serveTask:
+      self.loop.call_soon_threadsafe(self.serveTask.cancel)
+      self.serveTask = None
+
+
+  def publishAppSpin(self, upgradeResults, numSpins, player=DEFAULT_PLAYER):
+    '''Notifies subscribers of a spin made in the app. The resulting change of
+    selections is published separately, by publishAppSelections.
+    '''
+    self.loop.call_soon_threadsafe(
+      self.publishSpin, player, numSpins,
+      azathothCore.toSelections(upgradeResults))
+
+
+  def publishAppSelections(self, upgradeResults, player=DEFAULT_PLAYER):
+    '''Notifies subscribers of the app's current selections.'''
+    self.loop.call_soon_threadsafe(
+      lambda: self.setUpgradeResults(self.sessions.getSession(player),
+                                     upgradeResults))
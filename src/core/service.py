@@ -0,0 +1,701 @@
+# Local HTTP/JSON service exposing the headless core to stream overlays, bots
+#   and other tooling. Built on asyncio streams alone, so it needs nothing
+#   beyond the standard library. Connections are served concurrently on one
+#   event loop, while CPU-heavy spins and simulations run in a process pool and
+#   file reads and writes run on threads, so no request blocks the others.
+#
+# Endpoints, each taking and returning JSON:
+#   POST /load-wheel      {"path"}                      Loads a wheel.
+#   POST /load-games      {"paths"}                     Loads game YAMLs.
+#   POST /spin            {"spins", "seed"?}            Spins new selections.
+#   GET  /selections                                    Current selections.
+#   POST /selections      {"selections"}                Sets fixed selections.
+#   POST /apply-and-save  {"output", save options...}   Saves upgraded YAMLs.
+#   POST /simulate        {"spins", "trials", "seed"?}  Spin distribution.
+#
+#   GET  /sessions                                      Session and cache use.
+#   GET  /history/player   ?player, since?, until?      A player's upgrades.
+#   GET  /history/upgrade  ?game, upgrade, since?, ...  Players who got one.
+#   GET  /metrics                                       Operational metrics.
+#
+# History endpoints need the service to record a SpinHistory, and take UNIX
+#   times and a "kind" of run, "spin" or "save", defaulting to saves.
+#
+# Every endpoint serves one player's session, named by a "player" in the body
+#   or query string, so one service can run many challenges at once. Requests
+#   naming no player share a default session.
+#
+# GET /metrics returns counters and latency histograms as Prometheus-style text
+#   rather than JSON, so it can be scraped as is.
+#
+# GET /events streams every spin and selection change as Server-Sent Events,
+#   for overlays to react to without polling. Naming a player in its query
+#   string streams only that player's events.
+#
+# Any web page open in the user's browser can send requests here, so requests
+#   are refused unless their Host is loopback or the address served, and any
+#   Origin they come from is explicitly allowed. POST bodies must be declared
+#   JSON, which browsers can't send cross-origin without asking first. Every
+#   path read or written must lie within the configured root directory.
+
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
+from core import azathothCore
+from core.eventFeed import EventFeed, FeedEvents, Subscription, encodeEvent
+from core.sessions import DEFAULT_PLAYER, Session, SessionManager
+from data.spinHistory import RunKind, SpinHistory
+from diagnostics import metrics
+from file.bundler import BUNDLE_COMPRESSIONS
+from file.summaryRenderer import SUMMARY_FORMAT_EXTENSIONS
+from http import HTTPStatus
+import ipaddress
+import json
+import multiprocessing
+import os
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+
+# Default address served. Only local connections are accepted by default.
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8357
+
+# Addresses that mean every interface, rather than one a client can name.
+WILDCARD_HOSTS = ("", "0.0.0.0", "::")
+
+# Media type every POST body must be declared as.
+JSON_CONTENT_TYPE = "application/json"
+
+# Largest request body accepted, in bytes.
+MAX_BODY_SIZE = 1 << 20
+
+# Largest number of spins accepted by a single spin or simulation trial.
+MAX_SPINS = 10000
+
+# Largest number of trials accepted by a single simulation.
+MAX_SIMULATION_TRIALS = 100000
+
+# Largest number of spins made by a single simulation, over every trial.
+MAX_SIMULATION_SPINS = 10000000
+
+# Seconds an event stream may sit idle before a keep-alive comment is sent,
+#   so closed clients are noticed and proxies don't time the stream out.
+EVENT_KEEP_ALIVE_SECONDS = 15
+
+# Seconds between writes of buffered history records.
+HISTORY_FLUSH_SECONDS = 1
+
+
+class HttpError(Exception):
+  '''Raised while handling a request to respond with the given status.'''
+  def __init__(self, status: HTTPStatus, message=None):
+    super().__init__(message or status.phrase)
+    self.status = status
+    self.message = message or status.phrase
+
+
+class TextBody():
+  '''Response payload sent as plain text rather than JSON.'''
+  def __init__(self, text, contentType="text/plain; charset=utf-8"):
+    self.text = text
+    self.contentType = contentType
+
+
+class Request():
+  '''A parsed HTTP request, with its query parameters and JSON body, if any.
+  '''
+  def __init__(self, method, path, headers, body, query=None):
+    self.method = method
+    self.path = path
+    self.headers = headers
+    self.body = body
+    self.query = query or {}
+
+  def json(self):
+    '''Returns the request body parsed as a JSON object.'''
+    if not self.body:
+      return {}
+    try:
+      value = json.loads(self.body)
+    except ValueError as e:
+      raise HttpError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}")
+    if not isinstance(value, dict):
+      raise HttpError(HTTPStatus.BAD_REQUEST, "JSON body must be an object.")
+    return value
+
+
+def _require(body: dict, key, types):
+  '''Returns the value at the given key of the given request body, raising a
+  bad request if it isn't one of the given types.
+  '''
+  value = body.get(key)
+  # Booleans are ints in Python, but never valid counts.
+  if not isinstance(value, types) or isinstance(value, bool):
+    raise HttpError(HTTPStatus.BAD_REQUEST, f"Invalid or missing '{key}'.")
+  return value
+
+
+def _requireCount(body: dict, key, maximum):
+  '''Returns the count at the given key of the given request body, raising a
+  bad request unless it's between 1 and the given maximum.
+  '''
+  value = _require(body, key, int)
+  if not 0 < value <= maximum:
+    raise HttpError(HTTPStatus.BAD_REQUEST,
+                    f"'{key}' must be between 1 and {maximum}.")
+  return value
+
+
+def _optionalFlag(body: dict, key, default):
+  '''Returns the boolean at the given key of the given request body, or the
+  given default if absent, raising a bad request if it isn't a boolean.
+  '''
+  value = body.get(key, default)
+  if not isinstance(value, bool):
+    raise HttpError(HTTPStatus.BAD_REQUEST, f"'{key}' must be true or false.")
+  return value
+
+
+def _optionalChoice(body: dict, key, choices, default):
+  '''Returns the value at the given key of the given request body, or the
+  given default if absent, raising a bad request if it isn't one of the given
+  choices.
+  '''
+  value = body.get(key, default)
+  if not isinstance(value, str) or value not in choices:
+    raise HttpError(HTTPStatus.BAD_REQUEST,
+                    f"'{key}' must be one of {', '.join(choices)}.")
+  return value
+
+
+def _optionalSeed(body: dict):
+  '''Returns the seed given in the request body, if any.'''
+  seed = body.get("seed")
+  if seed is not None and (not isinstance(seed, (int, str))
+                           or isinstance(seed, bool)):
+    raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid 'seed'.")
+  return seed
+
+
+def _getPlayer(request: Request, body: dict):
+  '''Returns the player named in the request body or query string, or the
+  default player if none is.
+  '''
+  player = body.get("player", request.query.get("player", DEFAULT_PLAYER))
+  if not isinstance(player, str) or not player:
+    raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid 'player'.")
+  return player
+
+
+def _optionalTime(query: dict, key):
+  '''Returns the UNIX time given at the given key of a query, if any.'''
+  if key not in query:
+    return None
+  try:
+    return float(query[key])
+  except ValueError:
+    raise HttpError(HTTPStatus.BAD_REQUEST, f"Invalid '{key}'.")
+
+
+def _isLoopback(hostname):
+  '''Returns whether the given hostname always names this machine.'''
+  if hostname == "localhost":
+    return True
+  try:
+    return ipaddress.ip_address(hostname).is_loopback
+  except ValueError:
+    return False
+
+
+def _requireWheel(session: Session):
+  '''Returns the session's loaded wheel, raising a conflict if there is none.
+  '''
+  if session.wheel is None:
+    raise HttpError(HTTPStatus.CONFLICT, "No wheel loaded.")
+  return session.wheel
+
+
+class AzathothService():
+  '''Asyncio HTTP server exposing players' sessions through JSON endpoints.
+
+  Every path given by clients is confined to the given root directory, which
+  defaults to the working directory. Requests from browser pages are refused
+  unless their origin is one of the given allowed origins.
+  '''
+  def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, version=None,
+               workers=None, sessions: SessionManager|None = None,
+               history: SpinHistory|None = None, root=None,
+               allowedOrigins=()):
+    self.host = host
+    self.port = port
+    self.version = version
+    self.root = Path(root or os.getcwd()).resolve()
+    self.allowedOrigins = set(allowedOrigins)
+    self.workers = workers or os.cpu_count() or 1
+    # Workers are spawned rather than forked, so they never inherit the
+    #   listening socket or the state of the running event loop.
+    self.executor = ProcessPoolExecutor(
+      max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+    self.sessions = sessions or SessionManager()
+    self.history = history
+    self.feed = EventFeed()
+    self.server = None
+
+    # Dict mapping (method, path) to the coroutine handling the request.
+    self.routes = {
+      ("POST", "/load-wheel"): self.loadWheel,
+      ("POST", "/load-games"): self.loadGames,
+      ("POST", "/spin"): self.spin,
+      ("GET", "/selections"): self.getSelections,
+      ("POST", "/selections"): self.setSelections,
+      ("POST", "/apply-and-save"): self.applyAndSave,
+      ("POST", "/simulate"): self.simulate,
+      ("GET", "/sessions"): self.getSessionStats,
+      ("GET", "/history/player"): self.getPlayerHistory,
+      ("GET", "/history/upgrade"): self.getUpgradeHistory,
+      ("GET", "/metrics"): self.getMetrics,
+    }
+
+    # Dict mapping (method, path) to the coroutine streaming the response
+    #   itself, holding the connection until the client closes it.
+    self.streamRoutes = {
+      ("GET", "/events"): self.streamEvents,
+    }
+
+
+  async def start(self):
+    '''Starts accepting connections.'''
+    self.server = await asyncio.start_server(self.handleConnection,
+                                             self.host, self.port)
+    # Report the bound port, e.g. when asked for any free port with 0.
+    self.port = self.server.sockets[0].getsockname()[1]
+
+
+  async def serveForever(self):
+    '''Starts the service if needed, then serves until cancelled.'''
+    if not self.server:
+      await self.start()
+    flushTask = (asyncio.create_task(self.flushHistoryPeriodically())
+                 if self.history else None)
+    try:
+      async with self.server:
+        await self.server.serve_forever()
+    finally:
+      self.executor.shutdown(wait=False, cancel_futures=True)
+      if flushTask:
+        flushTask.cancel()
+        self.history.close()
+
+
+  async def flushHistoryPeriodically(self):
+    '''Writes buffered history records in the background until cancelled.'''
+    while True:
+      await asyncio.sleep(HISTORY_FLUSH_SECONDS)
+      await asyncio.to_thread(self.history.flush)
+
+
+  def recordHistory(self, kind, session: Session, upgradeResults, **kwargs):
+    '''Buffers a history record of the given run, if recording history.'''
+    if self.history:
+      self.history.record(kind, session.player, upgradeResults,
+                          wheelHash=session.wheelHash,
+                          wheelName=session.wheel.displayName, **kwargs)
+
+
+  async def runCpuBound(self, fn, *args):
+    '''Runs the given CPU-heavy function in the process pool, merging the
+    metrics it records there into this process's.
+    '''
+    return metrics.mergeCollected(
+      await asyncio.get_running_loop().run_in_executor(
+        self.executor, metrics.callCollecting, fn, *args))
+
+
+  async def handleConnection(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
+    '''Serves every request on a single connection, keeping it alive until the
+    client closes it or asks for it to be closed.
+    '''
+    try:
+      while True:
+        try:
+          request = await self.readRequest(reader)
+          if request is not None:
+            self.checkAllowed(request)
+        except HttpError as e:
+          await self.writeResponse(writer, e.status, {"error": e.message},
+                                   keepAlive=False)
+          break
+        if request is None:
+          break
+        if streamHandler := self.streamRoutes.get((request.method,
+                                                   request.path)):
+          await streamHandler(request, writer)
+          break
+
+        keepAlive = request.headers.get("connection", "").lower() != "close"
+        try:
+          with self.getRequestSeconds(request).time():
+            status, payload = HTTPStatus.OK, await self.dispatch(request)
+        except HttpError as e:
+          status, payload = e.status, {"error": e.message}
+        except (OSError, ValueError) as e:
+          status, payload = HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+          status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"error": repr(e)}
+        await self.writeResponse(writer, status, payload, keepAlive)
+        if not keepAlive:
+          break
+    except (ConnectionError, asyncio.IncompleteReadError):
+      pass
+    except asyncio.CancelledError:
+      # Idle connections are cancelled on shutdown. Nothing awaits this task,
+      #   so there's no one to re-raise to.
+      pass
+    finally:
+      writer.close()
+
+
+  async def readRequest(self, reader: asyncio.StreamReader):
+    '''Reads the next request from the given stream, or returns None once the
+    client has closed it.
+    '''
+    requestLine = await reader.readline()
+    if not requestLine:
+      return None
+    try:
+      method, target, _ = requestLine.decode("latin-1").split(" ", 2)
+    except ValueError:
+      raise HttpError(HTTPStatus.BAD_REQUEST, "Malformed request line.")
+
+    headers = {}
+    while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+      name, _, value = line.decode("latin-1").partition(":")
+      headers[name.strip().lower()] = value.strip()
+
+    try:
+      contentLength = int(headers.get("content-length", 0))
+    except ValueError:
+      raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if contentLength < 0:
+      raise HttpError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length.")
+    if contentLength > MAX_BODY_SIZE:
+      raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+    body = await reader.readexactly(contentLength) if contentLength else b""
+
+    path, _, queryString = target.partition("?")
+    return Request(method.upper(), path, headers, body,
+                   dict(parse_qsl(queryString)))
+
+
+  def checkAllowed(self, request: Request):
+    '''Raises an HttpError unless the given request is addressed to this
+    machine, from an allowed origin if any, with a JSON body if a POST.
+    '''
+    hostname = urlsplit(f"//{request.headers.get('host', '')}").hostname
+    if not hostname or not (_isLoopback(hostname) or (
+        self.host not in WILDCARD_HOSTS and hostname == self.host.lower())):
+      raise HttpError(HTTPStatus.FORBIDDEN, "Host not allowed.")
+
+    origin = request.headers.get("origin")
+    if origin is not None and origin not in self.allowedOrigins:
+      raise HttpError(HTTPStatus.FORBIDDEN, "Origin not allowed.")
+
+    contentType = request.headers.get("content-type", "")
+    if (request.method == "POST"
+        and contentType.partition(";")[0].strip().lower() != JSON_CONTENT_TYPE):
+      raise HttpError(HTTPStatus.UNSUPPORTED_MEDIA_TYPE,
+                      f"Request bodies must be {JSON_CONTENT_TYPE}.")
+
+
+  def resolvePath(self, path):
+    '''Returns the given client path resolved against the root directory,
+    raising forbidden if it lies outside of it.
+    '''
+    resolvedPath = (self.root / path).resolve()
+    if resolvedPath != self.root and self.root not in resolvedPath.parents:
+      raise HttpError(HTTPStatus.FORBIDDEN,
+                      f"Path {path} is outside of the service's root.")
+    return resolvedPath
+
+
+  async def writeResponse(self, writer: asyncio.StreamWriter,
+                          status: HTTPStatus, payload, keepAlive=True):
+    '''Writes the given payload to the given stream as a JSON response, or as
+    is if it's a TextBody.
+    '''
+    if isinstance(payload, TextBody):
+      body, contentType = payload.text.encode("utf-8"), payload.contentType
+    else:
+      body = json.dumps(payload, default=str).encode("utf-8")
+      contentType = "application/json"
+    writer.write(
+      f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+      f"Content-Type: {contentType}\r\n"
+      f"Content-Length: {len(body)}\r\n"
+      f"Connection: {'keep-alive' if keepAlive else 'close'}\r\n"
+      f"\r\n".encode("latin-1") + body)
+    await writer.drain()
+
+
+  async def dispatch(self, request: Request):
+    '''Routes the given request to its handler, returning the response payload.
+    '''
+    handler = self.routes.get((request.method, request.path))
+    if handler is None:
+      if any(path == request.path
+             for _, path in [*self.routes, *self.streamRoutes]):
+        raise HttpError(HTTPStatus.METHOD_NOT_ALLOWED)
+      raise HttpError(HTTPStatus.NOT_FOUND)
+    return await handler(request)
+
+
+  def getRequestSeconds(self, request: Request) -> metrics.Histogram:
+    '''Returns the histogram of how long requests to the given route take.
+    Unknown routes share one, so they can't grow the registry without bound.
+    '''
+    route = (request.path if (request.method, request.path) in self.routes
+             else "unknown")
+    return metrics.REGISTRY.histogram(
+      "azathoth_request_seconds", "Seconds taken to handle each request.",
+      route=route)
+
+
+  def getSession(self, request: Request, body: dict) -> Session:
+    '''Returns the session of the player the request is for.'''
+    return self.sessions.getSession(_getPlayer(request, body))
+
+
+  def setUpgradeResults(self, session: Session, upgradeResults):
+    '''Replaces the session's selections, notifying subscribers of the change.
+    '''
+    session.upgradeResults = upgradeResults
+    self.feed.publish(FeedEvents.SELECTIONS, {
+        "player": session.player,
+        "selections": azathothCore.toSelections(upgradeResults),
+      }, topic=session.player)
+
+
+  def publishSpin(self, player, numSpins, selections):
+    '''Notifies subscribers of a spin made for the given player.'''
+    self.feed.publish(FeedEvents.SPIN, {
+        "player": player,
+        "spins": numSpins,
+        "selections": selections,
+      }, topic=player)
+
+
+  async def streamEvents(self, request: Request,
+                         writer: asyncio.StreamWriter):
+    '''Streams feed events to the client as Server-Sent Events until it
+    disconnects, starting with the current selections if streaming a single
+    player's events.
+    '''
+    player = request.query.get("player")
+    # Overlays are often local pages of another origin, which must be allowed.
+    origin = request.headers.get("origin")
+    corsHeaders = (f"Access-Control-Allow-Origin: {origin}\r\n"
+                   f"Vary: Origin\r\n" if origin else "")
+    subscription = self.feed.subscribe(topic=player)
+    try:
+      writer.write(
+        f"HTTP/1.1 {HTTPStatus.OK.value} {HTTPStatus.OK.phrase}\r\n"
+        f"Content-Type: text/event-stream\r\n"
+        f"Cache-Control: no-cache\r\n"
+        f"{corsHeaders}"
+        f"Connection: close\r\n"
+        f"\r\n".encode("latin-1"))
+      if player:
+        # Subscribers only watch, so never start or refresh a session.
+        session = self.sessions.findSession(player)
+        writer.write(encodeEvent(FeedEvents.SELECTIONS, {
+            "player": player,
+            "selections": azathothCore.toSelections(
+              session.upgradeResults if session else {}),
+          }, self.feed.lastEventId))
+      await writer.drain()
+
+      while True:
+        try:
+          encodedEvent = await asyncio.wait_for(subscription.next(),
+                                                EVENT_KEEP_ALIVE_SECONDS)
+        except asyncio.TimeoutError:
+          writer.write(b": keep-alive\n\n")
+        else:
+          writer.write(self._takeDroppedNotice(subscription) + encodedEvent)
+        await writer.drain()
+    finally:
+      self.feed.unsubscribe(subscription)
+
+
+  def _takeDroppedNotice(self, subscription: Subscription):
+    '''Returns an event telling the subscriber how many events it missed for
+    falling behind, if any, resetting the count.
+    '''
+    if not subscription.dropped:
+      return b""
+    notice = encodeEvent(FeedEvents.DROPPED, {"count": subscription.dropped})
+    subscription.dropped = 0
+    return notice
+
+
+  async def loadWheel(self, request: Request):
+    body = request.json()
+    path = self.resolvePath(_require(body, "path", str))
+    session = self.getSession(request, body)
+    wheel = await asyncio.to_thread(self.sessions.loadWheel, session, path)
+    self.setUpgradeResults(session, {})
+    return {"wheel": wheel.displayName,
+            "upgrades": len(azathothCore.getAllUpgrades(wheel))}
+
+
+  async def loadGames(self, request: Request):
+    body = request.json()
+    paths = _require(body, "paths", list)
+    if not all(isinstance(path, str) for path in paths):
+      raise HttpError(HTTPStatus.BAD_REQUEST, "'paths' must be strings.")
+    paths = [self.resolvePath(path) for path in paths]
+    session = self.getSession(request, body)
+    gameYamls = await asyncio.to_thread(
+      lambda: self.sessions.loadGameYamls(session,
+                                          azathothCore.findGameYamls(paths)))
+    return {"games": [str(gameYaml.path) for gameYaml in gameYamls]}
+
+
+  async def spin(self, request: Request):
+    body = request.json()
+    numSpins = _requireCount(body, "spins", MAX_SPINS)
+    session = self.getSession(request, body)
+    wheel = _requireWheel(session)
+    seed = _optionalSeed(body)
+    upgradeResults = await self.runCpuBound(
+      azathothCore.spin, wheel, numSpins, seed)
+    # Drop results for a wheel replaced while spinning.
+    if session.wheel is not wheel:
+      raise HttpError(HTTPStatus.CONFLICT, "Wheel changed while spinning.")
+    self.recordHistory(RunKind.SPIN, session, upgradeResults, seed=seed,
+                       spins=numSpins)
+    selections = azathothCore.toSelections(upgradeResults)
+    self.publishSpin(session.player, numSpins, selections)
+    self.setUpgradeResults(session, upgradeResults)
+    return {"selections": selections}
+
+
+  async def getSelections(self, request: Request):
+    session = self.getSession(request, {})
+    return {"selections": azathothCore.toSelections(session.upgradeResults)}
+
+
+  async def setSelections(self, request: Request):
+    body = request.json()
+    selectionsByGame = _require(body, "selections", dict)
+    if not all(isinstance(countsByName, dict)
+               for countsByName in selectionsByGame.values()):
+      raise HttpError(HTTPStatus.BAD_REQUEST,
+                      "'selections' must map games to upgrade counts.")
+    session = self.getSession(request, body)
+    upgradeResults = azathothCore.toUpgradeResults(
+      _requireWheel(session), selectionsByGame)
+    self.setUpgradeResults(session, upgradeResults)
+    return {"selections": azathothCore.toSelections(upgradeResults)}
+
+
+  async def applyAndSave(self, request: Request):
+    body = request.json()
+    output = self.resolvePath(_require(body, "output", str))
+    # Options are checked before any work is done.
+    defaults = azathothCore.SaveOptions()
+    options = azathothCore.SaveOptions(
+      asPatches=_optionalFlag(body, "patches", defaults.asPatches),
+      asBundle=_optionalFlag(body, "bundle", defaults.asBundle),
+      stream=_optionalFlag(body, "stream", defaults.stream),
+      summaryFormat=_optionalChoice(
+        body, "summaryFormat", list(SUMMARY_FORMAT_EXTENSIONS),
+        defaults.summaryFormat),
+      compression=_optionalChoice(body, "compression",
+                                  list(BUNDLE_COMPRESSIONS),
+                                  defaults.compression))
+    session = self.getSession(request, body)
+    if not session.gameYamls:
+      raise HttpError(HTTPStatus.CONFLICT, "No game YAMLs loaded.")
+    if not session.upgradeResults:
+      raise HttpError(HTTPStatus.CONFLICT, "No upgrades selected.")
+
+    def save(upgradeResults, gameYamls):
+      os.makedirs(output, exist_ok=True)
+      return azathothCore.upgradeAndSave(upgradeResults, gameYamls, output,
+                                         options=options, version=self.version)
+    upgradeResults, gameYamls = session.upgradeResults, session.gameYamls
+    outputPaths = await asyncio.to_thread(save, upgradeResults, gameYamls)
+    self.recordHistory(RunKind.SAVE, session, upgradeResults)
+    return {"files": outputPaths,
+            "missingGames": sorted(azathothCore.getMissingGames(
+              upgradeResults, gameYamls))}
+
+
+  async def simulate(self, request: Request):
+    body = request.json()
+    numSpins = _requireCount(body, "spins", MAX_SPINS)
+    trials = _requireCount(body, "trials", MAX_SIMULATION_TRIALS)
+    if numSpins * trials > MAX_SIMULATION_SPINS:
+      raise HttpError(HTTPStatus.BAD_REQUEST,
+                      f"'spins' times 'trials' must be at most"
+                      f" {MAX_SIMULATION_SPINS}.")
+    seed = _optionalSeed(body)
+    wheel = _requireWheel(self.getSession(request, body))
+
+    # Split trials into a chunk per worker, each seeded independently.
+    numChunks = min(trials, self.workers)
+    chunkSizes = [trials // numChunks + (i < trials % numChunks)
+                  for i in range(numChunks)]
+    chunks = await asyncio.gather(*(
+      self.runCpuBound(azathothCore.simulateSpins, wheel, numSpins, chunkSize,
+                       None if seed is None else f"{seed}:{i}")
+      for i, chunkSize in enumerate(chunkSizes)))
+
+    upgrades = azathothCore.getAllUpgrades(wheel)
+    totalCounts = [sum(counts) for counts in zip(*(c[0] for c in chunks))]
+    trialsSelected = [sum(counts) for counts in zip(*(c[1] for c in chunks))]
+    return {"trials": trials, "spins": numSpins, "upgrades": [{
+        "game": upgrade.yamlPath[0],
+        "upgrade": upgrade.name,
+        "meanCount": totalCount / trials,
+        "selectedRate": selected / trials,
+      } for upgrade, totalCount, selected
+        in zip(upgrades, totalCounts, trialsSelected)]}
+
+
+  async def getSessionStats(self, request: Request):
+    return self.sessions.getStats()
+
+
+  async def getMetrics(self, request: Request):
+    return TextBody(metrics.REGISTRY.render(),
+                    "text/plain; version=0.0.4; charset=utf-8")
+
+
+  def requireHistory(self):
+    '''Returns the spin history, raising not found if it isn't recorded.'''
+    if self.history is None:
+      raise HttpError(HTTPStatus.NOT_FOUND, "History is not being recorded.")
+    return self.history
+
+
+  async def getPlayerHistory(self, request: Request):
+    history = self.requireHistory()
+    query = request.query
+    player = _getPlayer(request, {})
+    upgrades = await asyncio.to_thread(
+      history.getPlayerUpgrades, player, kind=query.get("kind", RunKind.SAVE),
+      since=_optionalTime(query, "since"), until=_optionalTime(query, "until"))
+    return {"player": player, "upgrades": upgrades}
+
+
+  async def getUpgradeHistory(self, request: Request):
+    history = self.requireHistory()
+    query = request.query
+    game, upgrade = _require(query, "game", str), _require(query, "upgrade", str)
+    players = await asyncio.to_thread(
+      history.getUpgradeFrequency, game, upgrade,
+      kind=query.get("kind", RunKind.SAVE),
+      since=_optionalTime(query, "since"), until=_optionalTime(query, "until"))
+    return {"game": game, "upgrade": upgrade, "players": players}
@@ -0,0 +1,318 @@
+# Sessions for many concurrent challenges in one process, one per player.
+#   Wheels and game YAMLs are cached by the hash of their file contents, so
+#   players loading the same files share a single compiled wheel and a single
+#   set of parsed documents. The cache owns every wheel and game YAML loaded,
+#   whether or not a session uses it, and is bounded by their estimated size.
+#   Sessions pin what they use, so it stays cached, and the least recently used
+#   sessions are dropped once pinned content alone exceeds the bound. Memory
+#   therefore stays flat however many players come and go.
+#
+# Cached values are shared, so must never be modified. Upgrading already works
+#   on copies of game YAMLs.
+
+from collections import OrderedDict
+from core.azathothCore import GameYaml
+from data.upgrades import Wheel
+from diagnostics import metrics
+from enum import Enum
+from file import azathothReader, yamlReader
+import hashlib
+import sys
+import threading
+import time
+
+# Player whose session is used when none is named.
+DEFAULT_PLAYER = "default"
+
+# Default bound on the estimated size of every wheel and game YAML held.
+DEFAULT_CACHE_BYTES = 256 << 20
+
+# How long loading files not already cached takes, and how often it fails,
+#   shared with the loads of the headless API.
+_LOAD_WHEEL = metrics.Operation("load_wheel")
+_LOAD_GAMES = metrics.Operation("load_games")
+
+# Default bound on the number of sessions kept, on top of the bound on what
+#   they hold. The least recently used session is dropped to make room for a
+#   new one.
+DEFAULT_MAX_SESSIONS = 1000
+
+
+def estimateSize(value):
+  '''Returns an estimate of the bytes held by the given value and everything it
+  references, counting shared objects once.
+  '''
+  seenIds = set()
+  totalBytes = 0
+  pending = [value]
+  while pending:
+    value = pending.pop()
+    # Enums and their members are shared by every wheel.
+    if id(value) in seenIds or isinstance(value, (type, Enum)):
+      continue
+    seenIds.add(id(value))
+    totalBytes += sys.getsizeof(value)
+    if isinstance(value, dict):
+      pending.extend(value.keys())
+      pending.extend(value.values())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+      pending.extend(value)
+    elif hasattr(value, "__dict__"):
+      pending.append(value.__dict__)
+  return totalBytes
+
+
+def hashContents(contents):
+  '''Returns the hash identifying the given file contents.'''
+  return hashlib.sha256(contents.encode("utf-8")).hexdigest()
+
+
+def hashFile(path):
+  '''Returns the hash identifying the contents of the file at the given path.
+  '''
+  return _readContents(path)[1]
+
+
+def _readContents(path):
+  '''Returns the text of the file at the given path and the hash of it.'''
+  with (open(path)) as input:
+    contents = input.read()
+  return contents, hashContents(contents)
+
+
+class ContentCache():
+  '''Thread-safe LRU of values parsed from file contents, keyed by a hash of
+  the contents, holding values up to a total estimated size. Values in use are
+  pinned, and are never evicted, but still count towards the total.
+  '''
+  def __init__(self, maxBytes=DEFAULT_CACHE_BYTES):
+    self.maxBytes = maxBytes
+    self.totalBytes = 0
+    self.hits = 0
+    self.misses = 0
+    # Dict mapping key to lists: [value, estimated size in bytes, pins].
+    self.entries = OrderedDict()
+    self.lock = threading.Lock()
+
+  def acquire(self, key, parse):
+    '''Returns the value cached for the given key, caching the result of
+    parse() first if there is none, and pins it until released.
+
+    Raises ValueError if the parsed value alone is larger than the bound.
+    '''
+    with self.lock:
+      if (entry := self.entries.get(key)) is not None:
+        self.hits += 1
+        self.entries.move_to_end(key)
+        entry[2] += 1
+        return entry[0]
+      self.misses += 1
+
+    # Parsed unlocked, so other loads needn't wait.
+    value = parse()
+    size = estimateSize(value)
+    if size > self.maxBytes:
+      raise ValueError(f"File needs about {size >> 20} MiB, more than the"
+                       f" {self.maxBytes >> 20} MiB allowed for loaded files.")
+    with self.lock:
+      # Another thread may have cached the same contents meanwhile.
+      if (entry := self.entries.get(key)) is None:
+        entry = self.entries[key] = [value, size, 0]
+        self.totalBytes += size
+      else:
+        self.entries.move_to_end(key)
+      entry[2] += 1
+      self._evict()
+      return entry[0]
+
+  def release(self, key):
+    '''Unpins the value cached for the given key, once per acquire.'''
+    with self.lock:
+      if (entry := self.entries.get(key)) is not None:
+        entry[2] -= 1
+        self._evict()
+
+  def _evict(self):
+    '''Evicts the least recently used unpinned values until within the size
+    bound, if possible. Called with the lock held.
+    '''
+    for key, (_, size, pins) in list(self.entries.items()):
+      if self.totalBytes <= self.maxBytes:
+        return
+      if not pins:
+        del self.entries[key]
+        self.totalBytes -= size
+
+  def getSize(self, keys):
+    '''Returns the total size of the distinct values cached for the given
+    keys.
+    '''
+    with self.lock:
+      return sum(self.entries[key][1] for key in set(keys)
+                 if key in self.entries)
+
+  def isOverBound(self):
+    '''Returns whether pinned values alone exceed the size bound.'''
+    with self.lock:
+      return self.totalBytes > self.maxBytes
+
+
+class Session():
+  '''State of a single challenge: its wheel, base game YAMLs, and current
+  selections.
+
+  Attributes:
+    cacheKeys:    Dict mapping "wheel" and "games" to the keys of the cached
+                  content the session pins, set by its SessionManager.
+  '''
+  def __init__(self, player):
+    self.player = player
+    self.wheel = None
+    self.wheelHash = None
+    self.gameYamls = []
+    self.upgradeResults = {}
+    self.cacheKeys = {"wheel": [], "games": []}
+
+
+class SessionManager():
+  '''Keeps a session per player, and loads wheels and game YAMLs for them
+  through a shared content cache. Sessions are dropped least recently used
+  first beyond a number of them, or once what they pin exceeds the cache's
+  size bound.
+  '''
+  def __init__(self, maxSessions=DEFAULT_MAX_SESSIONS,
+               maxCacheBytes=DEFAULT_CACHE_BYTES):
+    self.maxSessions = maxSessions
+    self.cache = ContentCache(maxCacheBytes)
+    self.sessions = OrderedDict()
+    self.lock = threading.Lock()
+
+  def getSession(self, player) -> Session:
+    '''Returns the given player's session, starting a new one if needed.'''
+    with self.lock:
+      session = self.sessions.get(player)
+      if session is None:
+        session = self.sessions[player] = Session(player)
+        while len(self.sessions) > self.maxSessions:
+          self._dropSession(next(iter(self.sessions.values())))
+      else:
+        self.sessions.move_to_end(player)
+      return session
+
+  def findSession(self, player) -> Session|None:
+    '''Returns the given player's session, or None if they have none. Never
+    starts a session, nor counts as using one, so it can't cause any to be
+    dropped.
+    '''
+    with self.lock:
+      return self.sessions.get(player)
+
+  def _dropSession(self, session: Session):
+    '''Drops the given session, unpinning its content. Called with the lock
+    held.
+    '''
+    del self.sessions[session.player]
+    self._unpinAll(session)
+
+  def _pin(self, session: Session, kind, keys):
+    '''Replaces the content of the given kind pinned by the given session with
+    the given, already acquired keys, dropping other sessions least recently
+    used first while pinned content exceeds the cache's bound.
+
+    Raises ValueError, unpinning the given keys, if the session's content alone
+    exceeds the bound.
+    '''
+    with self.lock:
+      for key in session.cacheKeys[kind]:
+        self.cache.release(key)
+      session.cacheKeys[kind] = keys
+      if self.sessions.get(session.player) is not session:
+        # Dropped while loading, so nothing may pin its content.
+        self._unpinAll(session)
+        return
+      if self.cache.getSize([key for keys in session.cacheKeys.values()
+                             for key in keys]) > self.cache.maxBytes:
+        self._unpinAll(session)
+        session.wheel, session.wheelHash, session.gameYamls = None, None, []
+        raise ValueError("Wheel and game YAMLs are larger than the memory"
+                         " allowed for loaded files.")
+      for otherSession in list(self.sessions.values()):
+        if not self.cache.isOverBound():
+          return
+        if otherSession is not session:
+          self._dropSession(otherSession)
+
+  def _unpinAll(self, session: Session):
+    '''Unpins everything the given session pins. Called with the lock held.'''
+    for kind, keys in session.cacheKeys.items():
+      for key in keys:
+        self.cache.release(key)
+      session.cacheKeys[kind] = []
+
+  def loadWheel(self, session: Session, path) -> Wheel:
+    '''Loads and validates the Azathoth wheel at the given path into the given
+    session, reusing the cached wheel if the file's contents were loaded
+    before. Returns the wheel.
+    '''
+    contents, contentHash = _readContents(path)
+    key = ("wheel", contentHash)
+
+    def parse():
+      with _LOAD_WHEEL.time():
+        return azathothReader.azathothYamlToWheel(
+          yamlReader.readToYamlFromString(contents))
+    wheel = self.cache.acquire(key, parse)
+    self._pin(session, "wheel", [key])
+    session.wheel, session.wheelHash = wheel, contentHash
+    return wheel
+
+  def loadGameYamls(self, session: Session, paths):
+    '''Loads the game YAMLs at the given paths into the given session, reusing
+    cached documents for files whose contents were loaded before. Returns a
+    GameYaml holding the cached documents for each file.
+    '''
+    keys = []
+    gameYamls = []
+    # Seconds spent parsing files not already cached, if any were.
+    parseSeconds = []
+
+    def parse(contents):
+      start = time.perf_counter()
+      try:
+        documents = yamlReader.readToYamlsFromString(contents)
+      except Exception:
+        _LOAD_GAMES.errors.inc()
+        raise
+      parseSeconds.append(time.perf_counter() - start)
+      return documents
+
+    try:
+      for path in paths:
+        contents, contentHash = _readContents(path)
+        key = ("yaml", contentHash)
+        gameYamls.append(GameYaml(path, documents=self.cache.acquire(
+          key, lambda: parse(contents))))
+        keys.append(key)
+    except Exception:
+      for key in keys:
+        self.cache.release(key)
+      raise
+    if parseSeconds:
+      _LOAD_GAMES.seconds.observe(sum(parseSeconds))
+    self._pin(session, "games", keys)
+    session.gameYamls = gameYamls
+    return gameYamls
+
+  def getStats(self):
+    '''Returns a JSON-friendly dict describing the sessions and cache.'''
+    return {
+      "sessions": len(self.sessions),
+      "maxSessions": self.maxSessions,
+      "cachedFiles": len(self.cache.entries),
+      "pinnedFiles": sum(1 for _, _, pins in list(self.cache.entries.values())
+                         if pins),
+      "cacheBytes": self.cache.totalBytes,
+      "maxCacheBytes": self.cache.maxBytes,
+      "cacheHits": self.cache.hits,
+      "cacheMisses": self.cache.misses,
+    }
@@ -0,0 +1,2 @@
+# Version of Azathoth, shared by every entry point.
+VERSION = "0.2.3"
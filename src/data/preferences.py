@@ -1,4 +1,3 @@
-from file import writer, yamlReader
 from pathlib import Path
 import sys
 
@@ -7,6 +6,10 @@ APPLICATION_AUTHOR = "Granfalegion"
 APPLICATION_NAME = "Azathoth"
 PREFERENCES_FILENAME = "preferences.yaml"
 
+# Summary format saved by default, as named by summaryRenderer.SummaryFormat.
+#   Kept as a plain string so preferences load without importing the renderer.
+DEFAULT_SUMMARY_FORMAT = "yaml"
+
 # Preference field names.
 class Fields:
   VERSION = "version"
@@ -19,6 +22,17 @@ class Fields:
   SILENCE_UPGRADE_CLEAR_WARNING = "silence_upgrade_clear_warning"
   WARN_ON_SAVE_OVERWRITE = "warn_on_save_overwrite"
   DISABLE_BLINK = "disable_blink"
+  STREAM_UPGRADES = "stream_upgrades"
+  SUMMARY_FORMAT = "summary_format"
+  SAVE_AS_PATCHES = "save_as_patches"
+  SAVE_AS_BUNDLE = "save_as_bundle"
+  BUNDLE_COMPRESSION = "bundle_compression"
+  RECORD_HISTORY = "record_history"
+  RESTORE_LAST_SESSION = "restore_last_session"
+  TRACE_SESSIONS = "trace_sessions"
+  PROFILE_MEMORY = "profile_memory"
+  SERVE_EVENT_FEED = "serve_event_feed"
+  EVENT_FEED_ORIGINS = "event_feed_origins"
 
 # Default values used for preference fields.
 DEFAULTS = {
@@ -32,6 +46,17 @@ DEFAULTS = {
   Fields.SILENCE_UPGRADE_CLEAR_WARNING: False,
   Fields.WARN_ON_SAVE_OVERWRITE: False,
   Fields.DISABLE_BLINK: False,
+  Fields.STREAM_UPGRADES: False,
+  Fields.SUMMARY_FORMAT: DEFAULT_SUMMARY_FORMAT,
+  Fields.SAVE_AS_PATCHES: False,
+  Fields.SAVE_AS_BUNDLE: False,
+  Fields.BUNDLE_COMPRESSION: "deflated",
+  Fields.RECORD_HISTORY: False,
+  Fields.RESTORE_LAST_SESSION: True,
+  Fields.TRACE_SESSIONS: False,
+  Fields.PROFILE_MEMORY: False,
+  Fields.SERVE_EVENT_FEED: False,
+  Fields.EVENT_FEED_ORIGINS: [],
 }
 
 class Preferences():
@@ -80,6 +105,8 @@ class Preferences():
 
   def load(self):
     '''Attempts to load preferences from standard storage location.'''
+    # Imported here, deferring PyYAML until the app's window is shown.
+    from file import yamlReader
     self.config: dict = yamlReader.readToYaml(_preferencesFilePath()) or dict()
     self.originalConfig: dict = dict(self.config)  # Unclear if deep copy.
 
@@ -100,6 +127,7 @@ class Preferences():
 
   def _save(self):
     '''Saves preferences to file.'''
+    from file import writer
     _getAzathothDataDirectory().mkdir(parents=True, exist_ok=True)
     writer.writeYamlToFile(self.config, _preferencesFilePath())
 
@@ -110,6 +138,15 @@ def _preferencesFilePath() -> Path:
   return _getAzathothDataDirectory() / PREFERENCES_FILENAME
 
 
+def getAzathothDataFilePath(filename) -> Path:
+  '''Returns the path of the given file in Azathoth's application data folder,
+  creating the folder if needed.
+  '''
+  directory = _getAzathothDataDirectory()
+  directory.mkdir(parents=True, exist_ok=True)
+  return directory / filename
+
+
 def _getAzathothDataDirectory() -> Path:
   '''Returns directory under which Azathoth application data can be stored.'''
   return _getOsDataDirectory() / APPLICATION_AUTHOR / APPLICATION_NAME
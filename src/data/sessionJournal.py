@@ -0,0 +1,176 @@
+# Journal of the app's session, letting it pick up where it left off when next
+#   opened. Every change, i.e. loading a wheel or game YAMLs or changing
+#   selection counts, is appended to a journal as a single compact JSON line.
+#   Every so often, the whole session is written to a snapshot and the journal
+#   started afresh, so restoring only ever reads one snapshot and a short tail.
+#
+# Each line and snapshot carries a sequence number. Lines no newer than the
+#   snapshot are skipped, so a crash between writing a snapshot and starting the
+#   next journal loses nothing, and a torn final line is simply ignored.
+
+from data.preferences import getAzathothDataFilePath
+import json
+import os
+
+# Names of the journal and snapshot files in the app's data folder.
+JOURNAL_FILENAME = "session.journal"
+SNAPSHOT_FILENAME = "session.snapshot.json"
+
+# Number of journal lines appended before a snapshot is taken.
+SNAPSHOT_INTERVAL = 500
+
+
+class JournalKeys:
+  '''Constants for keys used in journal lines and snapshots.'''
+  SEQUENCE = "seq"
+  WHEEL = "wheel"
+  WHEEL_HASH = "wheelHash"
+  GAMES = "games"
+  COUNTS = "counts"
+
+
+class SessionState():
+  '''State of a session: the wheel and game YAMLs loaded, and the selection
+  count of each upgrade, keyed by tuples: (game, upgrade name).
+  '''
+  def __init__(self):
+    self.wheelPath = None
+    self.wheelHash = None
+    self.gamePaths = []
+    self.countsByKey = {}
+
+  def apply(self, entry: dict):
+    '''Applies the given journal line or snapshot to this state.'''
+    if JournalKeys.WHEEL in entry:
+      self.wheelPath = entry[JournalKeys.WHEEL]
+      self.wheelHash = entry.get(JournalKeys.WHEEL_HASH)
+      self.countsByKey = {}
+    if JournalKeys.GAMES in entry:
+      self.gamePaths = list(entry[JournalKeys.GAMES])
+    for game, upgrade, count in entry.get(JournalKeys.COUNTS, []):
+      if count:
+        self.countsByKey[(game, upgrade)] = count
+      else:
+        self.countsByKey.pop((game, upgrade), None)
+
+  def toSnapshot(self, sequence):
+    '''Returns this state as a snapshot with the given sequence number.'''
+    return {
+      JournalKeys.SEQUENCE: sequence,
+      JournalKeys.WHEEL: self.wheelPath,
+      JournalKeys.WHEEL_HASH: self.wheelHash,
+      JournalKeys.GAMES: self.gamePaths,
+      JournalKeys.COUNTS: [[game, upgrade, count] for (game, upgrade), count
+                           in self.countsByKey.items()],
+    }
+
+
+class SessionJournal():
+  '''Append-only journal of a session, with periodic snapshots.'''
+  def __init__(self, journalPath=None, snapshotPath=None,
+               snapshotInterval=SNAPSHOT_INTERVAL):
+    self.journalPath = journalPath or getAzathothDataFilePath(JOURNAL_FILENAME)
+    self.snapshotPath = (snapshotPath
+                         or getAzathothDataFilePath(SNAPSHOT_FILENAME))
+    self.snapshotInterval = snapshotInterval
+    self.state = SessionState()
+    self.sequence = 0
+    self.linesSinceSnapshot = 0
+    self.output = None
+
+  def restore(self) -> SessionState:
+    '''Rebuilds the last session from its snapshot and the journal lines after
+    it, then compacts them into a fresh snapshot. Returns the session state.
+    '''
+    try:
+      with (open(self.snapshotPath)) as input:
+        snapshot = json.load(input)
+      self.state.apply(snapshot)
+      self.sequence = snapshot.get(JournalKeys.SEQUENCE, 0)
+    except (FileNotFoundError, ValueError):
+      pass
+
+    try:
+      with (open(self.journalPath)) as input:
+        for line in input:
+          try:
+            entry = json.loads(line)
+          except ValueError:
+            # Torn write, e.g. from a crash. Nothing after it can be trusted.
+            break
+          if entry.get(JournalKeys.SEQUENCE, 0) > self.sequence:
+            self.state.apply(entry)
+            self.sequence = entry[JournalKeys.SEQUENCE]
+    except FileNotFoundError:
+      pass
+
+    self.snapshot()
+    return self.state
+
+  def _append(self, entry: dict):
+    '''Applies the given entry to the session, then appends it to the journal,
+    taking a snapshot instead once enough lines have been appended.
+    '''
+    self.state.apply(entry)
+    self.sequence += 1
+    entry[JournalKeys.SEQUENCE] = self.sequence
+
+    if self.linesSinceSnapshot >= self.snapshotInterval:
+      self.snapshot()
+      return
+    if self.output is None:
+      self.output = open(self.journalPath, "a")
+    self.output.write(json.dumps(entry, separators=(",", ":")) + "\n")
+    # Reach the OS right away, so the line survives the app crashing.
+    self.output.flush()
+    self.linesSinceSnapshot += 1
+
+  def recordWheel(self, path, wheelHash=None):
+    '''Records that the wheel at the given path was loaded, clearing counts.'''
+    self._append({JournalKeys.WHEEL: str(path),
+                  JournalKeys.WHEEL_HASH: wheelHash})
+
+  def recordGames(self, paths):
+    '''Records that the game YAMLs at the given paths were loaded.'''
+    self._append({JournalKeys.GAMES: [str(path) for path in paths]})
+
+  def recordCounts(self, counts):
+    '''Records the new counts of changed upgrades, given as tuples: (game,
+    upgrade name, count).
+    '''
+    counts = [list(count) for count in counts]
+    if counts:
+      self._append({JournalKeys.COUNTS: counts})
+
+  def snapshot(self):
+    '''Writes the whole session to the snapshot, then starts a fresh journal.
+    '''
+    if self.output:
+      self.output.close()
+      self.output = None
+
+    # Replace the snapshot atomically, so a crash never leaves half of one.
+    temporaryPath = f"{self.snapshotPath}.tmp"
+    with (open(temporaryPath, "w")) as output:
+      json.dump(self.state.toSnapshot(self.sequence), output,
+                separators=(",", ":"))
+    os.replace(temporaryPath, self.snapshotPath)
+
+    with (open(self.journalPath, "w")):
+      pass
+    self.linesSinceSnapshot = 0
+
+  def close(self):
+    '''Snapshots the session, leaving it ready to restore.'''
+    self.snapshot()
+
+  def discard(self):
+    '''Closes the journal and deletes it and its snapshot.'''
+    if self.output:
+      self.output.close()
+      self.output = None
+    for path in (self.journalPath, self.snapshotPath):
+      try:
+        os.remove(path)
+      except FileNotFoundError:
+        pass
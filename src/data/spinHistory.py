@@ -0,0 +1,204 @@
+# Embedded SQLite history of every spin and every saved set of selections, so
+#   results outlive the chooser and can be queried across players and seasons.
+#
+# Records are buffered in memory and written in batches, each in a single
+#   transaction, so recording never costs a disk sync per spin. Queries are
+#   served by indexes on player and time, and on upgrade and run, so they stay
+#   fast however many years of runs accumulate.
+
+from data.preferences import getAzathothDataFilePath
+from data.upgrades import Upgrade
+import sqlite3
+import threading
+import time
+
+# Name of the history database in Azathoth's application data folder.
+HISTORY_FILENAME = "history.sqlite3"
+
+# Most records buffered before they are written automatically.
+FLUSH_BATCH_SIZE = 256
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+  id INTEGER PRIMARY KEY,
+  kind TEXT NOT NULL,
+  player TEXT NOT NULL,
+  wheelHash TEXT,
+  wheelName TEXT,
+  seed TEXT,
+  spins INTEGER,
+  timestamp REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS selections (
+  runId INTEGER NOT NULL REFERENCES runs(id),
+  game TEXT NOT NULL,
+  upgrade TEXT NOT NULL,
+  count INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runsByPlayer ON runs(player, kind, timestamp);
+CREATE INDEX IF NOT EXISTS runsByTime ON runs(kind, timestamp);
+CREATE INDEX IF NOT EXISTS selectionsByRun ON selections(runId);
+CREATE INDEX IF NOT EXISTS selectionsByUpgrade ON selections(game, upgrade, runId);
+'''
+
+
+class RunKind:
+  '''Constants for the kinds of runs recorded.'''
+  SPIN = "spin"
+  SAVE = "save"
+
+
+def getDefaultHistoryPath():
+  '''Returns the path of the history database in Azathoth's application data
+  folder.
+  '''
+  return getAzathothDataFilePath(HISTORY_FILENAME)
+
+
+class _Run():
+  '''A run buffered for writing: one spin or save, with its selections.'''
+  def __init__(self, kind, player, selections, wheelHash, wheelName, seed,
+               spins, timestamp):
+    self.kind = kind
+    self.player = player
+    self.selections = selections
+    self.wheelHash = wheelHash
+    self.wheelName = wheelName
+    self.seed = seed
+    self.spins = spins
+    self.timestamp = timestamp
+
+
+def _timeRange(since, until):
+  '''Returns a SQL condition on runs.timestamp, and its parameters, limiting
+  runs to the given range of UNIX times. Either bound may be None.
+  '''
+  conditions, parameters = [], []
+  if since is not None:
+    conditions.append("runs.timestamp >= ?")
+    parameters.append(since)
+  if until is not None:
+    conditions.append("runs.timestamp < ?")
+    parameters.append(until)
+  return "".join(f" AND {condition}" for condition in conditions), parameters
+
+
+class SpinHistory():
+  '''History of spins and saves stored in a SQLite database. Safe to use from
+  several threads. Close it, or use it as a context manager, to write any
+  buffered records.
+  '''
+  def __init__(self, path=None):
+    self.path = path or getDefaultHistoryPath()
+    self.connection = sqlite3.connect(self.path, check_same_thread=False)
+    # Write-ahead logging lets queries run alongside writes, and only syncing
+    #   at checkpoints keeps batched writes cheap.
+    self.connection.execute("PRAGMA journal_mode=WAL")
+    self.connection.execute("PRAGMA synchronous=NORMAL")
+    self.connection.executescript(_SCHEMA)
+    self.pending = []
+    self.lock = threading.Lock()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exceptionInfo):
+    self.close()
+
+  def record(self, kind, player, upgradeResults: dict[Upgrade, int],
+             wheelHash=None, wheelName=None, seed=None, spins=None,
+             timestamp=None):
+    '''Buffers a run of the given kind for writing, with the selections in the
+    given upgrade results. Buffered runs are written once enough accumulate,
+    or when flushed.
+    '''
+    selections = [(upgrade.yamlPath[0], upgrade.name, count)
+                  for upgrade, count in upgradeResults.items() if count > 0]
+    run = _Run(kind, player, selections, wheelHash, wheelName,
+               None if seed is None else str(seed), spins,
+               time.time() if timestamp is None else timestamp)
+    with self.lock:
+      self.pending.append(run)
+      isFull = len(self.pending) >= FLUSH_BATCH_SIZE
+    if isFull:
+      self.flush()
+
+  def flush(self):
+    '''Writes every buffered run in a single transaction.'''
+    with self.lock:
+      runs, self.pending = self.pending, []
+      if not runs:
+        return
+      with self.connection:
+        for run in runs:
+          runId = self.connection.execute(
+            "INSERT INTO runs (kind, player, wheelHash, wheelName, seed, spins,"
+            " timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (run.kind, run.player, run.wheelHash, run.wheelName, run.seed,
+             run.spins, run.timestamp)).lastrowid
+          self.connection.executemany(
+            "INSERT INTO selections (runId, game, upgrade, count)"
+            " VALUES (?, ?, ?, ?)",
+            [(runId, *selection) for selection in run.selections])
+
+  def close(self):
+    '''Writes any buffered runs, then closes the database.'''
+    self.flush()
+    self.connection.close()
+
+  def _query(self, sql, parameters):
+    '''Returns the rows of the given query, as dicts, after writing any
+    buffered runs so they're included.
+    '''
+    self.flush()
+    with self.lock:
+      cursor = self.connection.execute(sql, parameters)
+      columns = [column[0] for column in cursor.description]
+      return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+  def getPlayerUpgrades(self, player, kind=RunKind.SAVE, since=None,
+                        until=None):
+    '''Returns the upgrades the given player got in runs of the given kind
+    within the given range of UNIX times, with their total counts and the
+    number of runs they appeared in, most selected first.
+    '''
+    timeCondition, timeParameters = _timeRange(since, until)
+    return self._query(
+      "SELECT game, upgrade, SUM(count) AS count, COUNT(*) AS runs"
+      " FROM runs JOIN selections ON selections.runId = runs.id"
+      f" WHERE runs.player = ? AND runs.kind = ?{timeCondition}"
+      " GROUP BY game, upgrade ORDER BY count DESC, game, upgrade",
+      [player, kind, *timeParameters])
+
+  def getUpgradeFrequency(self, game, upgrade, kind=RunKind.SAVE, since=None,
+                          until=None):
+    '''Returns, for each player who got the given upgrade in runs of the given
+    kind within the given range of UNIX times, their total count of it and the
+    number of runs it appeared in, most selected first.
+    '''
+    timeCondition, timeParameters = _timeRange(since, until)
+    return self._query(
+      "SELECT runs.player AS player, SUM(count) AS count, COUNT(*) AS runs"
+      " FROM selections JOIN runs ON runs.id = selections.runId"
+      " WHERE selections.game = ? AND selections.upgrade = ?"
+      f" AND runs.kind = ?{timeCondition}"
+      " GROUP BY runs.player ORDER BY count DESC, player",
+      [game, upgrade, kind, *timeParameters])
+
+  def getRuns(self, player=None, kind=None, since=None, until=None, limit=100):
+    '''Returns the most recent runs, newest first, optionally only those of the
+    given player or kind within the given range of UNIX times.
+    '''
+    timeCondition, timeParameters = _timeRange(since, until)
+    conditions, parameters = "", []
+    if player is not None:
+      conditions += " AND runs.player = ?"
+      parameters.append(player)
+    if kind is not None:
+      conditions += " AND runs.kind = ?"
+      parameters.append(kind)
+    return self._query(
+      "SELECT id, kind, player, wheelHash, wheelName, seed, spins, timestamp"
+      f" FROM runs WHERE 1 = 1{conditions}{timeCondition}"
+      " ORDER BY timestamp DESC LIMIT ?",
+      [*parameters, *timeParameters, limit])
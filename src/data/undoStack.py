@@ -0,0 +1,74 @@
+# Undo and redo of changes to selection counts. Each operation is stored as the
+#   change in count of only the upgrades it touched, rather than a copy of every
+#   count, and is inverted against the current counts when undone. The total
+#   number of changes held is bounded, dropping the oldest operations first, so
+#   memory stays small however long a session runs.
+
+from collections import deque
+from data.upgrades import Upgrade
+
+# Most per-upgrade changes held across all undoable and redoable operations.
+MAX_UNDO_CHANGES = 100000
+
+
+class UndoStack():
+  '''Stacks of undoable and redoable operations on selection counts. Each
+  operation is a tuple: (tuple of upgrades, tuple of their changes in count).
+  Parallel tuples keep an operation to about two references per upgrade.
+  '''
+  def __init__(self, maxChanges=MAX_UNDO_CHANGES):
+    self.maxChanges = maxChanges
+    self.undoOperations = deque()
+    self.redoOperations = []
+    self.changeCount = 0
+
+  def canUndo(self):
+    return bool(self.undoOperations)
+
+  def canRedo(self):
+    return bool(self.redoOperations)
+
+  def clear(self):
+    '''Forgets every operation.'''
+    self.undoOperations.clear()
+    self.redoOperations.clear()
+    self.changeCount = 0
+
+  def push(self, changes):
+    '''Records a new operation from the given changes, as tuples: (upgrade, old
+    count, new count). Anything that could be redone is forgotten.
+    '''
+    changes = [(upgrade, newCount - oldCount)
+               for upgrade, oldCount, newCount in changes
+               if newCount != oldCount]
+    if not changes:
+      return
+    for upgrades, _ in self.redoOperations:
+      self.changeCount -= len(upgrades)
+    self.redoOperations.clear()
+
+    upgrades, countChanges = zip(*changes)
+    self.undoOperations.append((upgrades, countChanges))
+    self.changeCount += len(upgrades)
+    # Always keep the newest operation, however large.
+    while self.changeCount > self.maxChanges and len(self.undoOperations) > 1:
+      self.changeCount -= len(self.undoOperations.popleft()[0])
+
+  def undo(self, getCount) -> dict[Upgrade, int]:
+    '''Moves the latest operation to the redo stack, returning the counts that
+    undo it, given a function returning each upgrade's current count.
+    '''
+    upgrades, countChanges = operation = self.undoOperations.pop()
+    self.redoOperations.append(operation)
+    return {upgrade: getCount(upgrade) - change
+            for upgrade, change in zip(upgrades, countChanges)}
+
+  def redo(self, getCount) -> dict[Upgrade, int]:
+    '''Moves the latest undone operation back to the undo stack, returning the
+    counts that redo it, given a function returning each upgrade's current
+    count.
+    '''
+    upgrades, countChanges = operation = self.redoOperations.pop()
+    self.undoOperations.append(operation)
+    return {upgrade: getCount(upgrade) + change
+            for upgrade, change in zip(upgrades, countChanges)}
@@ -0,0 +1,94 @@
+# Search index over upgrades, matching queries against upgrade names, game
+#   names and yamlPath segments. Every prefix of every token is indexed up
+#   front, so each keystroke of a search is answered with a few dict lookups
+#   and set intersections rather than a scan over every upgrade.
+
+import bisect
+import re
+
+# Longest token prefix indexed. Longer query terms are instead matched against
+#   the sorted vocabulary of distinct tokens.
+MAX_PREFIX_LENGTH = 8
+
+# Pattern splitting text into searchable tokens.
+_TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def _tokenize(text):
+  '''Returns the lowercase searchable tokens in the given text.'''
+  return _TOKEN_PATTERN.findall(str(text).lower())
+
+
+class UpgradeIndex():
+  '''Prefix index over a list of upgrades, identifying them by their position
+  in that list.
+
+  A query matches an upgrade if every whitespace-separated term of the query is
+  a prefix of some token of the upgrade's name, game, or yamlPath.
+  '''
+  def __init__(self, upgrades):
+    self.upgrades = list(upgrades)
+
+    # Dict mapping each distinct token to the set of upgrade positions using it.
+    positionsByToken = {}
+    for position, upgrade in enumerate(self.upgrades):
+      tokens = set(_tokenize(upgrade.name))
+      for step in upgrade.yamlPath:
+        tokens.update(_tokenize(step))
+      for token in tokens:
+        positionsByToken.setdefault(token, set()).add(position)
+    self.positionsByToken = positionsByToken
+
+    # Sorted distinct tokens, used to look up query terms longer than any
+    #   indexed prefix.
+    self.vocabulary = sorted(positionsByToken.keys())
+
+    # Dict mapping each token prefix to the set of matching upgrade positions.
+    #   Built from distinct tokens, as there are far fewer than upgrades.
+    self.positionsByPrefix = {}
+    for token, positions in positionsByToken.items():
+      for length in range(1, min(len(token), MAX_PREFIX_LENGTH) + 1):
+        self.positionsByPrefix.setdefault(token[:length], set()).update(positions)
+
+    self.allPositions = frozenset(range(len(self.upgrades)))
+
+
+  def _searchTerm(self, term):
+    '''Returns the set of positions of upgrades with a token starting with the
+    given lowercase term.
+    '''
+    if len(term) <= MAX_PREFIX_LENGTH:
+      return self.positionsByPrefix.get(term, set())
+
+    # Union the few distinct tokens sharing this longer prefix.
+    positions = set()
+    for i in range(bisect.bisect_left(self.vocabulary, term),
+                   len(self.vocabulary)):
+      if not self.vocabulary[i].startswith(term):
+        break
+      positions |= self.positionsByToken[self.vocabulary[i]]
+    return positions
+
+
+  def search(self, query):
+    '''Returns the set of positions of upgrades matching every term in the
+    given query. An empty query matches every upgrade.
+    '''
+    terms = _tokenize(query)
+    if not terms:
+      return self.allPositions
+
+    # Intersect from the rarest term, keeping every intermediate set small.
+    termPositions = sorted((self._searchTerm(term) for term in terms), key=len)
+    positions = set(termPositions[0])
+    for otherPositions in termPositions[1:]:
+      positions &= otherPositions
+      if not positions:
+        break
+    return positions
+
+
+  def searchUpgrades(self, query):
+    '''Returns the upgrades matching the given query, in their original order.
+    '''
+    return [self.upgrades[position] for position in sorted(self.search(query))]
@@ -0,0 +1,326 @@
+# Memory profiling of loading, upgrading and saving, for finding out where
+#   memory goes when large wheels or many game YAMLs are loaded. Code marks
+#   each phase of its work, and while profiling is enabled, tracemalloc
+#   snapshots are taken as each phase starts and ends. The report lists how
+#   much memory each phase kept, the lines that allocated it, and the size of
+#   the wheels and YAML trees it produced, broken down by type.
+#
+# tracemalloc measures the whole process, so phases on different threads are
+#   run one at a time while profiling, or each would count the other's
+#   allocations.
+#
+# Profiling is disabled by default, as tracemalloc slows everything down
+#   severalfold. It is enabled by the app's preferences, by the command line's
+#   --memory-profile option, or by setting the AZATHOTH_MEMORY_PROFILE
+#   environment variable to the path to save the report to when the program
+#   exits. tracemalloc itself is only imported once profiling is enabled, so
+#   importing this module to mark phases costs nothing while disabled.
+
+import atexit
+from collections import defaultdict
+import enum
+import gc
+import os
+import threading
+import types
+
+# Environment variable naming a file to save a memory report of the whole run to.
+MEMORY_PROFILE_ENV_VAR = "AZATHOTH_MEMORY_PROFILE"
+
+# Name of the report the app saves to its data folder on close, if preferred.
+REPORT_FILENAME = "memory-report.txt"
+
+# Frames of stack recorded with each allocation. Sites are grouped by line, so
+#   only the innermost frame is needed.
+TRACEBACK_FRAMES = 1
+
+# Allocation sites and types listed for each phase of the report.
+DEFAULT_TOP_ENTRIES = 15
+
+# Types of objects never counted as part of what a value retains, being
+#   shared by the whole program rather than owned by any one value.
+_SHARED_TYPES = (type, types.ModuleType, types.FunctionType,
+                 types.BuiltinFunctionType, types.MethodType, types.CodeType,
+                 types.FrameType, enum.Enum)
+
+# Files whose allocations are left out of reports, being made by the profiler
+#   itself or by imports. tracemalloc's own file is added once it's imported.
+_IGNORED_FILENAMES = frozenset([
+  __file__,
+  "<frozen importlib._bootstrap>",
+  "<frozen importlib._bootstrap_external>",
+  "<unknown>",
+])
+
+# The enabled MemoryProfiler, or None while profiling is disabled.
+_profiler = None
+
+
+def getSizesByType(value):
+  '''Returns a dict mapping the name of each type of object reachable from the
+  given value to a list: [number of them, total bytes]. Each object is counted
+  once, however many times it is referenced.
+  '''
+  sizesByType = defaultdict(lambda: [0, 0])
+  seenIds = set()
+  pending = [value]
+  while pending:
+    obj = pending.pop()
+    if id(obj) in seenIds or isinstance(obj, _SHARED_TYPES):
+      continue
+    seenIds.add(id(obj))
+    sizes = sizesByType[type(obj).__name__]
+    sizes[0] += 1
+    sizes[1] += obj.__sizeof__() + (16 if gc.is_tracked(obj) else 0)
+    pending.extend(gc.get_referents(obj))
+  return dict(sizesByType)
+
+
+def _formatBytes(size):
+  '''Returns the given number of bytes in the most readable unit.'''
+  for unit, scale in (("MiB", 1 << 20), ("KiB", 1 << 10)):
+    if abs(size) >= scale:
+      return f"{size / scale:.1f} {unit}"
+  return f"{size} B"
+
+
+class PhaseResult():
+  '''Memory used by a single phase of work.
+
+  Attributes:
+    label:          Name of the phase.
+    sizeBefore:     Bytes traced as the phase started.
+    sizeAfter:      Bytes traced as the phase ended.
+    peak:           Most bytes traced at once during the phase.
+    topStats:       Allocation sites that grew the most during the phase, as
+                    tracemalloc StatisticDiffs.
+    sizesByValue:   Dict mapping the name of each value the phase measured to
+                    its sizes by type, as from getSizesByType.
+  '''
+  def __init__(self, label, sizeBefore, sizeAfter, peak, topStats):
+    self.label = label
+    self.sizeBefore = sizeBefore
+    self.sizeAfter = sizeAfter
+    self.peak = peak
+    self.topStats = topStats
+    self.sizesByValue = {}
+
+
+class _NullPhase():
+  '''Phase returned while profiling is disabled, doing nothing at all.'''
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    return False
+
+  def measure(self, name, value):
+    pass
+
+
+_NULL_PHASE = _NullPhase()
+
+
+class _Phase():
+  '''Phase snapshotting memory as it starts and ends, holding the profiler's
+  phase lock throughout so no other phase runs meanwhile.
+  '''
+  def __init__(self, profiler, label):
+    self.profiler = profiler
+    self.label = label
+    self.sizesByValue = {}
+
+  def __enter__(self):
+    import tracemalloc
+    self.profiler.phaseLock.acquire()
+    try:
+      self.before = self.profiler.takeSnapshot()
+      self.sizeBefore, _ = tracemalloc.get_traced_memory()
+      tracemalloc.reset_peak()
+    except BaseException:
+      # Released whatever the failure, even an interrupt, then re-raised.
+      self.profiler.phaseLock.release()
+      raise
+    return self
+
+  def __exit__(self, *exception):
+    import tracemalloc
+    try:
+      sizeAfter, peak = tracemalloc.get_traced_memory()
+      after = self.profiler.takeSnapshot()
+      result = PhaseResult(
+        self.label, self.sizeBefore, sizeAfter, peak,
+        self.profiler.getTopDifferences(after, self.before))
+      result.sizesByValue = self.sizesByValue
+      self.profiler.record(result, after)
+      self.before = None
+    finally:
+      self.profiler.phaseLock.release()
+    return False
+
+  def measure(self, name, value):
+    '''Records the sizes by type of everything reachable from the given value,
+    e.g. a wheel or YAML tree the phase produced.
+    '''
+    self.sizesByValue[name] = getSizesByType(value)
+
+
+class MemoryProfiler():
+  '''Takes tracemalloc snapshots around phases of work, keeping the result of
+  each phase and the snapshot taken as the latest phase of each name ended.
+  '''
+  def __init__(self, frames=TRACEBACK_FRAMES, topEntries=DEFAULT_TOP_ENTRIES):
+    import tracemalloc
+    self.frames = frames
+    self.topEntries = topEntries
+    self.results = []
+    # Dict mapping phase label to the snapshot taken as it last ended.
+    self.snapshotsByLabel = {}
+    self.lock = threading.Lock()
+    # Held by each phase from start to end. Reentrant, so a phase nested in
+    #   another on the same thread doesn't deadlock.
+    self.phaseLock = threading.RLock()
+    self.startedTracing = False
+    self.ignoredFilenames = _IGNORED_FILENAMES | {tracemalloc.__file__}
+
+  def start(self):
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+      tracemalloc.start(self.frames)
+      self.startedTracing = True
+
+  def stop(self):
+    import tracemalloc
+    if self.startedTracing:
+      tracemalloc.stop()
+      self.startedTracing = False
+
+  def takeSnapshot(self):
+    '''Returns a snapshot of memory allocated so far.'''
+    import tracemalloc
+    return tracemalloc.take_snapshot()
+
+  def getTopDifferences(self, snapshot, baseSnapshot, keyType="lineno"):
+    '''Returns the allocation sites that differ most between the given
+    snapshot and the base snapshot, as tracemalloc StatisticDiffs, leaving out
+    the profiler's own allocations.
+    '''
+    # Sites are filtered once grouped rather than filtering each trace, as
+    #   there are far fewer of them.
+    differences = [difference for difference
+                   in snapshot.compare_to(baseSnapshot, keyType)
+                   if difference.traceback[0].filename
+                   not in self.ignoredFilenames]
+    return differences[:self.topEntries]
+
+  def record(self, result: PhaseResult, snapshot):
+    with self.lock:
+      self.results.append(result)
+      self.snapshotsByLabel[result.label] = snapshot
+
+  def compare(self, labelBefore, labelAfter, keyType="lineno"):
+    '''Returns the allocation sites that differ most between the snapshots
+    taken as the given phases last ended, as tracemalloc StatisticDiffs.
+
+    Raises ValueError if either phase hasn't ended yet.
+    '''
+    for label in (labelBefore, labelAfter):
+      if label not in self.snapshotsByLabel:
+        raise ValueError(f"No snapshot has been taken after phase {label}.")
+    return self.getTopDifferences(self.snapshotsByLabel[labelAfter],
+                                  self.snapshotsByLabel[labelBefore], keyType)
+
+  def formatReport(self):
+    '''Returns a report of every phase profiled, followed by a comparison of
+    the first and last phases to end.
+    '''
+    lines = ["Azathoth memory report", ""]
+    for result in list(self.results):
+      lines.append(f"== {result.label}: {_formatBytes(result.sizeBefore)} ->"
+                   f" {_formatBytes(result.sizeAfter)}"
+                   f" ({_formatBytes(result.sizeAfter - result.sizeBefore)}"
+                   f" kept), peak {_formatBytes(result.peak)}")
+      lines.append("  Top allocation sites:")
+      lines.extend(f"    {stat}" for stat in result.topStats)
+      for name, sizesByType in result.sizesByValue.items():
+        totalCount = sum(count for count, _ in sizesByType.values())
+        totalSize = sum(size for _, size in sizesByType.values())
+        lines.append(f"  {name}: {totalCount} objects,"
+                     f" {_formatBytes(totalSize)}")
+        topTypes = sorted(sizesByType.items(), key=lambda item: -item[1][1])
+        lines.extend(f"    {typeName:24} {count:>10} {_formatBytes(size):>12}"
+                     for typeName, (count, size)
+                     in topTypes[:self.topEntries])
+      lines.append("")
+
+    labels = list(self.snapshotsByLabel)
+    if len(labels) > 1:
+      lines.append(f"== Growth from end of {labels[0]} to end of"
+                   f" {labels[-1]}:")
+      lines.extend(f"    {stat}" for stat in self.compare(labels[0],
+                                                           labels[-1]))
+    return "\n".join(lines) + "\n"
+
+  def export(self, path):
+    '''Saves the report to the given path.'''
+    with (open(path, "w")) as output:
+      output.write(self.formatReport())
+
+
+def enable(frames=TRACEBACK_FRAMES) -> MemoryProfiler:
+  '''Starts profiling phases, if not already, returning the MemoryProfiler
+  profiling them.
+  '''
+  global _profiler
+  if _profiler is None:
+    _profiler = MemoryProfiler(frames)
+    _profiler.start()
+  return _profiler
+
+
+def disable() -> MemoryProfiler|None:
+  '''Stops profiling, returning the MemoryProfiler that profiled, if any.'''
+  global _profiler
+  profiler, _profiler = _profiler, None
+  if profiler:
+    profiler.stop()
+  return profiler
+
+
+def isEnabled():
+  return _profiler is not None
+
+
+def getProfiler() -> MemoryProfiler|None:
+  '''Returns the enabled MemoryProfiler, or None if profiling is disabled.'''
+  return _profiler
+
+
+def phase(label):
+  '''Returns a context manager profiling its body as a phase with the given
+  label. Its measure(name, value) method records the sizes of a value the
+  phase produced.
+  '''
+  if _profiler is None:
+    return _NULL_PHASE
+  return _Phase(_profiler, label)
+
+
+def _exportOnExit(path):
+  if _profiler is not None:
+    try:
+      _profiler.export(path)
+    except OSError:
+      pass
+
+
+def enableFromEnvironment():
+  '''Enables profiling if the AZATHOTH_MEMORY_PROFILE environment variable
+  names a file, saving the report to it when the program exits. Returns
+  whether enabled.
+  '''
+  if not (path := os.environ.get(MEMORY_PROFILE_ENV_VAR)):
+    return False
+  enable()
+  atexit.register(_exportOnExit, path)
+  return True
@@ -0,0 +1,359 @@
+# In-process operational metrics for the long-running service and batch modes:
+#   counters of work done, and histograms of how long each operation took.
+#   Metrics are exported as Prometheus-style text, e.g. by the service's
+#   GET /metrics, and summarized in a periodic log line.
+#
+# Updates are cheap enough for hot paths. Each thread counts into its own cell
+#   of a metric, so updates never take a lock, and reads sum every cell. Work
+#   done in worker processes is recorded there and merged back by the caller,
+#   using callCollecting and mergeCollected.
+
+from bisect import bisect_left
+import sys
+import threading
+import time
+
+# Upper bounds, in seconds, of the buckets of latency histograms.
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1,
+                   2.5, 5, 10, 30)
+
+# Default seconds between periodic log lines.
+DEFAULT_LOG_INTERVAL = 60
+
+
+class _PerThreadCells():
+  '''Base of metrics whose value is kept in a cell per updating thread, each a
+  list of numbers updated only by its own thread.
+  '''
+  def __init__(self, name, help, labels, cellSize):
+    self.name = name
+    self.help = help
+    self.labels = labels
+    self.cellSize = cellSize
+    self.cells = []
+    self.local = threading.local()
+    self.lock = threading.Lock()
+
+  def _getCell(self):
+    '''Returns the current thread's cell, creating it on first use.'''
+    try:
+      return self.local.cell
+    except AttributeError:
+      cell = self.local.cell = [0] * self.cellSize
+      with self.lock:
+        self.cells.append(cell)
+      return cell
+
+  def getValues(self):
+    '''Returns the sum of every thread's cell.'''
+    totals = [0] * self.cellSize
+    for cell in list(self.cells):
+      for i, value in enumerate(cell):
+        totals[i] += value
+    return totals
+
+  def addValues(self, values):
+    '''Adds the given values to the current thread's cell.'''
+    cell = self._getCell()
+    for i, value in enumerate(values):
+      cell[i] += value
+
+
+class Counter(_PerThreadCells):
+  '''Count of something that only ever goes up.'''
+  kind = "counter"
+
+  def __init__(self, name, help="", labels=()):
+    super().__init__(name, help, labels, 1)
+
+  def inc(self, amount=1):
+    try:
+      self.local.cell[0] += amount
+    except AttributeError:
+      self._getCell()[0] += amount
+
+  @property
+  def value(self):
+    return self.getValues()[0]
+
+
+class _Timer():
+  '''Context manager observing how long its body took in a Histogram. Given a
+  Counter of errors, bodies that raise are counted there instead.
+  '''
+  __slots__ = ("histogram", "errors", "start")
+
+  def __init__(self, histogram, errors=None):
+    self.histogram = histogram
+    self.errors = errors
+
+  def __enter__(self):
+    self.start = time.perf_counter()
+    return self
+
+  def __exit__(self, exceptionType, *exception):
+    if exceptionType is not None and self.errors is not None:
+      self.errors.inc()
+    else:
+      self.histogram.observe(time.perf_counter() - self.start)
+    return False
+
+
+class Histogram(_PerThreadCells):
+  '''Distribution of observed values over fixed buckets. Each cell holds the
+  count of each bucket, then of values beyond every bucket, then their sum.
+  '''
+  kind = "histogram"
+
+  def __init__(self, name, help="", labels=(), buckets=LATENCY_BUCKETS):
+    super().__init__(name, help, labels, len(buckets) + 2)
+    self.buckets = tuple(buckets)
+
+  def observe(self, value):
+    cell = self._getCell()
+    cell[bisect_left(self.buckets, value)] += 1
+    cell[-1] += value
+
+  def time(self):
+    '''Returns a context manager observing how long its body takes.'''
+    return _Timer(self)
+
+  def getSummary(self):
+    '''Returns a tuple: (number of values observed, their sum, list of
+    cumulative counts per bucket, ending with the count of all values).
+    '''
+    values = self.getValues()
+    cumulativeCounts = []
+    total = 0
+    for count in values[:-1]:
+      total += count
+      cumulativeCounts.append(total)
+    return total, values[-1], cumulativeCounts
+
+  def getQuantileBound(self, quantile):
+    '''Returns the upper bound of the bucket holding the given quantile of
+    observed values, inf if beyond every bucket, or None if none observed.
+    '''
+    count, _, cumulativeCounts = self.getSummary()
+    if not count:
+      return None
+    for bound, cumulativeCount in zip(self.buckets, cumulativeCounts):
+      if cumulativeCount >= quantile * count:
+        return bound
+    return float("inf")
+
+
+def _formatLabels(labels, extra=()):
+  '''Returns the given label tuples in Prometheus' text format.'''
+  labels = [*labels, *extra]
+  if not labels:
+    return ""
+  return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+def _formatNumber(value):
+  if value == float("inf"):
+    return "+Inf"
+  return repr(value) if isinstance(value, float) else str(value)
+
+
+class MetricsRegistry():
+  '''Every metric recorded in this process, by name and labels.'''
+  def __init__(self):
+    # Dict mapping tuples, (name, tuple of (label, value) tuples), to metrics.
+    self.metrics = {}
+    self.lock = threading.Lock()
+
+  def _getOrCreate(self, metricClass, name, help, labels, **kwargs):
+    key = (name, tuple(sorted(labels.items())))
+    if (metric := self.metrics.get(key)) is None:
+      with self.lock:
+        if (metric := self.metrics.get(key)) is None:
+          metric = self.metrics[key] = metricClass(name, help, key[1],
+                                                   **kwargs)
+    if not isinstance(metric, metricClass):
+      raise ValueError(f"Metric {name} is already a {metric.kind}.")
+    return metric
+
+  def counter(self, name, help="", **labels) -> Counter:
+    '''Returns the counter with the given name and labels, creating it first
+    if needed.
+    '''
+    return self._getOrCreate(Counter, name, help, labels)
+
+  def histogram(self, name, help="", buckets=LATENCY_BUCKETS,
+                **labels) -> Histogram:
+    '''Returns the histogram with the given name and labels, creating it with
+    the given bucket bounds first if needed.
+    '''
+    return self._getOrCreate(Histogram, name, help, labels, buckets=buckets)
+
+  def snapshot(self):
+    '''Returns the current values of every metric, as a picklable dict.'''
+    return {key: (metric.kind, metric.help, metric.getValues())
+            for key, metric in list(self.metrics.items())}
+
+  def merge(self, recorded: dict):
+    '''Adds the given values, e.g. recorded by a worker process, to this
+    registry's metrics.
+    '''
+    for (name, labels), (kind, help, values) in recorded.items():
+      if kind == Counter.kind:
+        metric = self.counter(name, help, **dict(labels))
+      else:
+        metric = self.histogram(name, help, **dict(labels))
+      metric.addValues(values)
+
+  def render(self):
+    '''Returns every metric in Prometheus' text exposition format.'''
+    lines = []
+    lastName = None
+    for (name, labels), metric in sorted(list(self.metrics.items())):
+      if name != lastName:
+        lines.append(f"# HELP {name} {metric.help}")
+        lines.append(f"# TYPE {name} {metric.kind}")
+        lastName = name
+      if isinstance(metric, Counter):
+        lines.append(f"{name}{_formatLabels(labels)} {metric.value}")
+        continue
+      count, total, cumulativeCounts = metric.getSummary()
+      for bound, cumulativeCount in zip([*metric.buckets, float("inf")],
+                                        cumulativeCounts):
+        lines.append(f"{name}_bucket"
+                     f"{_formatLabels(labels, [('le', _formatNumber(bound))])}"
+                     f" {cumulativeCount}")
+      lines.append(f"{name}_sum{_formatLabels(labels)} {_formatNumber(total)}")
+      lines.append(f"{name}_count{_formatLabels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+  def formatLogLine(self):
+    '''Returns a one-line summary of every metric recorded so far: each
+    counter's value, and each histogram's count, mean and approximate 95th
+    percentile.
+    '''
+    parts = []
+    for (name, labels), metric in sorted(list(self.metrics.items())):
+      label = name.removeprefix("azathoth_") + "".join(
+        f".{value}" for _, value in labels)
+      if isinstance(metric, Counter):
+        parts.append(f"{label}={metric.value}")
+        continue
+      count, total, _ = metric.getSummary()
+      if count:
+        parts.append(f"{label}=n:{count},mean:{total / count * 1000:.1f}ms,"
+                     f"p95<={metric.getQuantileBound(0.95) * 1000:g}ms")
+    return "metrics: " + " ".join(parts)
+
+
+# Registry of every metric recorded by Azathoth in this process.
+REGISTRY = MetricsRegistry()
+
+SPINS = REGISTRY.counter(
+  "azathoth_spins_total", "Spins performed.")
+EXHAUSTED_CHOICES = REGISTRY.counter(
+  "azathoth_exhausted_choices_total",
+  "Choices passed over by spins for having no selections left.")
+YAMLS_READ = REGISTRY.counter(
+  "azathoth_yamls_read_total", "YAML documents parsed.")
+CHARACTERS_READ = REGISTRY.counter(
+  "azathoth_read_characters_total", "Characters of YAML parsed.")
+YAMLS_WRITTEN = REGISTRY.counter(
+  "azathoth_yamls_written_total", "YAML documents written.")
+BYTES_WRITTEN = REGISTRY.counter(
+  "azathoth_written_bytes_total", "Bytes of output files written.")
+
+
+def getOperationSeconds(operation) -> Histogram:
+  '''Returns the histogram of how long the given operation takes.'''
+  return REGISTRY.histogram("azathoth_operation_seconds",
+                            "Seconds taken by each operation.",
+                            operation=operation)
+
+
+def getOperationErrors(operation) -> Counter:
+  '''Returns the counter of times the given operation failed.'''
+  return REGISTRY.counter("azathoth_operation_errors_total",
+                          "Operations that failed, left out of their"
+                          " latency histogram.", operation=operation)
+
+
+class Operation():
+  '''How long an operation takes when it succeeds, and how often it fails.'''
+  def __init__(self, name):
+    self.seconds = getOperationSeconds(name)
+    self.errors = getOperationErrors(name)
+
+  def time(self):
+    '''Returns a context manager observing how long its body takes, or
+    counting an error if it raises.
+    '''
+    return _Timer(self.seconds, self.errors)
+
+
+def callCollecting(fn, *args):
+  '''Calls the given function with the given args, returning a tuple: (its
+  result, the exception it raised if any, metrics recorded during the call).
+  Run in worker processes, so the caller can merge what they record into its
+  own registry with mergeCollected, even when the call fails.
+  '''
+  before = REGISTRY.snapshot()
+  result = error = None
+  try:
+    result = fn(*args)
+  except Exception as e:
+    error = e
+  finally:
+    recorded = {}
+    for key, (kind, help, values) in REGISTRY.snapshot().items():
+      _, _, valuesBefore = before.get(key, (kind, help, [0] * len(values)))
+      deltas = [value - valueBefore
+                for value, valueBefore in zip(values, valuesBefore)]
+      if any(deltas):
+        recorded[key] = (kind, help, deltas)
+  return result, error, recorded
+
+
+def mergeCollected(collected, registry=REGISTRY):
+  '''Merges the metrics of a call returned by callCollecting into the given
+  registry, then returns the call's result or raises its exception.
+  '''
+  result, error, recorded = collected
+  registry.merge(recorded)
+  if error is not None:
+    raise error
+  return result
+
+
+class PeriodicLogger():
+  '''Context manager writing the registry's log line to the given stream every
+  given number of seconds, from a background thread, and once more on exit.
+  '''
+  def __init__(self, interval=DEFAULT_LOG_INTERVAL, output=None,
+               registry=REGISTRY):
+    self.interval = interval
+    self.output = output
+    self.registry = registry
+    self.stopped = threading.Event()
+    self.thread = None
+
+  def log(self):
+    print(self.registry.formatLogLine(), file=self.output or sys.stderr,
+          flush=True)
+
+  def _run(self):
+    while not self.stopped.wait(self.interval):
+      self.log()
+
+  def __enter__(self):
+    if self.interval and self.interval > 0:
+      self.thread = threading.Thread(target=self._run, name="metrics-logger",
+                                     daemon=True)
+      self.thread.start()
+    return self
+
+  def __exit__(self, *exception):
+    if self.thread:
+      self.stopped.set()
+      self.thread.join()
+      self.log()
+    return False
@@ -0,0 +1,177 @@
+# Lightweight tracing of where time goes while loading, spinning and saving.
+#   Code marks each phase of its work as a span, and while tracing is enabled,
+#   every span's start and duration is recorded. Recorded spans can be exported
+#   as Chrome trace JSON, viewable as a flame chart in Perfetto
+#   (ui.perfetto.dev) or chrome://tracing.
+#
+# Tracing is disabled by default, in which case a span costs one global lookup
+#   and does nothing. It is enabled by the app's preferences, by the command
+#   line's --trace option, or by setting the AZATHOTH_TRACE environment variable
+#   to the path to export the trace to when the program exits.
+
+import atexit
+from collections import deque
+import functools
+import json
+import os
+import threading
+import time
+
+# Environment variable naming a file to export a trace of the whole run to.
+TRACE_ENV_VAR = "AZATHOTH_TRACE"
+
+# Most spans held at once. The oldest are dropped first, so a long session
+#   keeps its latest activity in bounded memory.
+DEFAULT_MAX_EVENTS = 1000000
+
+# Name of the trace the app saves to its data folder on close, if preferred.
+TRACE_FILENAME = "trace.json"
+
+# Category given to every exported span.
+TRACE_CATEGORY = "azathoth"
+
+# The enabled Tracer, or None while tracing is disabled.
+_tracer = None
+
+
+class _NullSpan():
+  '''Span returned while tracing is disabled, doing nothing at all.'''
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exception):
+    return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span():
+  '''Span recording its duration to a Tracer once exited.'''
+  __slots__ = ("tracer", "name", "args", "start")
+
+  def __init__(self, tracer, name, args):
+    self.tracer = tracer
+    self.name = name
+    self.args = args
+
+  def __enter__(self):
+    self.start = time.perf_counter_ns()
+    return self
+
+  def __exit__(self, *exception):
+    self.tracer.record(self.name, self.start, time.perf_counter_ns(),
+                       self.args)
+    return False
+
+
+class Tracer():
+  '''Records spans from every thread, holding up to the given number at once.
+  Each span is held as a tuple: (name, start ns, end ns, thread id, args).
+  '''
+  def __init__(self, maxEvents=DEFAULT_MAX_EVENTS):
+    self.events = deque(maxlen=maxEvents)
+    self.threadNames = {}
+    self.origin = time.perf_counter_ns()
+
+  def record(self, name, start, end, args=None):
+    '''Records a span with the given name, start and end times from
+    time.perf_counter_ns(), and args, on the current thread.
+    '''
+    threadId = threading.get_ident()
+    if threadId not in self.threadNames:
+      self.threadNames[threadId] = threading.current_thread().name
+    # Appending to a deque is atomic, so threads need no lock.
+    self.events.append((name, start, end, threadId, args))
+
+  def toChromeTrace(self):
+    '''Returns the recorded spans as a Chrome trace, ready to save as JSON.'''
+    pid = os.getpid()
+    traceEvents = [{"name": "process_name", "ph": "M", "pid": pid,
+                    "args": {"name": "Azathoth"}}]
+    traceEvents.extend({"name": "thread_name", "ph": "M", "pid": pid,
+                        "tid": threadId, "args": {"name": threadName}}
+                       for threadId, threadName in
+                       list(self.threadNames.items()))
+    for name, start, end, threadId, args in list(self.events):
+      event = {"name": name, "cat": TRACE_CATEGORY, "ph": "X",
+               "ts": (start - self.origin) / 1000, "dur": (end - start) / 1000,
+               "pid": pid, "tid": threadId}
+      if args:
+        event["args"] = args
+      traceEvents.append(event)
+    return {"traceEvents": traceEvents, "displayTimeUnit": "ms"}
+
+  def export(self, path):
+    '''Saves the recorded spans to the given path as Chrome trace JSON.'''
+    with (open(path, "w")) as output:
+      json.dump(self.toChromeTrace(), output, default=str)
+
+
+def enable(maxEvents=DEFAULT_MAX_EVENTS) -> Tracer:
+  '''Starts recording spans, if not already, returning the Tracer recording
+  them.
+  '''
+  global _tracer
+  if _tracer is None:
+    _tracer = Tracer(maxEvents)
+  return _tracer
+
+
+def disable() -> Tracer|None:
+  '''Stops recording spans, returning the Tracer that recorded them, if any.'''
+  global _tracer
+  tracer, _tracer = _tracer, None
+  return tracer
+
+
+def isEnabled():
+  return _tracer is not None
+
+
+def getTracer() -> Tracer|None:
+  '''Returns the Tracer recording spans, or None if tracing is disabled.'''
+  return _tracer
+
+
+def span(name, **args):
+  '''Returns a context manager recording its body as a span with the given
+  name and args, shown alongside it in trace viewers.
+  '''
+  if _tracer is None:
+    return _NULL_SPAN
+  return _Span(_tracer, name, args)
+
+
+def traced(name):
+  '''Decorator recording each call of a function as a span with the given
+  name.
+  '''
+  def decorator(fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+      if _tracer is None:
+        return fn(*args, **kwargs)
+      with _Span(_tracer, name, None):
+        return fn(*args, **kwargs)
+    return wrapper
+  return decorator
+
+
+def _exportOnExit(path):
+  if _tracer is not None:
+    try:
+      _tracer.export(path)
+    except OSError:
+      pass
+
+
+def enableFromEnvironment():
+  '''Enables tracing if the AZATHOTH_TRACE environment variable names a file,
+  exporting the trace to it when the program exits. Returns whether enabled.
+  '''
+  if not (path := os.environ.get(TRACE_ENV_VAR)):
+    return False
+  enable()
+  atexit.register(_exportOnExit, path)
+  return True
@@ -1,4 +1,5 @@
 from data.upgrades import Progression, Upgrade, Wheel, WeightedChoice
+from diagnostics import tracing
 from file import azathothValidator, yamlReader
 from file.azathothConstants import Keys, PROGRESSION_FIELD_ALIASES, PROGRESSION_MACROS, UpgradeType
 
@@ -101,10 +102,17 @@ def _yamlToWheel(yaml, game=""):
 
 
 
+def azathothYamlToWheel(azathothYaml):
+  '''Validates the given parsed Azathoth YAML and converts it to a Wheel ready
+  for use with a Spinner.
+  '''
+  azathothValidator.validateAzathothYaml(azathothYaml)
+  with tracing.span("build wheel"):
+    return _yamlToWheel(azathothYaml)
+
+
 def azathothToWheel(azathothYamlFilePath):
   '''Opens a YAML file at the given path, parses it, validates contents, and
   converts it to a Wheel ready for use with a Spinner.
   '''
-  azathothYaml = yamlReader.readToYaml(azathothYamlFilePath)
-  azathothValidator.validateAzathothYaml(azathothYaml)
-  return _yamlToWheel(azathothYaml)
\ No newline at end of file
+  return azathothYamlToWheel(yamlReader.readToYaml(azathothYamlFilePath))
\ No newline at end of file
@@ -1,3 +1,4 @@
+from diagnostics import tracing
 from file.azathothConstants import Keys, UpgradeType
 from file.azathothConstants import PROGRESSION_FIELD_ALIASES, PROGRESSION_MACROS
 
@@ -26,7 +27,7 @@ VALID_UPGRADE_KEYS_TO_ALLOWED_TYPES: dict[str, list] = {
 # map of all valid Progression Keys to the type of values permitted for them
 VALID_PROGRESSION_KEYS_TO_ALLOWED_TYPES: dict[str, list] = {
   Keys.STOP_AT: [int],
-  Keys.LIMIT: [int],
+  Keys.SPIN_LIMIT: [int],
   Keys.VALUES: [int|str, list],  # Consider if there are other raw types here.
   Keys.INCREMENT: [int],
 }
@@ -50,7 +51,7 @@ def _validateKeysAndValues(yaml, validKeys):
   for key, value in yaml.items():
     if key not in validKeys:
       raise ValueError(f"YAML contained unexpected key '{key}',"
-                       f" only allows {list(validKeys.Keys())}")
+                       f" only allows {list(validKeys.keys())}")
     if not isinstance(value, tuple(validKeys[key])):
       raise ValueError(f"YAML contained unexpected value {value},"
                        f" must be of type {list(validKeys[key])}")
@@ -77,7 +78,7 @@ def _validateProgression(yaml):
                      f" {Keys.SPIN_LIMIT}, but only one is allowed.")
 
   if Keys.SPIN_LIMIT in yaml and Keys.VALUES in yaml:
-    if len(yaml[Keys.VALUES]) < yaml[Keys.SPIN_LIMIT]:
+    if len(yaml[Keys.VALUES]) > yaml[Keys.SPIN_LIMIT]:
       raise ValueError(f"Progression {yaml} listed more values than its"
                        f" limit of {yaml[Keys.SPIN_LIMIT]} allows.")
 
@@ -150,6 +151,7 @@ def _validateWheel(yaml, game=""):
 
 
 
+@tracing.traced("validate")
 def validateAzathothYaml(yaml):
   '''Performs full validation of the given Azathoth YAML.
 
@@ -0,0 +1,212 @@
+# Bundles a whole multiworld's outputs into a single zip archive. Entries are
+#   streamed into the archive in a single pass as they are written, and a
+#   manifest of their content hashes is appended so that receivers can verify
+#   and extract everything in bulk.
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+import zipfile
+
+# Name of the manifest entry written at the end of every bundle.
+MANIFEST_FILENAME = "manifest.json"
+
+# Mapping of supported compression names to their zipfile compression methods.
+BUNDLE_COMPRESSIONS = {
+  "stored": zipfile.ZIP_STORED,
+  "deflated": zipfile.ZIP_DEFLATED,
+  "bzip2": zipfile.ZIP_BZIP2,
+  "lzma": zipfile.ZIP_LZMA,
+}
+
+# Size of chunks read while verifying or extracting bundle entries.
+CHUNK_SIZE = 1 << 16
+
+
+class ManifestKeys:
+  '''Constants for keys used in bundle manifests.'''
+  AZATHOTH = "azathoth"
+  VERSION = "version"
+  FILES = "files"
+  NAME = "name"
+  SHA256 = "sha256"
+  SIZE = "size"
+
+
+class _HashingWriter(io.RawIOBase):
+  '''Binary stream that hashes and counts everything written through it on
+  its way to the given raw output.
+  '''
+  def __init__(self, output):
+    super().__init__()
+    self.output = output
+    self.hash = hashlib.sha256()
+    self.size = 0
+
+  def writable(self):
+    return True
+
+  def write(self, data):
+    self.hash.update(data)
+    self.size += len(data)
+    return self.output.write(data)
+
+
+class BundleWriter():
+  '''Writes named files into a single zip archive as they are produced,
+  recording their hashes in a manifest written when the bundle is closed.
+
+  Use as a context manager, opening each entry with open() or writeStr(). The
+  archive is written beside the given path and only moved into place once the
+  bundle is closed, so a failed bundle never leaves a partial archive behind.
+  '''
+  def __init__(self, path, compression="deflated", compressLevel=None,
+               version=None):
+    if compression not in BUNDLE_COMPRESSIONS:
+      raise ValueError(f"Unrecognized bundle compression '{compression}',"
+                       f" expected one of {list(BUNDLE_COMPRESSIONS.keys())}")
+    self.path = path
+    self.temporaryPath = f"{path}.tmp"
+    self.version = version
+    self.archive = zipfile.ZipFile(self.temporaryPath, "w",
+                                   compression=BUNDLE_COMPRESSIONS[compression],
+                                   compresslevel=compressLevel)
+    self.manifest = []
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, excType, excValue, traceback):
+    if excType is None:
+      self.close()
+    else:
+      self.discard()
+
+  def open(self, name):
+    '''Returns a context-managed text stream that writes the entry with the
+    given name into the bundle.
+    '''
+    return _BundleEntry(self, name)
+
+  def writeStr(self, name, contents):
+    '''Writes the given string into the bundle as the entry with the given
+    name.
+    '''
+    with (self.open(name)) as output:
+      output.write(contents)
+
+  def close(self):
+    '''Writes the manifest and finishes the bundle.'''
+    manifest = {}
+    if self.version:
+      manifest[ManifestKeys.AZATHOTH] = {ManifestKeys.VERSION: self.version}
+    manifest[ManifestKeys.FILES] = self.manifest
+    try:
+      self.archive.writestr(MANIFEST_FILENAME, json.dumps(manifest, indent=2))
+      self.archive.close()
+    except BaseException:
+      self.discard()
+      raise
+    os.replace(self.temporaryPath, self.path)
+
+  def discard(self):
+    '''Abandons the bundle, deleting everything written so far.'''
+    self.archive.close()
+    if os.path.exists(self.temporaryPath):
+      os.remove(self.temporaryPath)
+
+
+class _BundleEntry():
+  '''Context manager for a single text entry being streamed into a bundle.'''
+  def __init__(self, bundle: BundleWriter, name):
+    self.bundle = bundle
+    self.name = name
+
+  def __enter__(self):
+    if self.name == MANIFEST_FILENAME:
+      raise ValueError(f"Bundle entries may not be named {MANIFEST_FILENAME}.")
+    self.raw = self.bundle.archive.open(self.name, "w")
+    self.hashingWriter = _HashingWriter(self.raw)
+    self.output = io.TextIOWrapper(
+      io.BufferedWriter(self.hashingWriter, CHUNK_SIZE),
+      encoding="utf-8", newline="")
+    return self.output
+
+  def __exit__(self, excType, excValue, traceback):
+    self.output.flush()
+    self.output.detach()
+    self.raw.close()
+    if excType is not None:
+      return
+    self.bundle.manifest.append({
+      ManifestKeys.NAME: self.name,
+      ManifestKeys.SHA256: self.hashingWriter.hash.hexdigest(),
+      ManifestKeys.SIZE: self.hashingWriter.size,
+    })
+
+
+def readManifest(archive: zipfile.ZipFile):
+  '''Returns the list of file entries recorded in the given bundle's manifest.
+  '''
+  try:
+    manifest = json.loads(archive.read(MANIFEST_FILENAME))
+  except KeyError:
+    raise ValueError(f"Bundle {archive.filename} contains no manifest.")
+  return manifest[ManifestKeys.FILES]
+
+
+def _copyVerified(archive: zipfile.ZipFile, entry, output=None):
+  '''Streams the given manifest entry out of the archive, into the given binary
+  output if any, raising ValueError if its contents don't match the manifest.
+  '''
+  fileHash = hashlib.sha256()
+  size = 0
+  with (archive.open(entry[ManifestKeys.NAME])) as input:
+    while (chunk := input.read(CHUNK_SIZE)):
+      fileHash.update(chunk)
+      size += len(chunk)
+      if output:
+        output.write(chunk)
+
+  if (size != entry[ManifestKeys.SIZE]
+      or fileHash.hexdigest() != entry[ManifestKeys.SHA256]):
+    raise ValueError(f"Bundle entry {entry[ManifestKeys.NAME]} does not match"
+                     f" its manifest.")
+
+
+def verifyBundle(path):
+  '''Verifies every file in the bundle at the given path against its manifest,
+  raising ValueError on any mismatch. Returns the names of verified files.
+  '''
+  with (zipfile.ZipFile(path)) as archive:
+    entries = readManifest(archive)
+    for entry in entries:
+      _copyVerified(archive, entry)
+  return [entry[ManifestKeys.NAME] for entry in entries]
+
+
+def extractBundle(path, directory):
+  '''Extracts every file in the bundle at the given path into the given
+  directory, verifying each against the manifest as it is extracted. Returns
+  the paths of extracted files.
+  '''
+  directory = Path(directory).resolve()
+  extractedPaths = []
+  with (zipfile.ZipFile(path)) as archive:
+    for entry in readManifest(archive):
+      # Refuse to write anywhere outside of the target directory.
+      targetPath = (directory / entry[ManifestKeys.NAME]).resolve()
+      if directory not in targetPath.parents:
+        raise ValueError(f"Bundle entry {entry[ManifestKeys.NAME]} would be"
+                         f" extracted outside of {directory}.")
+      os.makedirs(targetPath.parent, exist_ok=True)
+      try:
+        with (open(targetPath, "wb")) as output:
+          _copyVerified(archive, entry, output)
+      except ValueError:
+        targetPath.unlink()
+        raise
+      extractedPaths.append(targetPath)
+  return extractedPaths
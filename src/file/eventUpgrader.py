@@ -0,0 +1,174 @@
+# Upgrader operating directly on PyYAML's event stream. Unlike upgrader, which
+#   builds, copies, and dumps a whole Python object tree per YAML, this passes
+#   parse events straight through to the emitter, only replacing or injecting
+#   the events found at upgraded yamlPaths. Memory use is therefore independent
+#   of the size of the YAML being upgraded.
+#
+# Streaming can't reproduce every way upgrader treats anchors, aliases and
+#   merge keys, which share nodes between several places, nor let a document's
+#   own header take the place of one already written. Whether a YAML can be
+#   streamed is decided in the same single pass that upgrades it: CannotStream
+#   is raised as soon as the stream reaches anything it can't upgrade exactly as
+#   upgrader would, so the caller can discard what was written and fall back.
+
+from file import upgrader
+import yaml as pyyaml
+from yaml.events import (AliasEvent, CollectionEndEvent, CollectionStartEvent,
+                         DocumentStartEvent, MappingEndEvent, MappingStartEvent,
+                         ScalarEvent)
+
+# Shared machinery used to interpret mapping keys as their Python values.
+_RESOLVER = pyyaml.resolver.Resolver()
+_CONSTRUCTOR = pyyaml.constructor.SafeConstructor()
+
+# Sentinel for keys that have no upgrade targeting them.
+_MISSING = object()
+
+# Tag of merge keys, which copy the entries of other mappings into their own.
+_MERGE_TAG = "tag:yaml.org,2002:merge"
+
+
+class CannotStream(ValueError):
+  '''Raised while upgrading a stream of events on reaching anything that can't
+  be upgraded as a stream exactly as upgrader would upgrade it.
+  '''
+
+
+def _toNodeEvents(value):
+  '''Returns the events that represent the given value as a single YAML node.
+  '''
+  # Dump and re-parse so values are quoted and tagged exactly as safe_dump would.
+  return list(pyyaml.parse(pyyaml.safe_dump(value, sort_keys=False)))[2:-2]
+
+
+def _scalarTag(event: ScalarEvent):
+  '''Returns the tag that the given scalar event would load with.'''
+  tag = event.tag
+  if tag is None or tag == "!":
+    tag = _RESOLVER.resolve(pyyaml.ScalarNode, event.value, event.implicit)
+  return tag
+
+
+def _scalarValue(event: ScalarEvent):
+  '''Returns the Python value that the given scalar event would load as.'''
+  tag = _scalarTag(event)
+  constructor = _CONSTRUCTOR.yaml_constructors.get(tag)
+  if not constructor:
+    return event.value
+  return constructor(_CONSTRUCTOR, pyyaml.ScalarNode(tag, event.value))
+
+
+def _nodeEvents(events, firstEvent):
+  '''Yields the given first event of a node and all remaining events in that
+  node, consuming them from the given event iterator.
+  '''
+  yield firstEvent
+  if not isinstance(firstEvent, CollectionStartEvent):
+    return
+
+  depth = 1
+  for event in events:
+    yield event
+    if isinstance(event, CollectionStartEvent):
+      depth += 1
+    elif isinstance(event, CollectionEndEvent):
+      depth -= 1
+      if depth == 0:
+        return
+
+
+def _skipReplacedNode(events, firstEvent, path):
+  '''Consumes and discards the node starting with the given first event, which
+  is being replaced at the given path.
+
+  Raises CannotStream if the node or anything in it is anchored. Later aliases
+  to them would still see the replaced values had upgrader replaced the node.
+  '''
+  for event in _nodeEvents(events, firstEvent):
+    if getattr(event, "anchor", None) is not None:
+      raise CannotStream(f"Target at {path} is anchored and cannot be"
+                         f" upgraded as a stream.")
+
+
+def _upgradeMapping(events, startEvent, targetTree, path, inject=True,
+                    header=None):
+  '''Yields the events of the mapping beginning with the given start event,
+  replacing values targeted by the given target tree. Targets missing from the
+  mapping are injected at its end if inject is set.
+
+  Any given header is written as the mapping's first entries. Raises
+  CannotStream if the mapping has entries of its own named the same, merges
+  in other mappings, or reaches a target through an alias.
+  '''
+  yield startEvent
+  if header:
+    yield from _toNodeEvents(header)[1:-1]
+
+  remainingTargets = dict(targetTree)
+  for keyEvent in events:
+    if isinstance(keyEvent, MappingEndEvent):
+      if inject:
+        for key, target in remainingTargets.items():
+          yield from _toNodeEvents(
+            {key: upgrader.unwrapTargetTree(target)})[1:-1]
+      yield keyEvent
+      return
+
+    # Only scalar keys can be targeted; complex keys pass through unexamined.
+    key = _MISSING
+    if isinstance(keyEvent, ScalarEvent):
+      key = _scalarValue(keyEvent)
+    keyEvents = list(_nodeEvents(events, keyEvent))
+    valueEvent = next(events)
+
+    if header and key in header:
+      raise CannotStream(f"Document already has a header entry {key} and"
+                         f" cannot be upgraded as a stream.")
+    if isinstance(keyEvent, ScalarEvent) and _scalarTag(keyEvent) == _MERGE_TAG:
+      raise CannotStream(f"Mapping at {path} merges in other mappings and"
+                         f" cannot be upgraded as a stream.")
+
+    yield from keyEvents
+    target = _MISSING
+    if key is not _MISSING:
+      target = remainingTargets.pop(key, _MISSING)
+
+    if target is _MISSING:
+      yield from _nodeEvents(events, valueEvent)
+    elif isinstance(target, upgrader.TargetValue):
+      _skipReplacedNode(events, valueEvent, path + [key])
+      yield from _toNodeEvents(target.value)
+    elif isinstance(valueEvent, MappingStartEvent):
+      yield from _upgradeMapping(events, valueEvent, target, path + [key])
+    elif isinstance(valueEvent, AliasEvent):
+      raise CannotStream(f"Target at {path + [key]} is an alias and cannot be"
+                         f" upgraded as a stream.")
+    else:
+      raise ValueError(f"Target at {path + [key]} is not a dictionary and"
+                       f" cannot update.")
+
+
+def toUpgradedEvents(upgradeResults: dict, events, header=None):
+  '''Lazily applies any relevant upgrades in the given upgrade dict to the
+  given stream of YAML parse events, yielding the events of the upgraded YAML.
+
+  Mirrors upgrader.toUpgradedYaml: upgrades only apply to documents that
+  already contain their game. Any given header dict is written at the head of
+  every upgraded document. Raises CannotStream, part way through, on reaching
+  anything that can't be upgraded exactly as upgrader would.
+  '''
+  targetTree = upgrader.toTargetTree(upgradeResults)
+
+  events = iter(events)
+  for event in events:
+    yield event
+    if not isinstance(event, DocumentStartEvent):
+      continue
+
+    # Each document holds exactly one root node.
+    rootEvent = next(events)
+    if isinstance(rootEvent, MappingStartEvent):
+      yield from _upgradeMapping(
+        events, rootEvent, targetTree, [], inject=False, header=header)
+    else:
+      yield from _nodeEvents(events, rootEvent)
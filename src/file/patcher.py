@@ -0,0 +1,157 @@
+# Produces and applies compact patches describing only what upgrades change in
+#   a game YAML, as an alternative to writing out full upgraded copies.
+#
+# Patches follow JSON Patch (RFC 6902) in spirit, but address values by their
+#   yamlPath as a list of keys rather than by JSON Pointer, preserving keys that
+#   aren't strings.
+
+from file import upgrader, writer, yamlReader
+import json
+
+# File extension used for saved patch files.
+PATCH_EXTENSION = ".patch.json"
+
+class PatchKeys:
+  '''Constants for keys used in saved patch files.'''
+  AZATHOTH = "azathoth"
+  VERSION = "version"
+  SOURCE = "source"
+  DOCUMENTS = "documents"
+  OP = "op"
+  PATH = "path"
+  VALUE = "value"
+
+
+class PatchOp:
+  '''Constants for supported patch operations.'''
+  ADD = "add"
+  REPLACE = "replace"
+
+
+def _isSameValue(a, b):
+  '''Returns whether the given values are equal, including their types.'''
+  return type(a) == type(b) and a == b
+
+
+def _diffTargetTree(targetTree, yaml, path, patch):
+  '''Appends operations to the given patch that would update the given YAML
+  to reflect the given upgrade target tree.
+  '''
+  for key, target in targetTree.items():
+    keyPath = path + [key]
+    if key not in yaml:
+      patch.append({PatchKeys.OP: PatchOp.ADD, PatchKeys.PATH: keyPath,
+                    PatchKeys.VALUE: upgrader.unwrapTargetTree(target)})
+    elif isinstance(target, upgrader.TargetValue):
+      if not _isSameValue(yaml[key], target.value):
+        patch.append({PatchKeys.OP: PatchOp.REPLACE, PatchKeys.PATH: keyPath,
+                      PatchKeys.VALUE: target.value})
+    elif isinstance(yaml[key], dict):
+      _diffTargetTree(target, yaml[key], keyPath, patch)
+    else:
+      raise ValueError(f"Target {yaml[key]} at {keyPath} is not a dictionary"
+                       f" and cannot update.")
+
+
+def toPatch(upgradeResults: dict, originalYaml):
+  '''Returns a list of patch operations that would apply any relevant upgrades
+  in the given upgrade dict to the given YAML. Upgrades that would not change
+  the YAML produce no operations.
+  '''
+  targetTree = upgrader.toTargetTree(upgradeResults)
+
+  # As with toUpgradedYaml, only games already in the YAML are upgraded.
+  gameTargetTrees = {game: gameTargetTree
+                     for game, gameTargetTree in targetTree.items()
+                     if game in originalYaml}
+
+  patch = []
+  _diffTargetTree(gameTargetTrees, originalYaml, [], patch)
+  return patch
+
+
+def toPatches(upgradeResults: dict, originalYamls):
+  '''Lazily yields a patch for each of the given YAML documents.'''
+  for originalYaml in originalYamls:
+    yield toPatch(upgradeResults, originalYaml)
+
+
+def applyPatch(patch, yaml):
+  '''Applies the given patch operations to the given YAML in place, then
+  returns it.
+  '''
+  for operation in patch:
+    op = operation[PatchKeys.OP]
+    path = operation[PatchKeys.PATH]
+    if not path:
+      raise ValueError(f"Patch operation {operation} has an empty path.")
+
+    target = yaml
+    for step in path[:-1]:
+      target = target.get(step) if isinstance(target, dict) else None
+    if not isinstance(target, dict):
+      raise ValueError(f"Patch operation {operation} targets a missing or"
+                       f" non-dictionary parent.")
+
+    key = path[-1]
+    if op == PatchOp.REPLACE and key not in target:
+      raise ValueError(f"Patch operation {operation} replaces a missing key.")
+    elif op not in (PatchOp.ADD, PatchOp.REPLACE):
+      raise ValueError(f"Patch operation {operation} is not supported.")
+    target[key] = operation[PatchKeys.VALUE]
+  return yaml
+
+
+def applyPatches(patches, yamls):
+  '''Lazily applies each of the given patches to its corresponding YAML
+  document, yielding each patched document in turn.
+  '''
+  patches, yamls = list(patches), iter(yamls)
+  for patch in patches:
+    yaml = next(yamls, None)
+    if yaml is None:
+      raise ValueError(f"Received {len(patches)} patches, but fewer YAML"
+                       f" documents to apply them to.")
+    yield applyPatch(patch, yaml)
+  if next(yamls, None) is not None:
+    raise ValueError(f"Received {len(patches)} patches, but more YAML"
+                     f" documents to apply them to.")
+
+
+def dumpPatches(patches, output, source="", version=None):
+  '''Writes the given per-document patches to the given text stream as
+  compact JSON, noting the name of the source YAML they apply to.
+  '''
+  contents = {}
+  if version:
+    contents[PatchKeys.AZATHOTH] = {PatchKeys.VERSION: version}
+  contents[PatchKeys.SOURCE] = source
+  contents[PatchKeys.DOCUMENTS] = list(patches)
+  json.dump(contents, output, separators=(",", ":"))
+
+
+def writePatchesToFile(patches, path, source="", version=None):
+  '''Writes the given per-document patches to a compact JSON file at the given
+  path, noting the name of the source YAML they apply to.
+  '''
+  with (open(path, "w")) as output:
+    dumpPatches(patches, output, source=source, version=version)
+
+
+def readPatchesFromFile(path):
+  '''Reads a patch file at the given path, returning its per-document patches
+  and the name of the source YAML they apply to.
+  '''
+  with (open(path)) as input:
+    contents = json.load(input)
+  return contents[PatchKeys.DOCUMENTS], contents.get(PatchKeys.SOURCE, "")
+
+
+def applyPatchFile(patchFilePath, gameYamlFilePath, outputYamlFilePath):
+  '''Applies the patch file at the given path to the game YAML at the given
+  path, streaming each patched document to a new YAML at the output path.
+  '''
+  patches, _ = readPatchesFromFile(patchFilePath)
+  writer.writeYamlsToFile(
+    applyPatches(patches, yamlReader.readToYamls(gameYamlFilePath)),
+    outputYamlFilePath)
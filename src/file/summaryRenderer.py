@@ -0,0 +1,270 @@
+# Rendering engine for summaries of selected upgrades. Upgrade results are
+#   sorted once into a trie of their yamlPaths, which is then rendered in a
+#   single traversal straight into a buffered writer in any supported format.
+
+import csv
+from data.upgrades import Upgrade
+from file import upgrader
+import io
+import json
+
+# Standard indent of two spaces.
+INDENT = "  "
+
+# Keys of the header block identifying the generating version of Azathoth.
+HEADER_BLOCK = "azathoth"
+HEADER_VERSION = "version"
+
+
+class SummaryFormat:
+  '''Constants for supported summary output formats.'''
+  YAML = "yaml"
+  JSON = "json"
+  CSV = "csv"
+  MARKDOWN = "markdown"
+
+
+# Mapping of summary formats to the file extension used when saving them.
+SUMMARY_FORMAT_EXTENSIONS = {
+  SummaryFormat.YAML: "yaml",
+  SummaryFormat.JSON: "json",
+  SummaryFormat.CSV: "csv",
+  SummaryFormat.MARKDOWN: "md",
+}
+
+
+class _SummaryEntry():
+  '''A selected upgrade, its count, and its resulting value.'''
+  __slots__ = ("upgrade", "count", "value")
+
+  def __init__(self, upgrade: Upgrade, count: int):
+    self.upgrade = upgrade
+    self.count = count
+    self.value = upgrader.getValue(upgrade, count)
+
+
+class _SummaryNode():
+  '''Node in a trie of yamlPaths. Each node may hold the upgrade that sets its
+  own value, manual upgrades noted beneath it, and child nodes by path step.
+  '''
+  __slots__ = ("children", "entry", "manualEntries")
+
+  def __init__(self):
+    self.children = {}
+    self.entry = None
+    self.manualEntries = []
+
+
+class SummaryTree():
+  '''Pre-sorted trie of selected upgrades, ready to be rendered in any
+  SummaryFormat any number of times without re-sorting or re-evaluating.
+  '''
+  def __init__(self, upgradeResults: dict):
+    self.root = _SummaryNode()
+
+    # Alphabetize upgrades by their YAML path, ensuring upgrades are grouped.
+    alphaItems = sorted(
+      upgradeResults.items(), key=lambda x: tuple(x[0].yamlPath))
+
+    for upgrade, count in alphaItems:
+      node = self.root
+      for step in upgrade.yamlPath:
+        node = node.children.setdefault(step, _SummaryNode())
+
+      entry = _SummaryEntry(upgrade, count)
+
+      # Manual upgrades don't conform to the tree-like patterns we assume for
+      #   yamlPath, and are instead noted beneath their game.
+      if upgrade.type == Upgrade.Type.MANUAL:
+        node.manualEntries.append(entry)
+      elif node.entry is None:
+        node.entry = entry
+
+
+  def render(self, output, format=SummaryFormat.YAML, version=None):
+    '''Renders this summary in the given format to the given text stream.'''
+    renderer = _RENDERERS_BY_FORMAT.get(format)
+    if not renderer:
+      raise ValueError(f"Unrecognized summary format '{format}', expected one"
+                       f" of {list(_RENDERERS_BY_FORMAT.keys())}")
+
+    renderer = renderer(output.write)
+    renderer.start(version)
+    for step, child in self.root.children.items():
+      self._renderNode(renderer, step, child, [])
+    renderer.end()
+
+
+  def _renderNode(self, renderer, step, node, path):
+    '''Renders the given node and all nodes beneath it.'''
+    path.append(step)
+    renderer.enter(path, node.entry)
+    for entry in node.manualEntries:
+      renderer.manual(path, entry)
+    for childStep, child in node.children.items():
+      self._renderNode(renderer, childStep, child, path)
+    renderer.exit(path, node.entry)
+    path.pop()
+
+
+
+class _Renderer():
+  '''Base renderer, receiving callbacks from a single SummaryTree traversal.
+
+  Subclasses write their format through the given write function.
+  '''
+  def __init__(self, write):
+    self.write = write
+
+  def start(self, version):
+    '''Called once before any nodes are rendered.'''
+
+  def enter(self, path, entry):
+    '''Called on reaching the node at the given path, before its children.'''
+
+  def manual(self, path, entry):
+    '''Called for each manual upgrade noted beneath the node at the path.'''
+
+  def exit(self, path, entry):
+    '''Called on leaving the node at the given path, after its children.'''
+
+  def end(self):
+    '''Called once after all nodes are rendered.'''
+
+
+class _YamlRenderer(_Renderer):
+  '''Renders the summary as YAML, with manual upgrades as comments.'''
+
+  def start(self, version):
+    if version:
+      self.write(f"# Generated by Azathoth {version}\n")
+
+  def enter(self, path, entry):
+    indent = INDENT * (len(path) - 1)
+    if entry:
+      self.write(f"{indent}{path[-1]}: {entry.value}\n")
+    else:
+      self.write(f"{indent}{path[-1]}:\n")
+
+  def manual(self, path, entry):
+    indent = INDENT * len(path)
+    self.write(f"{indent}# MANUAL - {entry.upgrade}: {entry.value}\n")
+
+
+class _JsonRenderer(_Renderer):
+  '''Renders the summary as nested JSON objects. A path holding a value is
+  rendered with its value alone.
+  '''
+
+  def __init__(self, write):
+    super().__init__(write)
+    # Whether each currently open object has yet to receive a member.
+    self.isFirstMember = []
+
+  def _writeKey(self, key, depth):
+    '''Writes the key of a new member in the innermost open object.'''
+    separator = "\n" if self.isFirstMember[-1] else ",\n"
+    self.isFirstMember[-1] = False
+    self.write(f"{separator}{INDENT * depth}{json.dumps(str(key))}: ")
+
+  def start(self, version):
+    self.write("{")
+    self.isFirstMember.append(True)
+    if version:
+      self._writeKey(HEADER_BLOCK, 1)
+      self.write(json.dumps({HEADER_VERSION: version}))
+
+  def enter(self, path, entry):
+    if len(self.isFirstMember) < len(path):
+      return    # Beneath a value, so already rendered.
+    self._writeKey(path[-1], len(path))
+    if entry:
+      self.write(json.dumps(entry.value))
+    else:
+      self.write("{")
+      self.isFirstMember.append(True)
+
+  def manual(self, path, entry):
+    if len(self.isFirstMember) <= len(path):
+      return
+    self._writeKey(f"MANUAL - {entry.upgrade}", len(path) + 1)
+    self.write(json.dumps(entry.value))
+
+  def exit(self, path, entry):
+    if entry or len(self.isFirstMember) <= len(path):
+      return
+    isEmpty = self.isFirstMember.pop()
+    self.write("}" if isEmpty else f"\n{INDENT * len(path)}}}")
+
+  def end(self):
+    isEmpty = self.isFirstMember.pop()
+    self.write("}\n" if isEmpty else "\n}\n")
+
+
+class _CsvRenderer(_Renderer):
+  '''Renders the summary as CSV, one row per selected upgrade.'''
+
+  def __init__(self, write):
+    super().__init__(write)
+    self.csvWriter = csv.writer(self, lineterminator="\n")
+
+  def start(self, version):
+    self.csvWriter.writerow(["game", "path", "upgrade", "type", "count", "value"])
+
+  def _writeRow(self, path, entry):
+    self.csvWriter.writerow([
+      path[0], "/".join(str(step) for step in path[1:]), entry.upgrade.name,
+      entry.upgrade.type.name.lower(), entry.count, entry.value])
+
+  def enter(self, path, entry):
+    if entry:
+      self._writeRow(path, entry)
+
+  def manual(self, path, entry):
+    self._writeRow(path, entry)
+
+
+class _MarkdownRenderer(_Renderer):
+  '''Renders the summary as Markdown, with one table per game.'''
+
+  @staticmethod
+  def _cell(value):
+    '''Returns the given value escaped for use in a table cell.'''
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+  def _writeRow(self, path, entry):
+    setting = "/".join(self._cell(step) for step in path[1:])
+    self.write(f"| {self._cell(entry.upgrade)} | {setting or '_manual_'}"
+               f" | {entry.count} | {self._cell(entry.value)} |\n")
+
+  def start(self, version):
+    self.write("# Azathoth Summary\n")
+    if version:
+      self.write(f"\n_Generated by Azathoth {version}_\n")
+
+  def enter(self, path, entry):
+    if len(path) == 1:
+      self.write(f"\n## {self._cell(path[0])}\n\n"
+                 "| Upgrade | Setting | Count | Value |\n"
+                 "| --- | --- | --- | --- |\n")
+    if entry:
+      self._writeRow(path, entry)
+
+  def manual(self, path, entry):
+    self._writeRow(path, entry)
+
+
+_RENDERERS_BY_FORMAT = {
+  SummaryFormat.YAML: _YamlRenderer,
+  SummaryFormat.JSON: _JsonRenderer,
+  SummaryFormat.CSV: _CsvRenderer,
+  SummaryFormat.MARKDOWN: _MarkdownRenderer,
+}
+
+
+def renderSummaryStr(upgradeResults: dict, format=SummaryFormat.YAML,
+                     version=None):
+  '''Returns a summary of the given upgrade results in the given format.'''
+  output = io.StringIO()
+  SummaryTree(upgradeResults).render(output, format, version=version)
+  return output.getvalue()
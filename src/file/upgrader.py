@@ -1,14 +1,6 @@
 import collections.abc
 from data.upgrades import *
-import yaml as pyyaml
-
-# Standard indent of two spaces.
-INDENT = "  "
-
-
-def _indent(level):
-  '''Produces an indent of the given level, based on the constant INDENT.'''
-  return ''.join([INDENT for _ in range(level)])
+from diagnostics import tracing
 
 
 def getValue(upgrade: Upgrade, num: int):
@@ -64,55 +56,10 @@ def toSummaryYamlStr(upgradeResults: dict, version=None):
   '''Constructs and returns the contents of a summary yaml that describes the
   selected upgrades.
   '''
-
-  output = ""
-
-  # Add header.
-  if version:
-    output += f"# Generated by Azathoth {version}\n"
-
-  # Alphabetize upgrades by their YAML path, ensuring upgrades are grouped.
-  alphaItems = sorted(upgradeResults.items(), key=lambda x: tuple(x[0].yamlPath))
-
-  lastPath = []    # Track the path you're on.
-  for upgrade, count in alphaItems:
-    currentPath = upgrade.yamlPath
-
-    # Manual upgrades receive special treatment because they don't conform to the
-    #   tree-like patterns we assume for yamlPath.
-    # We can assume that they contain a yamlPath of just their game, but they
-    #   should otherwise be written as indented comments so the YAML at least
-    #   mentions them for later reference.
-    if upgrade.type == Upgrade.Type.MANUAL:
-      gameTitle = currentPath[0]
-
-      # Start the game block if you're not already in it.
-      if not lastPath or lastPath[0] != gameTitle:
-        output += f"{gameTitle}:\n"
-
-      # Then write the upgrade as a comment.
-      output += f"{_indent(1)}# MANUAL - {upgrade}: {getValue(upgrade, count)}\n"
-
-    else:
-
-      onTheSamePath = True
-      for i, step in enumerate(currentPath):
-        if onTheSamePath and i < len(lastPath) and step == lastPath[i]:
-          continue
-        else:
-          onTheSamePath = False
-
-        # And middle steps should just state themselves.
-        if i < len(currentPath) - 1:
-          output += f"{_indent(i)}{step}:\n"
-
-        # Final steps give a value.
-        else:
-          output += f"{_indent(i)}{step}: {getValue(upgrade, count)}\n"
-
-    lastPath = currentPath
-
-  return output
+  # Imported here, as the summary renderer itself depends on this module.
+  from file import summaryRenderer
+  return summaryRenderer.renderSummaryStr(
+    upgradeResults, summaryRenderer.SummaryFormat.YAML, version=version)
 
 
 def _getValueAtPath(yamlPath, yaml):
@@ -158,6 +105,38 @@ def _deepUpdate(target, update):
 
 
 
+# Upgrade target trees, also used by the patcher and the streaming event
+#   upgrader to write the same values as toUpgradedYaml.
+class TargetValue():
+  '''Leaf of an upgrade target tree, holding the value to write at its path.
+
+  Deliberately not a Mapping, so that _deepUpdate treats it as a leaf.
+  '''
+  def __init__(self, value):
+    self.value = value
+
+
+def toTargetTree(upgradeResults: dict):
+  '''Returns a nested dict of every yamlPath targeted by the given upgrade
+  results, with TargetValues at its leaves describing the values to write.
+  '''
+  targetTree = {}
+  for upgrade, count in upgradeResults.items():
+    if upgrade.type == Upgrade.Type.MANUAL:
+      continue
+    newValue = TargetValue(getValue(upgrade, count))
+    _deepUpdate(targetTree, _toNestedDict(upgrade.yamlPath, newValue))
+  return targetTree
+
+
+def unwrapTargetTree(targetTree):
+  '''Returns a copy of the given target tree as plain values.'''
+  if isinstance(targetTree, TargetValue):
+    return targetTree.value
+  return {key: unwrapTargetTree(value) for key, value in targetTree.items()}
+
+
+
 def _applyUpgradeToYaml(upgrade, count, yaml):
   '''Updates the given YAML to reflect the given upgrade when it has been
   selected the given times. Updates YAML to include the indicated fields,
@@ -175,16 +154,28 @@ def toUpgradedYaml(upgradeResults: dict, originalYaml):
   '''
 
   # Make a copy of the given yaml to update.
-  yaml = pyyaml.safe_load(pyyaml.safe_dump(originalYaml, sort_keys=False))
+  # Imported here, keeping PyYAML off the import path of upgrade evaluation.
+  import yaml as pyyaml
+  with tracing.span("copy"):
+    yaml = pyyaml.safe_load(pyyaml.safe_dump(originalYaml, sort_keys=False))
   
-  for upgrade, count in upgradeResults.items():
-    game = upgrade.yamlPath[0]
-    if game not in yaml:
-      continue
+  with tracing.span("apply"):
+    for upgrade, count in upgradeResults.items():
+      game = upgrade.yamlPath[0]
+      if game not in yaml:
+        continue
 
-    if upgrade.type == Upgrade.Type.MANUAL:
-      continue
+      if upgrade.type == Upgrade.Type.MANUAL:
+        continue
 
-    _applyUpgradeToYaml(upgrade, count, yaml)
+      _applyUpgradeToYaml(upgrade, count, yaml)
 
   return yaml
+
+
+def toUpgradedYamls(upgradeResults: dict, originalYamls):
+  '''Lazily applies any relevant upgrades in the given upgrade dict to each of
+  the given YAML documents, yielding each upgraded copy as it is produced.
+  '''
+  for originalYaml in originalYamls:
+    yield toUpgradedYaml(upgradeResults, originalYaml)
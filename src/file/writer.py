@@ -1,14 +1,64 @@
+from diagnostics import metrics, tracing
 import yaml as pyyaml
 
 def writeYamlToFile(yaml, path):
   '''Writes the given YAML object to a file at the given path.'''
+  with tracing.span("dump"):
+    contents = pyyaml.safe_dump(yaml, sort_keys=False)
+  metrics.YAMLS_WRITTEN.inc()
+  with tracing.span("write", path=str(path)):
+    with (open(path, "w")) as output:
+        output.write(contents)
+
+def _countDocuments(yamls):
+  '''Yields each of the given YAML objects, counting each as written.'''
+  for yaml in yamls:
+    metrics.YAMLS_WRITTEN.inc()
+    yield yaml
+
+def _countDocumentEvents(events):
+  '''Yields each of the given YAML events, counting each document as written.
+  '''
+  for event in events:
+    if isinstance(event, pyyaml.DocumentEndEvent):
+      metrics.YAMLS_WRITTEN.inc()
+    yield event
+
+def dumpYamls(yamls, output):
+  '''Writes each of the given YAML objects to the given text stream as its own
+  `---`-separated document. Documents are written as they are produced, so the
+  given iterable may be lazily generated.
+  '''
+  with tracing.span("dump"):
+    pyyaml.safe_dump_all(_countDocuments(yamls), output, sort_keys=False)
+
+def writeYamlsToFile(yamls, path):
+  '''Writes each of the given YAML objects to a file at the given path as its
+  own `---`-separated document. Documents are written as they are produced, so
+  the given iterable may be lazily generated.
+  '''
+  with (open(path, "w")) as output:
+      dumpYamls(yamls, output)
+
+def emitEvents(events, output):
+  '''Emits the given stream of YAML events to the given text stream as they are
+  produced.
+  '''
+  with tracing.span("dump"):
+    pyyaml.emit(_countDocumentEvents(events), output)
+
+def writeEventsToFile(events, path):
+  '''Emits the given stream of YAML events to a file at the given path as they
+  are produced.
+  '''
   with (open(path, "w")) as output:
-      output.write(pyyaml.safe_dump(yaml, sort_keys=False))
+      emitEvents(events, output)
 
 def writeToFile(contents, path):
    '''Writes the given string to a file at the given path.
    
    Useful for constructed YAML contents (e.g. with comments).
    '''
-   with(open(path, "w")) as output:
-      output.write(contents)
+   with tracing.span("write", path=str(path)):
+      with(open(path, "w")) as output:
+         output.write(contents)
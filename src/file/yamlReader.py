@@ -1,6 +1,11 @@
+from diagnostics import metrics, tracing
+import io
 import re
 import yaml as pyyaml
 
+# Number of leading characters inspected when sanitizing a streamed file.
+SANITIZE_HEAD_LENGTH = len("\xEF\xBB\xBF")
+
 
 def _sanitize(fileContents):
   '''Returns copy of the given file contents with troublesome contents removed.
@@ -11,10 +16,53 @@ def _sanitize(fileContents):
   return re.sub("^\xEF\xBB\xBF", "", fileContents)
 
 
+class _SanitizedStream():
+  '''Read-only wrapper around a text stream that sanitizes the head of the
+  stream as it is read. Allows documents to be parsed one at a time without
+  first reading the entire file into memory.
+  '''
+  def __init__(self, input):
+    self.input = input
+    self.name = getattr(input, "name", "<file>")
+    self.head = _sanitize(input.read(SANITIZE_HEAD_LENGTH))
+
+  def read(self, size=-1):
+    '''Reads up to the given number of characters, or all if negative.'''
+    head, self.head = self.head, ""
+    if size is None or size < 0:
+      contents = head + self.input.read()
+    else:
+      contents = head + self.input.read(max(size - len(head), 0))
+    metrics.CHARACTERS_READ.inc(len(contents))
+    return contents
+
+
 def _readToYamlFromInput(input):
   '''Reads in a written YAML file contents are returns it as a YAML object.'''
-  sanitizedInput = _sanitize(input)
-  return pyyaml.safe_load(sanitizedInput)
+  with tracing.span("sanitize"):
+    sanitizedInput = _sanitize(input)
+  with tracing.span("parse"):
+    yaml = pyyaml.safe_load(sanitizedInput)
+  metrics.CHARACTERS_READ.inc(len(sanitizedInput))
+  if yaml is not None:
+    metrics.YAMLS_READ.inc()
+  return yaml
+
+
+def _readToYamlsFromInput(input):
+  '''Lazily reads each document in the given YAML stream, yielding each one as
+  a YAML object as it is parsed. Empty documents are skipped.
+  '''
+  documents = pyyaml.safe_load_all(_SanitizedStream(input))
+  while True:
+    # Traced a document at a time, never spanning time spent by the caller.
+    with tracing.span("parse"):
+      document = next(documents, StopIteration)
+    if document is StopIteration:
+      return
+    if document is not None:
+      metrics.YAMLS_READ.inc()
+      yield document
 
 
 def readToYaml(inputYamlFileName):
@@ -22,5 +70,39 @@ def readToYaml(inputYamlFileName):
   object.
   '''
   
+  with tracing.span("read", path=str(inputYamlFileName)):
+    with (open(inputYamlFileName)) as input:
+      contents = input.read()
+  return _readToYamlFromInput(contents)
+
+
+def readToYamls(inputYamlFileName):
+  '''Reads in a YAML file at the given file address that may contain several
+  `---`-separated documents, yielding each document as a YAML object in turn.
+
+  Documents are streamed from the file, so only one is held in memory at once.
+  '''
+
+  with (open(inputYamlFileName)) as input:
+    yield from _readToYamlsFromInput(input)
+
+
+def readToYamlFromString(contents):
+  '''Parses the given YAML file contents and returns it as a YAML object.'''
+  return _readToYamlFromInput(contents)
+
+
+def readToYamlsFromString(contents):
+  '''Parses every document in the given YAML file contents, returning a list
+  of them as YAML objects. Empty documents are skipped.
+  '''
+  return list(_readToYamlsFromInput(io.StringIO(contents)))
+
+
+def readToEvents(inputYamlFileName):
+  '''Reads in a YAML file at the given file address, yielding its YAML parse
+  events one at a time without ever constructing the documents they describe.
+  '''
+
   with (open(inputYamlFileName)) as input:
-    return _readToYamlFromInput(input.read())
+    yield from pyyaml.parse(_SanitizedStream(input))
@@ -1,4 +1,6 @@
 from data.preferences import Fields as PrefFields
+from file.bundler import BUNDLE_COMPRESSIONS
+from file.summaryRenderer import SUMMARY_FORMAT_EXTENSIONS
 from enum import Enum
 from gui import resources
 from pathlib import Path
@@ -16,11 +18,14 @@ class EditablePreference():
     BOOLEAN = 1
     FILEPATH = 2
     FILEPATH_LIST = 3
+    CHOICE = 4
 
-  def __init__(self, title, prefType: Type, explanation, initialDir=None):
+  def __init__(self, title, prefType: Type, explanation, initialDir=None,
+               choices=None):
     self.title = title
     self.prefType = prefType
     self.explanation = explanation
+    self.choices = choices or []
 
 EDITABLES_BY_FIELD = {
   PrefFields.ON_START_GAME_YAMLS: EditablePreference(
@@ -55,6 +60,90 @@ EDITABLES_BY_FIELD = {
     EditablePreference.Type.BOOLEAN,
     "If enabled, Azathoth no longer blinks to confirm successful file saves."
   ),
+
+  PrefFields.STREAM_UPGRADES: EditablePreference(
+    "Stream Upgrades",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, upgraded YAMLs are written by streaming directly from the"\
+    " original game YAML files instead of copying them in memory. Uses far less"\
+    " memory for very large game YAMLs, but does not preserve comments."
+  ),
+
+  PrefFields.SUMMARY_FORMAT: EditablePreference(
+    "Summary Format",
+    EditablePreference.Type.CHOICE,
+    "Format of the summary file written alongside upgraded YAMLs when saving."\
+    " YAML matches the upgraded YAMLs' layout, while JSON, CSV, and Markdown"\
+    " are easier to share or feed into other tools.",
+    choices=list(SUMMARY_FORMAT_EXTENSIONS.keys())
+  ),
+
+  PrefFields.SAVE_AS_PATCHES: EditablePreference(
+    "Save Upgrades as Patches",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, saving writes a compact patch file for each game YAML that"\
+    " lists only the settings changed by your upgrades, instead of a full"\
+    " upgraded copy of the YAML."
+  ),
+
+  PrefFields.SAVE_AS_BUNDLE: EditablePreference(
+    "Save as Bundle",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, saving writes every upgraded YAML and the summary into a"\
+    " single zip archive, along with a manifest of content hashes that lets"\
+    " the receiving side verify everything arrived intact."
+  ),
+
+  PrefFields.BUNDLE_COMPRESSION: EditablePreference(
+    "Bundle Compression",
+    EditablePreference.Type.CHOICE,
+    "Compression used when saving as a bundle. 'stored' is fastest, while"\
+    " 'lzma' produces the smallest archives.",
+    choices=list(BUNDLE_COMPRESSIONS.keys())
+  ),
+
+  PrefFields.RECORD_HISTORY: EditablePreference(
+    "Record History",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, every spin and every save is recorded to a history database"\
+    " in Azathoth's application data folder, so past results can be looked up"\
+    " after the chooser is cleared."
+  ),
+
+  PrefFields.RESTORE_LAST_SESSION: EditablePreference(
+    "Restore Last Session",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, Azathoth reopens the Wheel and Game YAMLs you last had loaded"\
+    " and restores your selected upgrades when the program opens, instead of"\
+    " loading the default Wheel and Game YAMLs."
+  ),
+
+  PrefFields.TRACE_SESSIONS: EditablePreference(
+    "Trace Sessions",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, Azathoth times each step of loading, spinning and saving, and"\
+    " saves the timings as trace.json in its application data folder on close."\
+    " Open the trace in Perfetto (ui.perfetto.dev) to see where time went."\
+    " Takes effect the next time Azathoth opens."
+  ),
+
+  PrefFields.PROFILE_MEMORY: EditablePreference(
+    "Profile Memory",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, Azathoth tracks the memory used by loading, applying and"\
+    " saving upgrades, and saves a report of where it went as"\
+    " memory-report.txt in its application data folder on close. Slows"\
+    " Azathoth down considerably. Takes effect the next time Azathoth opens."
+  ),
+
+  PrefFields.SERVE_EVENT_FEED: EditablePreference(
+    "Serve Event Feed",
+    EditablePreference.Type.BOOLEAN,
+    "If enabled, Azathoth streams every spin and change of selected upgrades"\
+    " to stream overlays, at http://127.0.0.1:8357/events. Overlays hosted on"\
+    " web pages must have their origins listed under event_feed_origins in"\
+    " preferences.yaml. Takes effect the next time Azathoth opens."
+  ),
 }
 
 class PreferencesEditor(tk.Toplevel):
@@ -94,6 +183,8 @@ class PreferencesEditor(tk.Toplevel):
           return Path(rawValue).name
         case EditablePreference.Type.FILEPATH_LIST:
           return '\n'.join([Path(path).name for path in rawValue])
+        case EditablePreference.Type.CHOICE:
+          return str(rawValue)
         case EditablePreference.Type.UNSPECIFIED:
           raise ValueError(f"Cannot display value for unrecognized preference"
                           f" type {pref.prefType}")
@@ -201,6 +292,17 @@ class PreferencesEditor(tk.Toplevel):
     return tk.Checkbutton(parent, variable=iVar, command=updatePref)
 
 
+  def createChoiceMenu(self, parent, field, choices):
+    '''Creates and returns a drop-down menu selecting between the given choices
+    for the preference with the given field.
+    '''
+    sVar = tk.StringVar(parent, value=self.preferences.get(field))
+
+    def updatePref(newValue):
+      self.preferences.set(field, newValue)
+    return tk.OptionMenu(parent, sVar, *choices, command=updatePref)
+
+
   def toExplainer(self, parent, prefName, explanation):
     def explain():
       '''Pops up a message box displaying the given explanation.'''
@@ -228,7 +330,8 @@ class PreferencesEditor(tk.Toplevel):
 
 
   def createPrefWidgets(self, field, layout) -> tuple[
-      tk.Label, tk.Button|tk.Checkbutton, tk.Label|None, tk.Button]:
+      tk.Label, tk.Button|tk.Checkbutton|tk.OptionMenu, tk.Label|None,
+      tk.Button]:
     '''Creates, registers, and returns a pack of GUI widgets representing the
     given editable preference. These are:
       - The title of the preference
@@ -254,6 +357,9 @@ class PreferencesEditor(tk.Toplevel):
       case EditablePreference.Type.BOOLEAN:
         setButton = self.createCheckbox(layout, field)
         displayValue = None   # Checkboxes don't need a display value.
+      case EditablePreference.Type.CHOICE:
+        setButton = self.createChoiceMenu(layout, field, editable.choices)
+        displayValue = None   # Menus display their own value.
       case EditablePreference.Type.FILEPATH:
         setButton = self.createFilepathButton(
           layout, field, initialDir=self.getInitialDir(field))
@@ -0,0 +1,48 @@
+# Records how long each step of startup takes, measured from when this module
+#   is first imported. The report is written to stderr once startup finishes if
+#   the AZATHOTH_STARTUP_REPORT environment variable is set.
+
+import os
+import sys
+import time
+
+# Environment variable enabling the startup timing report.
+REPORT_ENV_VAR = "AZATHOTH_STARTUP_REPORT"
+
+_startTime = time.perf_counter()
+
+# List of tuples: (step, time at which the step finished).
+_marks = []
+_finished = False
+
+
+def mark(step):
+  '''Records that the given step of startup has just finished.'''
+  if not _finished:
+    _marks.append((step, time.perf_counter()))
+
+
+def formatReport():
+  '''Returns a report of the time taken by each recorded step, along with the
+  total time elapsed at the end of each.
+  '''
+  lines = ["Azathoth startup timing:"]
+  lastTime = _startTime
+  for step, markTime in _marks:
+    lines.append(f"  {(markTime - _startTime) * 1000:8.1f} ms"
+                 f"  (+{(markTime - lastTime) * 1000:.1f} ms)  {step}")
+    lastTime = markTime
+  return "\n".join(lines)
+
+
+def finish(step):
+  '''Records the final step of startup, then reports if enabled. Later calls
+  have no effect.
+  '''
+  global _finished
+  if _finished:
+    return
+  mark(step)
+  _finished = True
+  if os.environ.get(REPORT_ENV_VAR):
+    print(formatReport(), file=sys.stderr)
@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+import queue
+import threading
+
+# Milliseconds between polls for messages from running tasks.
+POLL_INTERVAL_MS = 50
+
+# Default number of worker threads running tasks.
+DEFAULT_MAX_WORKERS = 2
+
+
+class TaskCancelled(Exception):
+  """Raised within a task once it has been cancelled."""
+
+
+class Task():
+  """Handle to a job submitted to a TaskRunner.
+
+  The job itself receives its Task, through which it reports progress and
+  checks whether it has been cancelled. Callbacks given to the Task are always
+  called on the Tk main thread.
+  """
+  def __init__(self, runner, title, job, onDone, onError, onCancelled):
+    self.runner = runner
+    self.title = title
+    self.job = job
+    self.onDone = onDone
+    self.onError = onError
+    self.onCancelled = onCancelled
+    self.cancelEvent = threading.Event()
+
+    # Latest progress reported, as a fraction in [0, 1] or None if unknown.
+    self.fraction = None
+    self.message = ""
+
+  def cancel(self):
+    """Requests cancellation. The job stops at its next cancellation check."""
+    self.cancelEvent.set()
+
+  def isCancelled(self):
+    """Returns whether cancellation has been requested."""
+    return self.cancelEvent.is_set()
+
+  def checkCancelled(self):
+    """Raises TaskCancelled if cancellation has been requested. Jobs should call
+    this between units of work.
+    """
+    if self.cancelEvent.is_set():
+      raise TaskCancelled()
+
+  def progress(self, fraction=None, message=""):
+    """Reports progress from within the job, as a fraction in [0, 1] or None
+    if unknown, along with a message describing the current step. Doubles as a
+    cancellation check.
+    """
+    self.runner.messages.put((self.runner._onProgress, self, fraction, message))
+    self.checkCancelled()
+
+
+class TaskRunner():
+  """Runs jobs on worker threads, keeping the Tk main loop responsive.
+
+  Progress and results are streamed back through a queue that is polled with
+  after(), so every callback runs on the main thread where Tk is safe to use.
+  """
+  def __init__(self, root, maxWorkers=DEFAULT_MAX_WORKERS, onProgress=None,
+               onBusy=None, onIdle=None):
+    self.root = root
+    self.executor = ThreadPoolExecutor(max_workers=maxWorkers,
+                                       thread_name_prefix="azathoth")
+    self.messages = queue.SimpleQueue()
+    self.tasks = []
+    self.pollId = None
+
+    # Called on the main thread as (task) whenever any task reports progress.
+    self.onProgressCallback = onProgress
+    # Called on the main thread whenever a task starts while none are running.
+    self.onBusyCallback = onBusy
+    # Called on the main thread whenever the last running task finishes.
+    self.onIdleCallback = onIdle
+
+  def isBusy(self):
+    """Returns whether any tasks are still running."""
+    return bool(self.tasks)
+
+  def submit(self, title, job, onDone=None, onError=None, onCancelled=None):
+    """Submits the given job to run on a worker thread, returning its Task.
+
+    The job is called with its Task and its return value passed to onDone. If
+    it raises, the exception is passed to onError instead, as is any exception
+    raised by onDone itself. If cancelled, onCancelled is called.
+    """
+    task = Task(self, title, job, onDone, onError, onCancelled)
+    self.tasks.append(task)
+    if len(self.tasks) == 1 and self.onBusyCallback:
+      self.onBusyCallback()
+    self.executor.submit(self._run, task)
+    self._onProgress(task, None, title)
+
+    if self.pollId is None:
+      self.pollId = self.root.after(POLL_INTERVAL_MS, self._poll)
+    return task
+
+  def cancelAll(self):
+    """Requests cancellation of every running task."""
+    for task in self.tasks:
+      task.cancel()
+
+  def shutdown(self):
+    """Cancels every running task and stops polling for their results."""
+    self.cancelAll()
+    if self.pollId is not None:
+      self.root.after_cancel(self.pollId)
+      self.pollId = None
+    self.executor.shutdown(wait=False, cancel_futures=True)
+
+  def _run(self, task: Task):
+    """Runs the given task on a worker thread, queueing its outcome. A job that
+    returns has finished its work, so its result is delivered even if
+    cancellation was requested after its last check.
+    """
+    try:
+      task.checkCancelled()
+      result = task.job(task)
+      self.messages.put((self._onDone, task, result))
+    except TaskCancelled:
+      self.messages.put((self._onCancelled, task))
+    except Exception as e:
+      self.messages.put((self._onError, task, e))
+
+  def _poll(self):
+    """Handles every message queued by tasks, on the main thread."""
+    self.pollId = None
+    try:
+      while True:
+        try:
+          handler, *args = self.messages.get_nowait()
+        except queue.Empty:
+          break
+        handler(*args)
+    finally:
+      if self.tasks or not self.messages.empty():
+        self.pollId = self.root.after(POLL_INTERVAL_MS, self._poll)
+
+  def _finish(self, task: Task):
+    """Forgets the given finished task, signalling if none remain."""
+    if task in self.tasks:
+      self.tasks.remove(task)
+    if not self.tasks and self.onIdleCallback:
+      self.onIdleCallback()
+
+  def _onProgress(self, task: Task, fraction, message):
+    if task not in self.tasks:
+      return
+    task.fraction = fraction
+    task.message = message
+    if self.onProgressCallback:
+      self.onProgressCallback(task)
+
+  def _onDone(self, task: Task, result):
+    self._finish(task)
+    try:
+      if task.onDone:
+        task.onDone(result)
+    except Exception as e:
+      if not task.onError:
+        raise
+      task.onError(e)
+
+  def _onCancelled(self, task: Task):
+    self._finish(task)
+    if task.onCancelled:
+      task.onCancelled()
+
+  def _onError(self, task: Task, error):
+    self._finish(task)
+    if task.onError:
+      task.onError(error)
+    else:
+      raise error
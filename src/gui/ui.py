@@ -1,17 +1,18 @@
 from data.preferences import Preferences, Fields as PrefFields
+from data.preferences import getAzathothDataFilePath
+from data.undoStack import UndoStack
 from data.upgrades import Wheel
-from file import azathothReader, upgrader, writer, yamlReader
-from gui import resources
-from gui.preferencesEditor import PreferencesEditor
-from gui.upgradeChooser import UpgradeChooser
-import os
+from diagnostics import tracing
+import functools
+from gui import resources, startupTimer
+from gui.taskRunner import TaskRunner
 from pathlib import Path
-from spin import spinner
 import tkinter as tk
-from tkinter import filedialog, messagebox, PhotoImage
+from tkinter import filedialog, messagebox, PhotoImage, ttk
 
-# Prefix prepended to output upgraded YAML files. Prevents overwrite of inputs.
-UPGRADE_PREFIX = "upgraded-"
+# NOTE: Modules needed only once files are loaded, e.g. the headless core and
+#       PyYAML, the spinner, and the chooser, are imported where they are used
+#       so that the window can be shown as early as possible.
 
 # Fake upper limit to apply to spinbox to= values.
 INF_LIMIT = 999999999999
@@ -32,6 +33,9 @@ class keys():
   spinButton = "spinButton"
   clearButton = "clearButton"
   saveButton = "saveButton"
+  undoButton = "undoButton"
+  redoButton = "redoButton"
+  cancelButton = "cancelButton"
 
   bg = "backgroundImage"
   b1 = "backgroundBlink1Image"
@@ -41,9 +45,6 @@ class keys():
   warn = "warnImage"
   no = "badImage"
 
-  azathothBlock = "azathoth"
-  azathothVersion = "version"
-
 
 def requireWheel(fn):
   """Decorator function to require the presence of a loaded wheel."""
@@ -88,14 +89,15 @@ def warnOnUpgradeOverride(fn):
 class AppData():
   """Data Bundle to track data as we load it."""
 
-  # TODO: Calling this `gameYamls` when that's only part of it is kinda dumb.
-
-  # gameYamls -> List of tuples: (gameYaml, gameYamlFileName)
+  # gameYamls -> List of GameYamls, each naming a loaded file and the games it
+  #   configures. Documents are only read again from the file when saving.
   # wheel -> Azathoth Wheel object.
+  # wheelHash -> Hash of the wheel file's contents, identifying it in history.
   def __init__(self, gameYamls = None, wheel = None):
     super().__init__()
     self.gameYamls = gameYamls
     self.wheel = wheel
+    self.wheelHash = None
 
 
 
@@ -109,6 +111,17 @@ class AzathothApp(tk.Tk):
     self.images = {}
     self.buttons = {}
     self.chooser = None
+    self.preferences = None
+    self.history = None
+    self.journal = None
+    self.feed = None
+    self.undoStack = UndoStack()
+    # Set while undoing or redoing, so the change isn't recorded as new.
+    self.isUndoing = False
+    # State of the last session, until its counts are restored to the chooser.
+    self.restoredState = None
+    self.tasks = TaskRunner(self.parent, onProgress=self.showProgress,
+                            onBusy=self.onBusy, onIdle=self.hideProgress)
     self.parent.protocol("WM_DELETE_WINDOW", self.onClose)
 
   
@@ -123,11 +136,6 @@ class AzathothApp(tk.Tk):
     # Background image.
     bg = PhotoImage(file = resources.getPath("img", "thoth-w.png"))
 
-    # Blinks.
-    b1 = PhotoImage(file = resources.getPath("img", "thothb1-w.png"))
-    b2 = PhotoImage(file = resources.getPath("img", "thothb2-w.png"))
-    b3 = PhotoImage(file = resources.getPath("img", "thothb3-w.png"))
-
     # Status Icons for file upload.
     ok = PhotoImage(file = resources.getPath("img", "ok-sm.png"))
     warn = PhotoImage(file = resources.getPath("img", "warn-sm.png"))
@@ -135,14 +143,22 @@ class AzathothApp(tk.Tk):
 
     self.images = {
       keys.bg: bg,
-      keys.b1: b1,
-      keys.b2: b2,
-      keys.b3: b3,
       keys.ok: ok,
       keys.warn: warn,
       keys.no: no,
     }
 
+
+  def loadBlinkImages(self):
+    """Loads the blink frames on first use, as they aren't needed to start."""
+    if keys.b1 in self.images:
+      return
+    self.images.update({
+      keys.b1: PhotoImage(file = resources.getPath("img", "thothb1-w.png")),
+      keys.b2: PhotoImage(file = resources.getPath("img", "thothb2-w.png")),
+      keys.b3: PhotoImage(file = resources.getPath("img", "thothb3-w.png")),
+    })
+
   
   def loadMainButtons(self):
     """Initializes the buttons in the app."""
@@ -174,6 +190,44 @@ class AzathothApp(tk.Tk):
     preferencesButton.place(x=5, y=340)
     exitButton.place(x=5, y=370)
 
+    # Progress indicator, only shown while background tasks are running.
+    self.progressLabel = tk.Label(self.parent, text="", anchor="w")
+    self.progressBar = ttk.Progressbar(self.parent, length=200)
+    cancelButton = tk.Button(self.parent, text="Cancel",
+                             command=self.tasks.cancelAll)
+    self.buttons[keys.cancelButton] = cancelButton
+
+
+  def onBusy(self):
+    """Shows the progress indicator and disables conflicting actions once a
+    background task starts.
+    """
+    self.progressLabel.place(x=5, y=255, width=280)
+    self.progressBar.place(x=5, y=280)
+    self.buttons[keys.cancelButton].place(x=215, y=277)
+    self.refresh()
+
+
+  def showProgress(self, task):
+    """Updates the progress indicator to reflect the given task's progress."""
+    self.progressLabel.configure(text=task.message or task.title)
+    if task.fraction is None:
+      self.progressBar.configure(mode="indeterminate")
+      self.progressBar.start()
+    else:
+      self.progressBar.stop()
+      self.progressBar.configure(mode="determinate", value=task.fraction * 100)
+
+
+  def hideProgress(self):
+    """Hides the progress indicator once no background tasks remain."""
+    self.progressBar.stop()
+    self.progressLabel.place_forget()
+    self.progressBar.place_forget()
+    self.buttons[keys.cancelButton].place_forget()
+    self.refresh()
+    startupTimer.finish("on-start loads")
+
 
   def loadPreferences(self):
     self.preferences = Preferences(version=self.version)
@@ -188,16 +242,165 @@ class AzathothApp(tk.Tk):
       self.errorModal("Failed to load preferences",
                       f"Could not parse contents as YAML: {e}")
 
-    # Take initialization actions dictated by preferences.    
+    if self.preferences.get(PrefFields.TRACE_SESSIONS):
+      tracing.enable()
+    if self.preferences.get(PrefFields.PROFILE_MEMORY):
+      # Imported only when preferred, sparing every other launch tracemalloc.
+      from diagnostics import memoryProfiler
+      memoryProfiler.enable()
+    if self.preferences.get(PrefFields.SERVE_EVENT_FEED):
+      self.startFeed()
+
+    # Take initialization actions dictated by preferences, resuming the last
+    #   session instead if there is one.
+    if self.restoreSession():
+      return
     if (startGameYamlFilenames := self.preferences.get(PrefFields.ON_START_GAME_YAMLS)):
       self.loadGamesFiles(filenames=startGameYamlFilenames)
     if (startWheelFilename := self.preferences.get(PrefFields.ON_START_WHEEL)):
       self.loadWheelFile(filename=startWheelFilename)
 
 
+  def startFeed(self):
+    """Starts serving spins and selection changes to stream overlays."""
+    from core.feedServer import FeedServer
+    try:
+      self.feed = FeedServer(
+        version=self.version,
+        allowedOrigins=self.preferences.get(PrefFields.EVENT_FEED_ORIGINS))
+      self.feed.startInBackground()
+    except OSError as e:
+      self.feed = None
+      self.errorModal("Failed to serve event feed", e)
+
+
+  def publishSelections(self):
+    """Publishes the chooser's current selections to the event feed, if
+    serving it.
+    """
+    if self.feed and self.chooser:
+      self.feed.publishAppSelections(self.chooser.getUpgradeResults())
+
+
+  def restoreSession(self):
+    """Starts journaling the session, if preferred, first reloading the last
+    session's wheel and game YAMLs. Its counts are restored once its wheel has
+    loaded. Returns whether there was a session to restore.
+    """
+    if not self.preferences.get(PrefFields.RESTORE_LAST_SESSION):
+      return False
+    from data.sessionJournal import SessionJournal
+
+    try:
+      self.journal = SessionJournal()
+      state = self.journal.restore()
+    except OSError as e:
+      self.journal = None
+      self.errorModal("Failed to restore last session", e)
+      return False
+
+    if not state.wheelPath and not state.gamePaths:
+      return False
+    if state.gamePaths:
+      self.loadGamesFiles(filenames=state.gamePaths)
+    if state.wheelPath:
+      self.restoredState = state
+      self.loadWheelFile(filename=state.wheelPath)
+    return True
+
+
+  def applyRestoredCounts(self):
+    """Restores the last session's counts to the chooser, if they were counts
+    for the wheel now loaded.
+    """
+    state, self.restoredState = self.restoredState, None
+    if (not state or not self.chooser
+        or state.wheelHash != self.appData.wheelHash):
+      return
+    self.chooser.updateCounts({
+      upgrade: state.countsByKey[(upgrade.yamlPath[0], upgrade.name)]
+      for upgrade in self.chooser.upgradeCountersByUpgrade
+      if (upgrade.yamlPath[0], upgrade.name) in state.countsByKey})
+
+
+  def recordToJournal(self, record):
+    """Calls the given function with the session journal, if journaling.
+    Journaling stops if it fails, rather than failing every later change.
+    """
+    if not self.journal:
+      return
+    try:
+      record(self.journal)
+    except OSError as e:
+      self.journal = None
+      self.errorModal("Failed to record session", e)
+
+
+  def onCountsChanged(self, changes):
+    """Journals counts changed in the chooser, making them undoable, and
+    publishes them to the event feed.
+    """
+    self.publishSelections()
+    self.recordToJournal(lambda journal: journal.recordCounts(
+      (upgrade.yamlPath[0], upgrade.name, newCount)
+      for upgrade, _, newCount in changes))
+    if not self.isUndoing:
+      self.undoStack.push(changes)
+      self.refreshUndoButtons()
+
+
+  def undo(self):
+    """Undoes the latest change to the chooser's counts."""
+    if self.undoStack.canUndo() and not self.tasks.isBusy():
+      self.applyUndoneCounts(self.undoStack.undo(self.chooser.getCount))
+
+
+  def redo(self):
+    """Redoes the latest undone change to the chooser's counts."""
+    if self.undoStack.canRedo() and not self.tasks.isBusy():
+      self.applyUndoneCounts(self.undoStack.redo(self.chooser.getCount))
+
+
+  def applyUndoneCounts(self, countsByUpgrade):
+    """Applies counts from undoing or redoing, refreshing only changed rows."""
+    self.isUndoing = True
+    try:
+      self.chooser.updateCounts(countsByUpgrade)
+    finally:
+      self.isUndoing = False
+    self.refreshUndoButtons()
+
+
   def onClose(self):
+    self.tasks.shutdown()
+    if self.feed:
+      self.feed.stop()
+    if self.history:
+      self.history.close()
+    if self.journal:
+      try:
+        if self.preferences.get(PrefFields.RESTORE_LAST_SESSION):
+          self.journal.close()
+        else:
+          self.journal.discard()
+      except OSError:
+        pass
+    reports = []
+    if self.preferences and self.preferences.get(PrefFields.TRACE_SESSIONS):
+      reports.append((tracing.getTracer(), tracing.TRACE_FILENAME))
+    if self.preferences and self.preferences.get(PrefFields.PROFILE_MEMORY):
+      from diagnostics import memoryProfiler
+      reports.append((memoryProfiler.getProfiler(),
+                      memoryProfiler.REPORT_FILENAME))
+    for reporter, filename in reports:
+      if reporter:
+        try:
+          reporter.export(getAzathothDataFilePath(filename))
+        except OSError:
+          pass
     try:
-      self.preferences.close()
+      if self.preferences:
+        self.preferences.close()
     except OSError:
       self.errorModal("Unsupported OS",
                       "Cannot save preferences for unrecognized OS."
@@ -226,21 +429,61 @@ class AzathothApp(tk.Tk):
     else:
       self.buttons[keys.wheelButton].configure(image = self.images[keys.ok])
 
+    # Disable actions that would conflict with running background tasks, or
+    #   that need preferences before they have loaded.
+    busy = self.tasks.isBusy() or self.preferences is None
+    for key in (keys.gamesButton, keys.wheelButton, keys.preferencesButton,
+                keys.spinButton, keys.clearButton):
+      if key in self.buttons:
+        self.buttons[key].configure(state=tk.DISABLED if busy else tk.NORMAL)
+
     # Enable/disable save button, if any, if both data types are present.
-    saveEnabled = hasGames and hasWheel
+    saveEnabled = hasGames and hasWheel and not busy
     if keys.saveButton in self.buttons:
       self.buttons[keys.saveButton].configure(
         state=tk.NORMAL if saveEnabled else tk.DISABLED)
 
+    self.refreshUndoButtons()
+
+
+  def refreshUndoButtons(self):
+    """Enables the undo and redo buttons only while there's something to undo
+    or redo, and no background tasks are running.
+    """
+    busy = self.tasks.isBusy() or self.preferences is None
+    for key, enabled in ((keys.undoButton, self.undoStack.canUndo()),
+                         (keys.redoButton, self.undoStack.canRedo())):
+      if key in self.buttons:
+        self.buttons[key].configure(
+          state=tk.NORMAL if enabled and not busy else tk.DISABLED)
+
   
   def run(self):
     """Starts UI."""
     self.loadImages()
+    startupTimer.mark("images")
     self.loadMainButtons()
-    self.loadPreferences()
-    
+    self.refresh()
+    startupTimer.mark("buttons")
+
+    # Show the window before loading anything else.
+    self.parent.update()
+    startupTimer.mark("window shown")
+    self.parent.after_idle(self.finishStartup)
+
     self.parent.mainloop()
 
+
+  def finishStartup(self):
+    """Loads preferences once the window is shown, starting any on-start loads
+    they dictate in the background.
+    """
+    self.loadPreferences()
+    self.refresh()
+    startupTimer.mark("preferences")
+    if not self.tasks.isBusy():
+      startupTimer.finish("startup")
+
   
   @warnOnUpgradeOverride
   def loadWheelFile(self, filename=None):
@@ -254,21 +497,33 @@ class AzathothApp(tk.Tk):
                   filetypes=[('Azathoth Wheel', '*.yaml')],
                   initialdir=self.preferences.get(PrefFields.LAST_WHEEL_FOLDER) or None)
     if filename:
-      try:
-        self.appData.wheel = azathothReader.azathothToWheel(filename)
+      from core import azathothCore, sessions
+
+      def onLoaded(loaded):
+        self.appData.wheel, self.appData.wheelHash = loaded
         self.openChooser()
+        self.recordToJournal(lambda journal: journal.recordWheel(
+          filename, self.appData.wheelHash))
+        self.applyRestoredCounts()
         wheelFolder = Path(filename).parent.as_posix()
         self.preferences.set(PrefFields.LAST_WHEEL_FOLDER, wheelFolder)
-      except Exception as e:
+        self.refresh()
+
+      def onFailed(e):
         # TODO: If wheel loaded via preference, signal to preferences editor.
         # TODO: Consider if there's a cleaner way to signal failure and clear.
         self.appData.wheel = EMPTY_WHEEL
         if self.chooser:
           self.chooser.clearObjects()
         self.errorModal("Failed to load Wheel", e)
-      finally:
         self.refresh()
 
+      # Parse and validate on a worker, opening the chooser once done.
+      self.tasks.submit(f"Loading {Path(filename).name}",
+        lambda task: (azathothCore.loadWheel(filename),
+                      sessions.hashFile(filename)),
+        onDone=onLoaded, onError=onFailed)
+
   
   def loadGamesFiles(self, filenames=[]):
     """Opens a new dialog to fetch an indicated set of game YAMLs, parses them,
@@ -280,21 +535,26 @@ class AzathothApp(tk.Tk):
                     filetypes=[('Game YAMLs', '*.yaml')],
                     initialdir=self.preferences.get(PrefFields.LAST_GAME_YAMLS_FOLDER) or None)
     if filenames:
-      gameYamls = []
-      try:
-        for filename in filenames:
-          gameYaml = yamlReader.readToYaml(filename)
-          gameYamls.append((gameYaml, filename))
+      from core import azathothCore
+
+      def parseGameYamls(task):
+        return azathothCore.loadGameYamls(filenames, progress=task.progress)
+
+      def onLoaded(gameYamls):
         self.appData.gameYamls = gameYamls
-        if filenames:
-          gameYamlsFolder = Path(filenames[-1]).parent.as_posix()
-          self.preferences.set(PrefFields.LAST_GAME_YAMLS_FOLDER, gameYamlsFolder)
-      except Exception as e:
+        self.recordToJournal(lambda journal: journal.recordGames(filenames))
+        gameYamlsFolder = Path(filenames[-1]).parent.as_posix()
+        self.preferences.set(PrefFields.LAST_GAME_YAMLS_FOLDER, gameYamlsFolder)
+        self.refresh()
+
+      def onFailed(e):
         self.appData.gameYamls = []
         self.errorModal("Failed to load game YAMLs", e)
-      finally:
         self.refresh()
 
+      self.tasks.submit("Loading game YAMLs", parseGameYamls,
+                        onDone=onLoaded, onError=onFailed)
+
 
   @requireWheel
   @requireGames
@@ -302,6 +562,8 @@ class AzathothApp(tk.Tk):
     """Copies the game YAMLs stored in AppData, upgrades them according to the
     given upgrade results, and saves them to a designated output folder.
     """
+    from core import azathothCore
+    from data.spinHistory import RunKind
 
     # Don't save files without upgrades.
     if not upgradeResults:
@@ -310,11 +572,8 @@ class AzathothApp(tk.Tk):
       return
 
     # Validate that all reported upgrades belong to loaded games.
-    gameTitlesToUpgrade = {upgrade.yamlPath[0] for upgrade in upgradeResults.keys()}
-    gameYamlKeys = set(sum(
-      [list(gameYaml[0].keys()) for gameYaml in self.appData.gameYamls],
-      []))
-    if missingGames := gameTitlesToUpgrade.difference(gameYamlKeys):
+    if missingGames := azathothCore.getMissingGames(upgradeResults,
+                                                    self.appData.gameYamls):
       reallyProceed = messagebox.askyesnocancel("Game YAMLs Missing",
                       f"Attempting to save upgrades for games not included in"
                       " your loaded game YAMLs. These upgrades will have no"
@@ -334,67 +593,76 @@ class AzathothApp(tk.Tk):
     
     self.preferences.set(PrefFields.LAST_SAVE_FOLDER, saveDirectory)
 
-    # Prepare all the upgraded YAMLs.
-    filePathToUpgradedYaml = dict()
-    try:
-      for gameYaml, gameFilePath in self.appData.gameYamls:
-        upgradedYaml = self.withAzathothHeader(
-          upgrader.toUpgradedYaml(upgradeResults, gameYaml))
-
-        # Write a new yaml with the upgrades included.
-        filename = Path(gameFilePath).name
-        upgradedFilename = UPGRADE_PREFIX + filename
-
-        upgradedYamlFilePath = os.path.join(saveDirectory, upgradedFilename)
-        filePathToUpgradedYaml[upgradedYamlFilePath] = upgradedYaml
-    except Exception as e:
+    options = azathothCore.SaveOptions(
+      asPatches=self.preferences.get(PrefFields.SAVE_AS_PATCHES),
+      asBundle=self.preferences.get(PrefFields.SAVE_AS_BUNDLE),
+      stream=self.preferences.get(PrefFields.STREAM_UPGRADES),
+      summaryFormat=self.preferences.get(PrefFields.SUMMARY_FORMAT),
+      compression=self.preferences.get(PrefFields.BUNDLE_COMPRESSION))
+    gameYamls = list(self.appData.gameYamls)
+
+    def prepareWrites(task):
+      return azathothCore.prepareWrites(upgradeResults, gameYamls, options,
+                                        version=self.version,
+                                        progress=task.progress)
+
+    def writeAll(filenameToWrite, task):
+      return azathothCore.writeOutputs(filenameToWrite, saveDirectory, options,
+                                       version=self.version,
+                                       progress=task.progress)
+
+    def onPrepared(filenameToWrite):
+      outputFilePaths = azathothCore.getOutputPaths(filenameToWrite,
+                                                    saveDirectory, options)
+
+      # If preferred, check for and warn on file overwrite.
+      if self.preferences.get(PrefFields.WARN_ON_SAVE_OVERWRITE):
+        if any([Path(filePath).exists() for filePath in outputFilePaths]):
+          ok = messagebox.askyesno(
+            title="Really overwrite existing files?",
+            icon='warning',
+            message="Upgraded YAMLs already exist in your target folder and will"
+                    " be overwritten by this action.\n\n"
+                    "Really proceed?",
+          )
+          if not ok:
+            return
+
+      # Save the upgraded YAMLs and summary.
+      self.tasks.submit("Saving upgrades",
+        functools.partial(writeAll, filenameToWrite),
+        onDone=onSaved, onError=onSaveFailed)
+
+    def onSaved(_):
+      self.recordHistory(RunKind.SAVE, upgradeResults)
+
+      # Blink
+      if not self.preferences.get(PrefFields.DISABLE_BLINK):
+        self.blink()
+
+    def onPrepareFailed(e):
       # Capture and notify on errors encountered while upgrading.
       exMessage = getattr(e, 'message', repr(e))
-      return messagebox.showerror(
+      messagebox.showerror(
         title="Upgrade Failed",
         message=f"Encountered error while applying upgrades.\n\n{exMessage}"
       )
-    
-    # If preferred, check for and warn on file overwrite.
-    if self.preferences.get(PrefFields.WARN_ON_SAVE_OVERWRITE):
-      if any([Path(key).exists() for key in filePathToUpgradedYaml.keys()]):
-        ok = messagebox.askyesno(
-          title="Really overwrite existing files?",
-          icon='warning',
-          message="Upgraded YAMLs already exist in your target folder and will"
-                  " be overwritten by this action.\n\n"
-                  "Really proceed?",
-        )
-        if not ok:
-          return
-
-    # Save the upgraded YAMLs.
-    successfulSaves = 0
-    try:
-      for filePath, yaml in filePathToUpgradedYaml.items():
-        writer.writeYamlToFile(yaml, filePath)
-        successfulSaves += 1
-    except Exception as e:
+
+    def onSaveFailed(e):
       # Capture and notify on errors encountered while saving.
       exMessage = getattr(e, 'message', repr(e))
-      return messagebox.showerror(
+      messagebox.showerror(
         title="Saves Failed",
         message=f"Encountered error while saving YAMLs.\n\n{exMessage}"
       )
 
-    # Save Azathoth summary
-    summaryYaml = upgrader.toSummaryYamlStr(
-      upgradeResults, version=self.version)
-    summaryYamlFilePath = os.path.join(saveDirectory, "azathothSummary.yaml")
-    writer.writeToFile(summaryYaml, summaryYamlFilePath)
-
-    # Blink
-    if not self.preferences.get(PrefFields.DISABLE_BLINK):
-      self.blink()
+    self.tasks.submit("Applying upgrades", prepareWrites,
+                      onDone=onPrepared, onError=onPrepareFailed)
 
 
   def blink(self):
     '''Blink.'''
+    self.loadBlinkImages()
     def updateImage(label, image):
       label.config(image=image)
 
@@ -411,19 +679,6 @@ class AzathothApp(tk.Tk):
       self.bgLabel.after(waitMs, updateImage, self.bgLabel, img)
 
 
-  def withAzathothHeader(self, yaml):
-    '''Returns a copy of the given YAML with an Azathoth header prepended.'''
-
-    # Only this complicated so we can force to appear early/first in the dict.
-    headedDict = {}
-    if self.version:
-      headedDict[keys.azathothBlock] = {
-        keys.azathothVersion: self.version,
-      }
-    headedDict.update(yaml)
-    return headedDict
-
-
   @warnOnUpgradeOverride
   def clearUpgrades(self):
     self.chooser.zeroCounters()
@@ -435,6 +690,9 @@ class AzathothApp(tk.Tk):
     """Spins the loaded wheel the indicated number of times, then updates the
     UpgradeChooser to reflect the results.
     """
+    from core import azathothCore
+    from data.spinHistory import RunKind
+    from spin import spinner
 
     wheelLimit =  spinner.getLimitForWheel(self.appData.wheel) # type: ignore
     if wheelLimit != -1 and wheelLimit < numSpins:
@@ -443,8 +701,39 @@ class AzathothApp(tk.Tk):
                       f" {numSpins} were requested.")
       return
 
-    upgradeResults = spinner.spinUpgrades(self.appData.wheel, numSpins) # type: ignore
-    self.chooser.applyUpgrades(upgradeResults) # type: ignore
+    def onSpun(upgradeResults):
+      if self.feed:
+        self.feed.publishAppSpin(upgradeResults, numSpins)
+      self.chooser.applyUpgrades(upgradeResults) # type: ignore
+      self.recordHistory(RunKind.SPIN, upgradeResults, spins=numSpins)
+
+    wheel = self.appData.wheel
+    self.tasks.submit(f"Spinning {numSpins} upgrades",
+      lambda task: azathothCore.spin(wheel, numSpins), # type: ignore
+      onDone=onSpun,
+      onError=lambda e: self.errorModal("Spin Failed", e))
+
+
+  def recordHistory(self, kind, upgradeResults, **kwargs):
+    """Records a spin or save of the given upgrade results to the spin history,
+    if preferred.
+    """
+    if not self.preferences.get(PrefFields.RECORD_HISTORY):
+      return
+    from core.sessions import DEFAULT_PLAYER
+    from data.spinHistory import SpinHistory
+    import sqlite3
+
+    try:
+      if self.history is None:
+        self.history = SpinHistory()
+      self.history.record(kind, DEFAULT_PLAYER, upgradeResults,
+                          wheelHash=self.appData.wheelHash,
+                          wheelName=self.appData.wheel.displayName, **kwargs)
+      # Runs are rare here, so write each one straight away.
+      self.history.flush()
+    except (OSError, sqlite3.Error) as e:
+      self.errorModal("Failed to record history", e)
 
 
   
@@ -454,14 +743,21 @@ class AzathothApp(tk.Tk):
     counters that allow you to select how many times each particular upgrade
     has been selected.
     """
+    from gui.upgradeChooser import UpgradeChooser
+    from spin import spinner
+
     allUpgrades = self.getAllUpgrades()
     if allUpgrades:
       chooserPanel = tk.Frame(self.parent, borderwidth=0, highlightthickness=0)
       chooserPanel.place(x=300, y=0, relwidth=0.5, relheight=1)
 
-      self.chooser = UpgradeChooser(chooserPanel, borderwidth=0, highlightthickness=0, height=400, width=400)
-      self.chooser.loadUpgrades(self.getAllUpgrades())
+      # Counts of a previous wheel's upgrades can't be undone on this one.
+      self.undoStack.clear()
+      self.chooser = UpgradeChooser(chooserPanel, borderwidth=0, highlightthickness=0, height=400, width=400,
+                                    onCountsChanged=self.onCountsChanged)
+      self.chooser.loadUpgrades(allUpgrades)
       self.chooser.place(x=0, y=0, relwidth=1, relheight=0.90)
+      self.publishSelections()
 
       wheelLimit = spinner.getLimitForWheel(self.appData.wheel) # type: ignore
       spinEntry = tk.Spinbox(chooserPanel, from_=0, increment=1,
@@ -474,23 +770,36 @@ class AzathothApp(tk.Tk):
                                ),
                                "%P"),
                              )
-      spinEntry.place(x=10, y=375, width=40)
+      spinEntry.place(x=5, y=375, width=35)
 
       spinButton = tk.Button(chooserPanel, text="Spin",
                              command=lambda:self.spinNewUpgrades(int(spinEntry.get())))
-      spinButton.place(x=60, y=372, width=60)
+      spinButton.place(x=45, y=372, width=50)
 
       clearButton = tk.Button(chooserPanel, text="Clear",
                               command=self.clearUpgrades)
-      clearButton.place(x=140, y=372, width=60)
+      clearButton.place(x=100, y=372, width=50)
+
+      undoButton = tk.Button(chooserPanel, text="Undo", command=self.undo)
+      undoButton.place(x=155, y=372, width=45)
+
+      redoButton = tk.Button(chooserPanel, text="Redo", command=self.redo)
+      redoButton.place(x=205, y=372, width=45)
       
       saveButton = tk.Button(chooserPanel, text = "Save",
                             command=lambda:self.saveUpgrades(self.chooser.getUpgradeResults()))
-      saveButton.place(x=220, y=372, width=60)
+      saveButton.place(x=255, y=372, width=40)
+
+      # Ctrl+Shift+Z redoes too, as in many other apps.
+      self.parent.bind("<Control-z>", lambda _: self.undo())
+      self.parent.bind("<Control-y>", lambda _: self.redo())
+      self.parent.bind("<Control-Z>", lambda _: self.redo())
 
       self.buttons.update({
         keys.spinButton: spinButton,
         keys.clearButton: clearButton,
+        keys.undoButton: undoButton,
+        keys.redoButton: redoButton,
         keys.saveButton: saveButton,
       })
 
@@ -499,18 +808,8 @@ class AzathothApp(tk.Tk):
   @requireWheel
   def getAllUpgrades(self):
     """Returns a list of all upgrades contained in the current AppData's wheel."""
-
-    def getAllUpgradesFromWheel(wheel: Wheel):
-      """Helper function extracting all upgrades in a wheel and its subwheels."""
-      allUpgrades = []
-      for choice in wheel.choices:
-        if choice.wheelResult:
-          allUpgrades = allUpgrades + getAllUpgradesFromWheel(choice.wheelResult)
-        elif choice.upgradeResult:
-          allUpgrades.append(choice.upgradeResult)
-      return allUpgrades
-
-    return getAllUpgradesFromWheel(self.appData.wheel)
+    from core import azathothCore
+    return azathothCore.getAllUpgrades(self.appData.wheel)
 
 
   def errorModal(self, title, text):
@@ -524,6 +823,7 @@ class AzathothApp(tk.Tk):
   
   def loadPreferencesEditor(self):
     '''Loads Preferences Editor as a toplevel sub-window with forced focus.'''
+    from gui.preferencesEditor import PreferencesEditor
     editor = PreferencesEditor(self.parent, self.preferences)
     editor.grab_set()
     editor.focus()
@@ -1,7 +1,53 @@
+from data.upgradeIndex import UpgradeIndex
+from data.upgrades import Upgrade
 from file import upgrader
 from spin import spinner
+import time
 import tkinter as tk
 
+# Height in pixels of every row in the chooser.
+ROW_HEIGHT = 28
+
+# Number of rows beyond those visible kept bound and ready to scroll into view.
+OVERSCAN_ROWS = 4
+
+# Number of pixels scrolled per scroll unit, e.g. per mouse wheel notch.
+SCROLL_UNIT = ROW_HEIGHT
+
+# Milliseconds of each frame spent creating row widgets while populating the
+#   chooser, keeping the UI responsive as the pool fills.
+POPULATE_BUDGET_MS = 8
+
+# Milliseconds between slices of row widget creation.
+POPULATE_INTERVAL_MS = 1
+
+
+class ChooserFilter:
+  '''Constants for filters narrowing which upgrades the chooser lists.'''
+  ALL = "All upgrades"
+  SELECTED = "Selected only"
+  EXHAUSTED = "Exhausted"
+  MANUAL = "Manual only"
+
+
+# Filters whose matches change as counts change.
+COUNT_DEPENDENT_FILTERS = {ChooserFilter.SELECTED, ChooserFilter.EXHAUSTED}
+
+
+def _toValueText(upgrade, count):
+  """Returns the text describing the value the given upgrade produces when
+  selected the given number of times.
+  """
+  if not count:
+    return ""
+
+  upgradedText = str(upgrader.getValue(upgrade, count))
+  if upgradedText.isnumeric():
+    # Numeric upgrades use an arrow to differentiate between count and value.
+    upgradedText = f"=> {upgradedText}"
+  return upgradedText
+
+
 class UpDownCounter(tk.Frame):
   """Frame comprising a numeric label flanked by up and down increment
   buttons.
@@ -17,18 +63,22 @@ class UpDownCounter(tk.Frame):
     self.counterLabel = tk.Label(self, textvariable=self.counter)
     self.upButton = tk.Button(self, text="+",
                               command = lambda: self.increment(1))
-    
+
     self.downButton.grid(row=0, column=0)
     self.counterLabel.grid(row=0, column=1)
     self.upButton.grid(row=0, column=2)
 
+    # Button states last pushed to the widgets, to skip redundant configures.
+    self.downState = None
+    self.upState = None
+
     self.refresh()
-  
+
   def increment(self, num):
     """Adds the given amount to the counter IntVar."""
     self.set(self.get() + num)
     self.refresh()
-  
+
   def set(self, num):
     """Passes set(n) requests down to the counter IntVar."""
     self.counter.set(num)
@@ -42,88 +92,246 @@ class UpDownCounter(tk.Frame):
     """Refreshes the counter's UI to reflect current state."""
     currentVal = self.counter.get()
 
-    self.downButton.configure(
-      state=tk.DISABLED if currentVal == 0 else tk.NORMAL)
-    self.upButton.configure(
-      state=tk.DISABLED if currentVal == self.limit else tk.NORMAL)
+    downState = tk.DISABLED if currentVal == 0 else tk.NORMAL
+    if downState != self.downState:
+      self.downState = downState
+      self.downButton.configure(state=downState)
+
+    upState = tk.DISABLED if currentVal == self.limit else tk.NORMAL
+    if upState != self.upState:
+      self.upState = upState
+      self.upButton.configure(state=upState)
 
 
 class UpgradeCounter():
-  """Representation of a particular Upgrade and its corresponding widgets in
-  the upgrading counting interface.
+  """Model of a particular Upgrade's selection count and the value that count
+  produces. Holds no widgets, so every upgrade on a wheel can have one cheaply.
   """
-  def __init__(self, upgrade, label: tk.Label, upDownCounter: UpDownCounter, upgradeValue: tk.Label):
+  def __init__(self, upgrade):
     self.upgrade = upgrade
-    self.label = label
-    self.upDownCounter = upDownCounter
-    self.upgradeValue = upgradeValue
-
-    self.upDownCounter.counter.trace_add('write', self.refresh)
-
+    self.count = 0
+    self.valueText = ""
 
-  def refresh(self, *args):
-    """Called whenever the spinbox values change."""
-    numUpgrades = self.get()
+    upperLimit = spinner.getLimitForUpgrade(upgrade, {})
+    self.limit = upperLimit if upperLimit >= 0 else None
 
-    if not numUpgrades:
-      # Make invisible
-      self.upgradeValue.configure(text="")
+  def get(self):
+    """Gets the selection count."""
+    return self.count
+
+  def set(self, value, valueText=None):
+    """Sets the selection count to the given value, along with the text of the
+    value it produces. The text is computed if not given.
+    """
+    self.count = value
+    self.valueText = (valueText if valueText is not None
+                      else _toValueText(self.upgrade, value))
+
+  def isExhausted(self):
+    """Returns whether the upgrade has been selected as often as it can be."""
+    return self.limit is not None and self.count >= self.limit
+
+  def matchesFilter(self, chooserFilter):
+    """Returns whether this counter is listed under the given ChooserFilter."""
+    if chooserFilter == ChooserFilter.SELECTED:
+      return self.count > 0
+    elif chooserFilter == ChooserFilter.EXHAUSTED:
+      return self.isExhausted()
+    elif chooserFilter == ChooserFilter.MANUAL:
+      return self.upgrade.type == Upgrade.Type.MANUAL
+    return True
+
+
+class ChooserRow():
+  """Entry in the chooser's list, either a game header or an upgrade counter.
+  """
+  def __init__(self, game, counter: UpgradeCounter|None = None):
+    self.game = game
+    self.counter = counter
+
+
+class _RowWidgets():
+  """Recyclable set of widgets that can display any ChooserRow."""
+  def __init__(self, parent, onCounterWritten):
+    self.row = None
+    self.isHeader = None
+
+    # Count and value text last pushed to the widgets.
+    self.shownCount = None
+    self.shownValueText = None
+
+    self.frame = tk.Frame(parent, borderwidth=0, highlightthickness=0)
+    self.frame.grid_columnconfigure(0, weight=1)
+    self.frame.grid_columnconfigure(2, minsize=50)   # Forces value column to have min width to minimize UI-thrashing on value-load.
+
+    self.label = tk.Label(self.frame)
+    self.upDownCounter = UpDownCounter(self.frame, None)
+    self.upgradeValue = tk.Label(self.frame, text="")
+
+    self.upDownCounter.counter.trace_add(
+      'write', lambda *_: onCounterWritten(self))
+
+  def bind(self, row: ChooserRow):
+    """Displays the given row in these widgets."""
+    self.row = row
+    isHeader = row.counter is None
+
+    # Only re-grid when switching between headers and upgrades.
+    if isHeader != self.isHeader:
+      self.isHeader = isHeader
+      if isHeader:
+        # TODO: Consider adding an icon here to indicate whether this game is loaded or not.
+        self.label.configure(font="Hultog")
+        self.label.grid(row=0, column=0, columnspan=3)
+        self.upDownCounter.grid_remove()
+        self.upgradeValue.grid_remove()
+      else:
+        self.label.configure(font="TkDefaultFont")
+        self.label.grid(row=0, column=0, columnspan=1)
+        self.upDownCounter.grid(row=0, column=1)
+        self.upgradeValue.grid(row=0, column=2)
+
+    if isHeader:
+      self.label.configure(text=row.game)
     else:
-      upgradedValue = upgrader.getValue(self.upgrade, numUpgrades)
-      upgradedText = str(upgradedValue)
-
-      if upgradedText.isnumeric():
-        # Numeric upgrades use an arrow to differentiate between count and value.
-        upgradedText = f"=> {upgradedText}"
-      self.upgradeValue.configure(text=upgradedText)
+      self.label.configure(text=row.counter.upgrade.name)
+      self.upDownCounter.limit = row.counter.limit
+      self.refresh()
 
+  def refresh(self):
+    """Refreshes the widgets to reflect their bound counter's current state,
+    only pushing states that have changed.
+    """
+    if not self.row or not self.row.counter:
+      return
+    counter = self.row.counter
+
+    if counter.count != self.shownCount:
+      self.shownCount = counter.count
+      if self.upDownCounter.get() != counter.count:
+        self.upDownCounter.set(counter.count)
+    if counter.valueText != self.shownValueText:
+      self.shownValueText = counter.valueText
+      self.upgradeValue.configure(text=counter.valueText)
     self.upDownCounter.refresh()
 
   def destroy(self):
-    """Destroys all objects contained by the counter."""
-    self.label.destroy()
-    self.upDownCounter.destroy()
-    self.upgradeValue.destroy()
+    """Destroys all widgets in the collection."""
+    self.frame.destroy()
 
-  def get(self):
-    """Gets the internal counter variable."""
-    return self.upDownCounter.get()
 
-  def set(self, value):
-    """Sets the internal counter variable to the given value."""
-    self.upDownCounter.set(value)
 
+class UpgradeChooser(tk.Frame):
+  """Class containing subframe listing upgrades all at once.
 
+  Rows are virtualized: counts live in a plain model of UpgradeCounters, and
+  widgets exist only for the visible rows plus a small overscan, recycled as
+  the list scrolls.
 
-class UpgradeChooser(tk.Frame):
-  """Class containing subframe listing upgrades all at once."""
+  If given, onCountsChanged is called with a list of tuples: (upgrade, old
+  count, new count), whenever any counts change.
+  """
 
-  def __init__(self, parent, *args, **kwargs):
+  def __init__(self, parent, *args, onCountsChanged=None, **kwargs):
     super().__init__(parent, *args, **kwargs)
     self.parent = parent
+    self.onCountsChanged = onCountsChanged
 
-    # Dict mapping upgrade to corresponding UpgradeCounter widget collection.
+    # Dict mapping upgrade to its corresponding UpgradeCounter model.
     self.upgradeCountersByUpgrade = {}
-    self.gameLabels = []
 
-  def clearObjects(self):
-    """Clears all widgets that may already be contained in the chooser."""
-    for upgradeCounter in self.upgradeCountersByUpgrade.values():
-      upgradeCounter.destroy()
-    for gameLabel in self.gameLabels:
-      gameLabel.destroy()
+    # Every upgrade's counter, in wheel order, and the index used to search
+    #   them by position.
+    self.counters = []
+    self.index = UpgradeIndex([])
+
+    # Rows currently listed, in order, after searching and filtering.
+    self.rows = []
+
+    # Current search query and ChooserFilter.
+    self.query = tk.StringVar(self, "")
+    self.chooserFilter = tk.StringVar(self, ChooserFilter.ALL)
+
+    # Pool of recyclable row widgets. Row i is always displayed by pool slot
+    #   i % len(pool), so scrolling only rebinds rows entering the view. Slots
+    #   are None until their widgets have been created.
+    self.rowWidgets = []
+
+    # Pending after() callback creating the next slice of row widgets, if any.
+    self.pendingPopulate = None
+
+    # Scroll position, in pixels from the top of the list.
+    self.yOffset = 0
+
+    # Set while widgets are updated programmatically to ignore their traces.
+    self.suppressTraces = False
+
+    # Counters changed since widgets were last refreshed, and the pending idle
+    #   callback that will refresh them, if any.
+    self.dirtyCounters = set()
+    self.pendingRefresh = None
+
+    # Search box and filter menu, narrowing the list on every change.
+    self.toolbar = tk.Frame(self, borderwidth=0, highlightthickness=0)
+    self.searchEntry = tk.Entry(self.toolbar, textvariable=self.query)
+    self.filterMenu = tk.OptionMenu(
+      self.toolbar, self.chooserFilter, ChooserFilter.ALL,
+      ChooserFilter.SELECTED, ChooserFilter.EXHAUSTED, ChooserFilter.MANUAL)
+    self.query.trace_add('write', lambda *_: self.applyFilter())
+    self.chooserFilter.trace_add('write', lambda *_: self.applyFilter())
+    self.filterMenu.pack(side="right")
+    self.searchEntry.pack(side="left", fill="x", expand=True, padx=(0, 5))
+
+    self.viewport = tk.Frame(self, borderwidth=0, highlightthickness=0)
+    self.scrollbar = tk.Scrollbar(self, command=self.yview)
+    self.viewport.bind("<Configure>", lambda _: self.layoutRows())
+
+    # Set up mouse wheel scrolling on the viewport.
+    def scrollRows(event):
+      self.yview(tk.SCROLL, int(-1*(event.delta/120)), tk.UNITS)
+    self.viewport.bind('<Enter>',
+                       lambda _: self.viewport.bind_all("<MouseWheel>", scrollRows))
+    self.viewport.bind('<Leave>',
+                       lambda _: self.viewport.unbind_all("<MouseWheel>"))
+
+    self.toolbar.pack(side="top", fill="x")
+    self.scrollbar.pack(side="right", fill="y")
+    self.viewport.pack(side="left", fill="both", expand=True)
+
 
+  def clearObjects(self):
+    """Clears all widgets and upgrades that may already be in the chooser."""
+    for rowWidgets in self.rowWidgets:
+      if rowWidgets:
+        rowWidgets.destroy()
+    if self.pendingRefresh:
+      self.after_cancel(self.pendingRefresh)
+    if self.pendingPopulate:
+      self.after_cancel(self.pendingPopulate)
+
+    self.dirtyCounters = set()
+    self.pendingRefresh = None
+    self.pendingPopulate = None
     self.upgradeCountersByUpgrade = {}
-    self.gameLabels = []
+    self.counters = []
+    self.index = UpgradeIndex([])
+    self.rows = []
+    self.rowWidgets = []
+    self.yOffset = 0
+    self.layoutRows()
 
 
   def zeroCounters(self):
     """Zeroes out all upgrade counters."""
-    for upgradeCounter in self.upgradeCountersByUpgrade.values():
-      upgradeCounter.set(0)
-      upgradeCounter.refresh()
+    self.updateCounts(
+      {upgrade: 0 for upgrade in self.upgradeCountersByUpgrade.keys()})
+
+
+  def getCount(self, upgrade):
+    """Returns the selection count of the given upgrade."""
+    return self.upgradeCountersByUpgrade[upgrade].get()
+
 
-  
   def hasAnyUpgrades(self):
     """Returns whether any of the given upgrade counters have a positive count."""
     for upgradeCounter in self.upgradeCountersByUpgrade.values():
@@ -131,83 +339,219 @@ class UpgradeChooser(tk.Frame):
         return True
     return False
 
-  
+
   def loadUpgrades(self, allUpgrades):
-    """Loads in a set of possible upgrades, creating widgets to represent them."""
-    canvas = tk.Canvas(self, borderwidth=0, highlightthickness=0)
-    scrollbar = tk.Scrollbar(self, command=canvas.yview)
-
-    upgradeLayout = tk.Frame(canvas, borderwidth=0, highlightthickness=0)
-    upgradeLayout.grid_columnconfigure(2, minsize=50)   # Forces value column to have min width to minimize UI-thrashing on value-load.
-    upgradeLayout.pack()
-    
-    if allUpgrades:
-
-      # Track these conditions as we iterate through the upgrade list.
-      # Exact row may differ depending on inserted headers.
-      currentRow = 0
-      currentGame = ""
-
-      for upgrade in allUpgrades:
-        game = upgrade.yamlPath[0]
-
-        if currentGame != game:
-          # TODO: Consider adding an icon here to indicate whether this game is loaded or not.
-          gameLabel = tk.Label(upgradeLayout, text=game, font="Hultog")
-          self.gameLabels.append(gameLabel)
-          gameLabel.grid(row=currentRow, column=0, columnspan=2)
-          currentRow = currentRow + 1
-          currentGame = game
-
-        # Create representative widgets for each upgrade.
-        upgradeLabel = tk.Label(upgradeLayout, text=upgrade.name)
-        upgradeLabel.grid(row=currentRow, column=0)
-
-        upperLimit = spinner.getLimitForUpgrade(upgrade, {})
-        upDownCounter = UpDownCounter(upgradeLayout, upperLimit if upperLimit >= 0 else None)
-        upDownCounter.grid(row=currentRow, column=1)
-
-        upgradeValue = tk.Label(upgradeLayout, text="")
-        upgradeValue.grid(row=currentRow, column=2)
-
-        upgradeCounter = UpgradeCounter(upgrade, upgradeLabel, upDownCounter, upgradeValue)
-
-        self.upgradeCountersByUpgrade[upgrade] = upgradeCounter
-
-        currentRow = currentRow + 1
-    
-    upgradeLayout.bind(
-      "<Configure>",
-      lambda e: canvas.configure(
-        scrollregion=canvas.bbox("all")
-      )
-    )
-
-    canvas.create_window((100,100), window=upgradeLayout, anchor='n')
-    canvas.configure(yscrollcommand=scrollbar.set)
-
-    # Set up mouse wheel scrolling on canvas.
-    def scrollCanvas(event):
-      canvas.yview_scroll(int(-1*(event.delta/120)), "units")
-    canvas.bind('<Enter>',
-                lambda _: canvas.bind_all("<MouseWheel>", scrollCanvas))
-    canvas.bind('<Leave>',
-                lambda _: canvas.unbind_all("<MouseWheel>"))
-
-    scrollbar.pack(side="right", fill="y")
-    canvas.pack(side="left", fill="both", expand=True)
-
-
-  
+    """Loads in a set of possible upgrades, creating the model of their counts
+    and the widgets to display whichever of them are visible.
+
+    The model is built in full before returning, so counts can be read and
+    applied immediately. Widgets are created progressively, see populateRows.
+    """
+    for upgrade in allUpgrades or []:
+      upgradeCounter = UpgradeCounter(upgrade)
+      self.upgradeCountersByUpgrade[upgrade] = upgradeCounter
+      self.counters.append(upgradeCounter)
+
+    self.index = UpgradeIndex(counter.upgrade for counter in self.counters)
+    self.applyFilter()
+
+
+  def applyFilter(self):
+    """Lists only the upgrades matching the current search query and filter,
+    under headers for their games. Searches are answered by the prebuilt
+    index, so only matching counters are ever visited.
+    """
+    chooserFilter = self.chooserFilter.get()
+    positions = sorted(self.index.search(self.query.get()))
+
+    # Track the current game as we iterate through the matching upgrades.
+    currentGame = ""
+    rows = []
+    for position in positions:
+      counter = self.counters[position]
+      if not counter.matchesFilter(chooserFilter):
+        continue
+
+      game = counter.upgrade.yamlPath[0]
+      if currentGame != game:
+        rows.append(ChooserRow(game))
+        currentGame = game
+      rows.append(ChooserRow(game, counter))
+
+    self.rows = rows
+    self.yOffset = 0
+    self.layoutRows(rebind=True)
+
+
+  def populateRows(self):
+    """Creates missing row widgets in time-sliced chunks, visible rows first,
+    placing each slice before scheduling the next with after(). Each slice
+    stops once POPULATE_BUDGET_MS has passed, so large pools never block the
+    main loop for long.
+    """
+    self.pendingPopulate = None
+    deadline = time.perf_counter() + POPULATE_BUDGET_MS / 1000
+
+    poolSize = len(self.rowWidgets)
+    firstRow = self.firstPooledRow()
+    for index in range(firstRow, min(firstRow + poolSize, len(self.rows))):
+      slot = index % poolSize
+      if self.rowWidgets[slot] is None:
+        self.rowWidgets[slot] = _RowWidgets(self.viewport, self.onCounterWritten)
+        if time.perf_counter() >= deadline:
+          break
+
+    self.layoutRows()
+
+
+  def firstPooledRow(self):
+    """Returns the index of the first row displayed by the pool, centering the
+    overscan around the visible rows.
+    """
+    firstVisibleRow = self.yOffset // ROW_HEIGHT
+    return max(0, min(firstVisibleRow - OVERSCAN_ROWS // 2,
+                      len(self.rows) - len(self.rowWidgets)))
+
+
+  def onCounterWritten(self, rowWidgets: _RowWidgets):
+    """Called whenever a displayed counter's value changes, recording the new
+    count in the model.
+    """
+    if self.suppressTraces or not rowWidgets.row or not rowWidgets.row.counter:
+      return
+    counter = rowWidgets.row.counter
+    oldCount, newCount = counter.get(), rowWidgets.upDownCounter.get()
+    counter.set(newCount)
+    rowWidgets.refresh()
+    if self.onCountsChanged and oldCount != newCount:
+      self.onCountsChanged([(counter.upgrade, oldCount, newCount)])
+
+
+  def updateCounts(self, countsByUpgrade):
+    """Applies the given counts by upgrade as a single batched transaction.
+    Upgrades absent from the given dict keep their current counts.
+
+    Every new count and label is computed before any are applied, so a failure
+    leaves the model untouched. Widgets are then refreshed in a single idle
+    callback, pushing only the states of changed rows that are in view.
+    """
+    changes = []
+    for upgrade, count in countsByUpgrade.items():
+      counter = self.upgradeCountersByUpgrade.get(upgrade)
+      if counter and counter.count != count:
+        changes.append((counter, counter.count, count,
+                        _toValueText(upgrade, count)))
+
+    for counter, _, count, valueText in changes:
+      counter.set(count, valueText)
+      self.dirtyCounters.add(counter)
+
+    if self.onCountsChanged and changes:
+      self.onCountsChanged([(counter.upgrade, oldCount, count)
+                            for counter, oldCount, count, _ in changes])
+
+    if self.dirtyCounters and not self.pendingRefresh:
+      self.pendingRefresh = self.after_idle(self.refreshDirtyRows)
+
+
+  def refreshDirtyRows(self):
+    """Refreshes the widgets of any displayed rows whose counts have changed.
+    Filters that depend on counts are reapplied instead, relisting the rows.
+    """
+    self.pendingRefresh = None
+    dirtyCounters, self.dirtyCounters = self.dirtyCounters, set()
+    if dirtyCounters and self.chooserFilter.get() in COUNT_DEPENDENT_FILTERS:
+      return self.applyFilter()
+
+    self.suppressTraces = True
+    try:
+      for rowWidgets in self.rowWidgets:
+        if (rowWidgets and rowWidgets.row
+            and rowWidgets.row.counter in dirtyCounters):
+          rowWidgets.refresh()
+    finally:
+      self.suppressTraces = False
+
+
+  def layoutRows(self, rebind=False):
+    """Places and binds row widgets to display the rows in view, growing the
+    pool if the view has grown. If rebind is set, every displayed row is
+    rebound to reflect changes in the model.
+
+    Missing widgets are created progressively by populateRows. The first slice
+    is created immediately so the first screen is ready on return.
+    """
+    viewportHeight = self.viewport.winfo_height()
+    totalHeight = len(self.rows) * ROW_HEIGHT
+    self.yOffset = max(0, min(self.yOffset, totalHeight - viewportHeight))
+
+    # Grow the pool to cover the visible rows and overscan, if needed.
+    poolSize = min(-(viewportHeight // -ROW_HEIGHT) + OVERSCAN_ROWS, len(self.rows))
+    if poolSize > len(self.rowWidgets):
+      for rowWidgets in self.rowWidgets:
+        if rowWidgets:
+          rowWidgets.row = None   # Slot assignments change with the pool size.
+      self.rowWidgets.extend([None] * (poolSize - len(self.rowWidgets)))
+      if not self.pendingPopulate:
+        return self.populateRows()
+    poolSize = len(self.rowWidgets)
+    firstRow = self.firstPooledRow()
+
+    self.suppressTraces = True
+    try:
+      shownSlots = set()
+      for index in range(firstRow, min(firstRow + poolSize, len(self.rows))):
+        slot = index % poolSize
+        rowWidgets = self.rowWidgets[slot]
+        if rowWidgets is None:
+          continue    # Not yet created, so left to a later slice.
+        if rebind or rowWidgets.row is not self.rows[index]:
+          rowWidgets.bind(self.rows[index])
+        rowWidgets.frame.place(x=0, y=index * ROW_HEIGHT - self.yOffset,
+                               relwidth=1, height=ROW_HEIGHT)
+        shownSlots.add(slot)
+
+      for slot, rowWidgets in enumerate(self.rowWidgets):
+        if rowWidgets and slot not in shownSlots:
+          rowWidgets.frame.place_forget()
+    finally:
+      self.suppressTraces = False
+
+    if None in self.rowWidgets and not self.pendingPopulate:
+      self.pendingPopulate = self.after(POPULATE_INTERVAL_MS, self.populateRows)
+
+    if totalHeight:
+      self.scrollbar.set(self.yOffset / totalHeight,
+                         (self.yOffset + viewportHeight) / totalHeight)
+    else:
+      self.scrollbar.set(0, 1)
+
+
+  def yview(self, *args):
+    """Scrolls the rows, following Tk's scrollbar command protocol."""
+    if not args:
+      return
+    totalHeight = len(self.rows) * ROW_HEIGHT
+
+    if args[0] == tk.MOVETO:
+      self.yOffset = int(float(args[1]) * totalHeight)
+    elif args[0] == tk.SCROLL:
+      amount = int(args[1])
+      if args[2] == tk.PAGES:
+        self.yOffset += amount * self.viewport.winfo_height()
+      else:
+        self.yOffset += amount * SCROLL_UNIT
+    self.layoutRows()
+
+
+
   def applyUpgrades(self, upgradeResults):
     """Updates the Chooser UI's selection count."""
-    for upgrade, counter in self.upgradeCountersByUpgrade.items():
-      newVal = upgradeResults.get(upgrade, 0)
-      counter.set(newVal)
-      counter.refresh()
+    self.updateCounts({upgrade: upgradeResults.get(upgrade, 0)
+                       for upgrade in self.upgradeCountersByUpgrade.keys()})
+
 
 
-  
   def getUpgradeResults(self):
     """Returns an UpgradeResults dict reflecting the values set in this widget."""
     upgradeResults = {}
@@ -217,4 +561,4 @@ class UpgradeChooser(tk.Frame):
       if upgradeCount > 0:
         upgradeResults[counter.upgrade] = upgradeCount
 
-    return upgradeResults
\ No newline at end of file
+    return upgradeResults
@@ -1,4 +1,5 @@
 from data.upgrades import *
+from diagnostics import metrics, tracing
 import random
 
 
@@ -67,8 +68,9 @@ def _getLimitForChoice(choice: WeightedChoice, currentResults):
     raise ValueError(f"Weighted Choice {choice} doesn't have any results!")
 
 
-def _spinWheel(wheel: Wheel, currentResults) -> WeightedChoice:
-  '''Returns a WeightedChoice from the given Wheel, given the current results.
+def _spinWheel(wheel: Wheel, currentResults, rng=random) -> WeightedChoice:
+  '''Returns a WeightedChoice from the given Wheel, given the current results,
+  drawn using the given source of randomness.
   '''
   validChoices = []
 
@@ -80,20 +82,27 @@ def _spinWheel(wheel: Wheel, currentResults) -> WeightedChoice:
   # IF THERE ARE NO VALID CHOICES, FAIL OUT.
   if not validChoices:
     raise ValueError(f"Tried to spin wheel {wheel.displayName} with no valid choices!")
+  if len(validChoices) < len(wheel.choices):
+    metrics.EXHAUSTED_CHOICES.inc(len(wheel.choices) - len(validChoices))
 
   # Pair all valid choices with their weights.
   weights = [choice.weight for choice in validChoices]
 
-  choice = random.choices(population=validChoices, weights=weights)[0]
+  choice = rng.choices(population=validChoices, weights=weights)[0]
   return choice
 
 
-def spinUpgrades(wheel: Wheel, numSpins: int):
+@tracing.traced("spin")
+def spinUpgrades(wheel: Wheel, numSpins: int, rng: random.Random|None = None):
   '''Returns Upgrades produced by spinning the given Wheel {spins} times, as a
   dict mapping Upgrades to the number of times rolled.
 
+  Spins draw from the given Random, if any, so that seeded spins can be
+  reproduced. Otherwise the shared module-level generator is used.
+
   Raises ValueError if the given Wheel cannot produce {spins} spins.
   '''
+  rng = rng if rng is not None else random
 
   # First check that the given wheel can support X spins.
   wheelLimit = getLimitForWheel(wheel)
@@ -109,13 +118,14 @@ def spinUpgrades(wheel: Wheel, numSpins: int):
   #       instead allow user prompts and display results and things.
   #       Probably a GUISpinner inherits this and overloads this method though.
   for _ in range(numSpins):
-    choice: WeightedChoice = _spinWheel(wheel, currentResults)
+    choice: WeightedChoice = _spinWheel(wheel, currentResults, rng)
     while(choice.upgradeResult is None):
       if choice.wheelResult:
         wheelResult = choice.wheelResult
-        choice = _spinWheel(wheelResult, currentResults)
+        choice = _spinWheel(wheelResult, currentResults, rng)
       else:
         raise ValueError(f"WeightedChoice {choice.name} has no result!")
     upgrade = choice.upgradeResult
     currentResults[upgrade] = currentResults.get(upgrade, 0) + 1
+  metrics.SPINS.inc(numSpins)
   return currentResults
@@ -0,0 +1,51 @@
+# Tests for validation of wheels, in particular of spinLimit progressions.
+
+from pathlib import Path
+import sys
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from file import azathothValidator
+
+
+def _wheelWithProgression(progression):
+  return {
+    "name": "Test Wheel",
+    "wheel": [{
+      "game": "G",
+      "wheel": [{
+        "name": "X",
+        "weight": 1,
+        "upgrade": {"path": "x", "progression": progression},
+      }],
+    }],
+  }
+
+
+class ValidateProgressionTest(unittest.TestCase):
+  def testSpinLimitAllowed(self):
+    azathothValidator.validateAzathothYaml(
+      _wheelWithProgression({"increment": 1, "spinLimit": 3}))
+
+  def testOutdatedLimitAllowed(self):
+    azathothValidator.validateAzathothYaml(
+      _wheelWithProgression({"increment": 1, "limit": 3}))
+
+  def testValuesWithinSpinLimitAllowed(self):
+    azathothValidator.validateAzathothYaml(
+      _wheelWithProgression({"values": [1, 2], "spinLimit": 3}))
+
+  def testValuesBeyondSpinLimitRejected(self):
+    with self.assertRaisesRegex(ValueError, "more values than its limit"):
+      azathothValidator.validateAzathothYaml(
+        _wheelWithProgression({"values": [1, 2, 3], "spinLimit": 2}))
+
+  def testUnexpectedKeyRejected(self):
+    with self.assertRaisesRegex(ValueError, "unexpected key 'step'"):
+      azathothValidator.validateAzathothYaml(
+        _wheelWithProgression({"increment": 1, "step": 2}))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,81 @@
+# Tests for the statistics the spin engine equivalence harness relies on,
+#   checked against closed forms and published critical values.
+
+import math
+from pathlib import Path
+import sys
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bench"))
+
+import equivalence
+
+# Critical values of the chi-square distribution, as tuples: (degrees of
+#   freedom, statistic, chance of exceeding it).
+CHI_SQUARE_CRITICAL_VALUES = [
+  (1, 3.841459, 0.05),
+  (2, 9.210340, 0.01),
+  (10, 18.307038, 0.05),
+  (100, 124.342113, 0.05),
+]
+
+# Critical values of the Kolmogorov distribution, as tuples: (z, chance of
+#   exceeding it).
+KOLMOGOROV_CRITICAL_VALUES = [
+  (0.8276, 0.5),
+  (1.2238, 0.1),
+  (1.3581, 0.05),
+  (1.6276, 0.01),
+  (1.9495, 0.001),
+]
+
+
+class UpperGammaRegularizedTest(unittest.TestCase):
+  def testChiSquareCriticalValues(self):
+    for dof, statistic, chance in CHI_SQUARE_CRITICAL_VALUES:
+      with self.subTest(dof=dof):
+        self.assertAlmostEqual(
+          equivalence._upperGammaRegularized(dof / 2, statistic / 2), chance,
+          places=6)
+
+  def testClosedForms(self):
+    # Q(1, x) = e^-x, Q(1/2, x) = erfc(sqrt(x)), and Q(3, x) =
+    #   e^-x (1 + x + x^2 / 2), on both sides of the switch at x = a + 1.
+    for x in (0.1, 0.5, 1.0, 2.5, 10.0, 40.0):
+      with self.subTest(x=x):
+        self.assertAlmostEqual(equivalence._upperGammaRegularized(1, x),
+                               math.exp(-x), places=12)
+        self.assertAlmostEqual(equivalence._upperGammaRegularized(0.5, x),
+                               math.erfc(math.sqrt(x)), places=12)
+        self.assertAlmostEqual(equivalence._upperGammaRegularized(3, x),
+                               math.exp(-x) * (1 + x + x * x / 2), places=12)
+
+  def testNoStatistic(self):
+    self.assertEqual(equivalence._upperGammaRegularized(2, 0), 1.0)
+
+
+class KolmogorovSurvivalTest(unittest.TestCase):
+  def testCriticalValues(self):
+    for z, chance in KOLMOGOROV_CRITICAL_VALUES:
+      with self.subTest(z=z):
+        self.assertAlmostEqual(equivalence._kolmogorovSurvival(z), chance,
+                               places=4)
+
+  def testSeriesAgree(self):
+    # Either series holds for any z, so they must agree around the switch
+    #   between them, here summed far past where either is cut off.
+    for z in (0.9, 1.1, 1.17, 1.18, 1.19, 1.5):
+      with self.subTest(z=z):
+        alternating = 2 * sum((-1) ** (k - 1) * math.exp(-2 * k * k * z * z)
+                              for k in range(1, 100))
+        self.assertAlmostEqual(equivalence._kolmogorovSurvival(z),
+                               alternating, places=10)
+
+  def testBounds(self):
+    self.assertEqual(equivalence._kolmogorovSurvival(0), 1.0)
+    self.assertAlmostEqual(equivalence._kolmogorovSurvival(0.2), 1.0)
+    self.assertAlmostEqual(equivalence._kolmogorovSurvival(5), 0.0)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,104 @@
+# Regression tests for streamed upgrades, which must reload as the same YAML
+#   that upgrading the loaded documents gives.
+
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core import azathothCore
+from data.upgrades import Progression, Upgrade
+from file import eventUpgrader, yamlReader
+import zipfile
+
+UPGRADE = Upgrade("X", Upgrade.Type.OVERRIDE, ["G", "opts", "x"],
+                  Progression(values=[5]))
+
+
+class StreamedUpgradeTest(unittest.TestCase):
+  def assertStreamMatchesTree(self, contents, asBundle=False):
+    '''Saves the given game YAML upgraded both streamed and not, and checks
+    that both reload to the same YAML.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+      path = Path(directory) / "game.yaml"
+      path.write_text(contents)
+      gameYamls = azathothCore.loadGameYamls([path])
+      reloaded = []
+      for stream in (True, False):
+        outputDirectory = Path(directory) / f"stream-{stream}"
+        outputDirectory.mkdir()
+        [outputPath, *_] = azathothCore.upgradeAndSave(
+          {UPGRADE: 1}, gameYamls, outputDirectory,
+          azathothCore.SaveOptions(stream=stream, asBundle=asBundle),
+          version="1.0")
+        if asBundle:
+          with zipfile.ZipFile(outputPath) as bundle:
+            reloaded.append(yamlReader.readToYamlsFromString(
+              bundle.read("upgraded-game.yaml").decode("utf-8")))
+        else:
+          reloaded.append(list(yamlReader.readToYamls(outputPath)))
+      self.assertEqual(reloaded[0], reloaded[1])
+
+  def assertCannotStream(self, contents, expected=True):
+    '''Checks whether upgrading the given game YAML as a stream raises
+    CannotStream.
+    '''
+    with tempfile.TemporaryDirectory() as directory:
+      path = Path(directory) / "game.yaml"
+      path.write_text(contents)
+      events = eventUpgrader.toUpgradedEvents(
+        {UPGRADE: 1}, yamlReader.readToEvents(path), header={"azathoth": {}})
+      if expected:
+        with self.assertRaises(eventUpgrader.CannotStream):
+          list(events)
+      else:
+        list(events)
+
+  def testPlain(self):
+    self.assertStreamMatchesTree("G:\n  opts:\n    x: 1\n    y: 2\n")
+
+  def testAnchoredScalarReplaced(self):
+    self.assertStreamMatchesTree("G:\n  opts:\n    x: &v 1\n  other: *v\n")
+
+  def testAnchoredMappingUpgraded(self):
+    self.assertStreamMatchesTree("G:\n  opts: &o\n    x: 1\n  other: *o\n")
+
+  def testAliasOnTargetPath(self):
+    self.assertStreamMatchesTree("base: &b\n  x: 1\nG:\n  opts: *b\n")
+
+  def testDocumentHeaderKept(self):
+    self.assertStreamMatchesTree("G:\n  opts:\n    x: 1\n"
+                                 "azathoth:\n  version: old\n")
+
+  def testAnchorInsideReplacedNode(self):
+    self.assertStreamMatchesTree(
+      "G:\n  opts:\n    x:\n      y: &v 1\n  other: *v\n")
+
+  def testMergeKeyOnTargetPath(self):
+    self.assertStreamMatchesTree(
+      "base: &b\n  opts:\n    x: 1\n    y: 2\nG:\n  <<: *b\n")
+
+  def testFallbackIntoBundle(self):
+    self.assertStreamMatchesTree("G:\n  opts:\n    x: &v 1\n  other: *v\n",
+                                 asBundle=True)
+
+  def testStreamedIntoBundle(self):
+    self.assertStreamMatchesTree("G:\n  opts:\n    x: 1\n", asBundle=True)
+
+  def testUnsharedNodesStream(self):
+    self.assertCannotStream(
+      "G:\n  other: &o [1]\n  again: *o\n  opts: &p\n    x: 1\n",
+      expected=False)
+
+  def testSharedNodesCannotStream(self):
+    self.assertCannotStream("G:\n  opts:\n    x: &v 1\n  other: *v\n")
+    self.assertCannotStream("base: &b\n  x: 1\nG:\n  opts: *b\n")
+    self.assertCannotStream("G:\n  <<: {opts: {x: 1}}\n")
+    self.assertCannotStream("G:\n  opts:\n    x: 1\nazathoth: {}\n")
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,55 @@
+# Tests for metrics recorded in worker processes, which must reach the parent
+#   process whether or not the work succeeds.
+
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from core import batch
+from diagnostics import metrics
+
+WHEEL = """name: Test Wheel
+wheel:
+  - game: G
+    wheel:
+      - name: X
+        weight: 1
+        upgrade:
+          path: x
+          progression: ONE_PER
+"""
+
+
+def _failTimed():
+  with metrics.Operation("test_failing").time():
+    raise ValueError("Failed on purpose.")
+
+
+class CollectedErrorsTest(unittest.TestCase):
+  def testFailedCallMergesItsMetrics(self):
+    registry = metrics.MetricsRegistry()
+    collected = metrics.callCollecting(_failTimed)
+    with self.assertRaises(ValueError):
+      metrics.mergeCollected(collected, registry)
+    self.assertEqual(
+      registry.counter("azathoth_operation_errors_total",
+                       operation="test_failing").value, 1)
+
+  def testFailedBatchPlayerCounted(self):
+    errors = metrics.getOperationErrors("player")
+    errorsBefore = errors.value
+    with tempfile.TemporaryDirectory() as directory:
+      wheelPath = Path(directory) / "wheel.yaml"
+      wheelPath.write_text(WHEEL)
+      job = batch.PlayerJob("A", wheelPath, [Path(directory) / "missing"],
+                            Path(directory) / "output", spins=1)
+      [result] = batch.runBatch([job], maxWorkers=2)
+    self.assertIsNotNone(result.error)
+    self.assertEqual(errors.value, errorsBefore + 1)
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,76 @@
+# Tests that synthetic wheels and game YAMLs are valid and upgrade as expected,
+#   whatever their shape.
+
+from pathlib import Path
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "bench"))
+
+from core import azathothCore
+from data.upgrades import Upgrade
+from file import azathothValidator
+import synthetic
+
+# Specs covering each shape and kind of progression a wheel can have, kept
+#   small, as each is written and read back.
+SPECS = [
+  synthetic.WheelSpec(),
+  synthetic.WheelSpec(numGames=1, fanOut=1, extraSettings=0),
+  synthetic.WheelSpec(numGames=2, fanOut=4, depth=3, subwheelRate=0.8,
+                      weightSkew=1.5, seed=3),
+] + [synthetic.WheelSpec(numGames=2, fanOut=6, progressionMix={kind: 1},
+                         seed=1)
+     for kind in synthetic.DEFAULT_PROGRESSION_MIX]
+
+
+class GenerateTest(unittest.TestCase):
+  def testWheelsValid(self):
+    for spec in SPECS:
+      with self.subTest(mix=spec.progressionMix, depth=spec.depth):
+        azathothValidator.validateAzathothYaml(
+          synthetic.generate(spec).wheelYaml)
+
+  def testUpgradesTargetGameYamlSettings(self):
+    for spec in SPECS:
+      with (self.subTest(mix=spec.progressionMix, depth=spec.depth),
+            tempfile.TemporaryDirectory() as directory):
+        generated = synthetic.generate(spec)
+        wheelPath = synthetic.writeSyntheticWheel(generated, directory)
+        wheel = azathothCore.loadWheel(wheelPath)
+        gameYamls = azathothCore.loadGameYamls(
+          sorted(Path(directory).glob("game-*.yaml")))
+        self.assertEqual(len(gameYamls), spec.numGames)
+
+        # Every upgrade of every game is selected once, each but the manual
+        #   ones targeting a setting in its game's YAML.
+        upgradeResults = {upgrade: 1 for upgrade
+                          in azathothCore.getAllUpgrades(wheel)}
+        self.assertFalse(azathothCore.getMissingGames(upgradeResults,
+                                                      gameYamls))
+        for upgrade in upgradeResults:
+          if upgrade.type == Upgrade.Type.MANUAL:
+            continue
+          game, *path = upgrade.yamlPath
+          [gameYaml] = [yaml for yaml in generated.gameYamls if game in yaml]
+          value = gameYaml[game]
+          for key in path:
+            value = value[key]
+          self.assertEqual(value, 0)
+
+  def testSameSpecSameYamls(self):
+    spec = SPECS[2]
+    first, second = synthetic.generate(spec), synthetic.generate(spec)
+    self.assertEqual(first.wheelYaml, second.wheelYaml)
+    self.assertEqual(first.gameYamls, second.gameYamls)
+
+  def testSeedChangesYamls(self):
+    self.assertNotEqual(
+      synthetic.generate(synthetic.WheelSpec(seed=1)).wheelYaml,
+      synthetic.generate(synthetic.WheelSpec(seed=2)).wheelYaml)
+
+
+if __name__ == "__main__":
+  unittest.main()